@@ -1,30 +1,43 @@
 # app for Flask
+import os
+
 from flask import Flask
-from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
 
-from app.config import Config
+from app.config import get_config
+from app.json_provider import OrjsonProvider
 from app.routes import api_bp
 
 
-migrate = Migrate()
-
-def create_app():
+def create_app(config_name=None):
+    """
+    :param config_name: Config profile, see app.config.CONFIG_PROFILES; defaults to the APP_ENV
+                        environment variable, then "development".
+    """
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(get_config(config_name))
+    app.json = OrjsonProvider(app)
     
     # Register routes
     app.register_blueprint(api_bp)
 
-    from app.models import db
+    from app.extensions import db
     db.init_app(app)  
-    migrate.init_app(app, db)
 
-    with app.app_context():
-        db.create_all()
-    
+    # Flask-Migrate (and alembic with it) and the maintenance commands only serve the flask CLI,
+    # which sets FLASK_RUN_FROM_CLI; the schema is created there too, by `flask db upgrade` or
+    # `flask init-db`, not on every startup
+    if os.environ.get("FLASK_RUN_FROM_CLI") == "true":
+        from app.cli import register_commands
+        register_commands(app)
+
+    # The ingest workers are started by the server entry points (gunicorn.conf.py, app/asgi.py,
+    # main.py), never here: CLI commands and tests must not claim jobs
     return app
 
 if __name__ == "__main__":
+    from app.utilities.jobs import autostart_ingest_workers
+
     app = create_app()
-    app.run(host="0.0.0.0", port=5001)  # Development server
\ No newline at end of file
+    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":  # Not in the reloader's watcher process
+        autostart_ingest_workers(app)
+    app.run(host="0.0.0.0", port=5001)  # Development server
@@ -0,0 +1,283 @@
+"""
+ASGI entry point:
+
+    uvicorn app.asgi:app --workers 4
+
+POST /process_chat_json and POST /upload_images run as coroutines. The vectorizer is called
+through httpx and Postgres is reached through SQLAlchemy's asyncio extension (asyncpg), so a
+request waiting on Azure or the database does not hold a thread. The stages and db_common
+helpers of the Flask routes are reused as they are, through AsyncSession.run_sync. Every
+other route, and /upload_images?async=true, is served by the Flask app through WsgiToAsgi.
+"""
+import os
+import asyncio
+from urllib.parse import parse_qs
+from types import SimpleNamespace
+
+from asgiref.wsgi import WsgiToAsgi
+from jsonschema import ValidationError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.datastructures import Headers
+
+from app.app import create_app
+from app.config import Config
+from app.models_base import ChatJsonValidator, ImageUploadJsonValidator
+from app.routes import get_header_info, get_account_source
+from app.utilities.chat import load_chat_turn, resolve_chat_location, store_chat_images, store_chat_history, \
+    store_chat_progress, chat_images_event, find_chat_matches, chat_result, ASK_FOR_LOCATION
+from app.utilities.db_common import account_to_db, get_chat_progress
+from app.utilities.ingest import load_upload, select_new_images, embedded_record, store_records, close_loaded
+from app.utilities.jobs import autostart_ingest_workers, stop_ingest_workers
+from app.utilities.llm import VectorizerError, get_stored_image_embedding
+from app.utilities.llm_async import AsyncVectorizerClient, get_image_embedding_async, get_image_embeddings_async, \
+    get_text_embedding_async
+from app.utilities.location_cache import set_session_location
+
+# Like wsgi.py, this is a production entry point: don't fall back to the development profile
+flask_app = create_app(os.environ.get("APP_ENV", "production"))
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+class AsyncResources:
+    """
+    The async engine and vectorizer client of this process, created on the server's event loop,
+    and the ingest workers that process /upload_images?async=true jobs.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.sessionmaker = None
+        self.vectorizer = None
+
+    def start(self):
+        if self.engine is not None:
+            return
+        # pgvector's SQLAlchemy type sends and parses vectors as text, which asyncpg passes
+        # through for extension types, so no codec needs registering on the connections
+        self.engine = create_async_engine(Config.ASYNC_SQLALCHEMY_DATABASE_URI,
+                                          pool_size=Config.ASYNC_DB_POOL_SIZE, pool_pre_ping=True)
+        # Loaded rows are used after commit; expiring them would need a lazy load outside run_sync
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.vectorizer = AsyncVectorizerClient.from_config()
+        # This is the serving process (uvicorn, or a forked UvicornWorker), so threads started here survive
+        autostart_ingest_workers(flask_app)
+
+    async def stop(self):
+        if self.engine is None:
+            return
+        await asyncio.to_thread(stop_ingest_workers, Config.INGEST_JOB_POLL_INTERVAL)
+        await self.vectorizer.aclose()
+        await self.engine.dispose()
+        self.engine = self.sessionmaker = self.vectorizer = None
+
+
+resources = AsyncResources()
+
+
+def request_headers(scope):
+    """A stand-in for flask.request exposing the scope's headers, for get_header_info and get_account_source."""
+    return SimpleNamespace(headers=Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]]))
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def content_length(scope):
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            return int(value) if value.isdigit() else None
+    return None
+
+
+async def read_body(receive, limit=None) -> bytes:
+    """:raises BodyTooLarge: As soon as more than 'limit' bytes have arrived."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if limit and size > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_json(send, payload, status=200):
+    body = flask_app.json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def sse_event(event, payload) -> bytes:
+    return f"event: {event}\ndata: {flask_app.json.dumps(payload)}\n\n".encode()
+
+
+async def chat_turn_events_async(data, account_source, raw_headers):
+    """The async counterpart of chat.chat_turn_events, yielding the same events."""
+    async with resources.sessionmaker() as db_session:
+        progress = await db_session.run_sync(get_chat_progress, data.get("session"))
+        turn = await asyncio.to_thread(load_chat_turn, data, progress)
+
+        location = await db_session.run_sync(resolve_chat_location, turn, account_source, raw_headers)
+        yield "location", {"location": location}
+
+        if turn.images:
+            try:
+                embeddings = await get_image_embeddings_async(
+                    resources.vectorizer, [(chat_image.image_data, chat_image.md5) for chat_image in turn.images],
+                    db_session)
+            finally:
+                turn.close_images()
+            for chat_image, embedding in zip(turn.images, embeddings):
+                chat_image.embedding = embedding
+            turn.image_embedding = turn.images[-1].embedding
+            await db_session.run_sync(store_chat_images, turn)
+            yield "image_embedded", chat_images_event(turn)
+        elif turn.image_reused:
+            turn.image_embedding = await db_session.run_sync(
+                lambda session: get_stored_image_embedding(turn.image_md5, session))
+
+        await db_session.run_sync(store_chat_progress, turn)
+
+        if not location:
+            await db_session.commit()
+            yield "result", {"assistant": ASK_FOR_LOCATION}
+            return
+
+        if turn.image_embedding is None and turn.prompt:
+            turn.text_embedding = await get_text_embedding_async(resources.vectorizer, turn.prompt, db_session)
+        await db_session.run_sync(store_chat_history, turn)
+        await db_session.commit()  # One commit per request; closing the session rolls back otherwise
+
+        set_session_location(turn.chat_session.id, turn.account.id, location)
+
+        images = await db_session.run_sync(find_chat_matches, turn)
+        yield "matches", {"images": images}
+
+        yield "result", chat_result(turn, images)
+
+
+async def process_chat_json(scope, body, send):
+    headers = request_headers(scope)
+    try:
+        data = flask_app.json.loads(body)
+        ChatJsonValidator.validate(data)
+    except ValidationError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+    except Exception as e:
+        return await send_json(send, {"error": "An error occurred", "details": str(e)}, 500)
+
+    events = chat_turn_events_async(data, get_account_source(headers), get_header_info(headers))
+
+    if not data.get("stream"):
+        try:
+            result = None
+            async for event, payload in events:
+                result = payload
+        except VectorizerError as e:
+            return await send_json(send, {"error": "Embedding service unavailable", "details": str(e)}, 503)
+        except Exception as e:
+            return await send_json(send, {"error": "An error occurred", "details": str(e)}, 500)
+        return await send_json(send, result)
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no")]})
+    try:
+        async for event, payload in events:
+            await send({"type": "http.response.body", "body": sse_event(event, payload), "more_body": True})
+    except VectorizerError as e:
+        await send({"type": "http.response.body", "more_body": True,
+                    "body": sse_event("error", {"error": "Embedding service unavailable", "details": str(e)})})
+    except Exception as e:
+        await send({"type": "http.response.body", "more_body": True,
+                    "body": sse_event("error", {"error": "An error occurred", "details": str(e)})})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def upload_images(scope, body, send):
+    headers = request_headers(scope)
+    loaded = []
+    try:
+        data = flask_app.json.loads(body)
+        ImageUploadJsonValidator.validate(data)
+        results, loaded = await asyncio.to_thread(load_upload, data['images'])
+
+        async with resources.sessionmaker() as db_session:
+            account_item = await db_session.run_sync(account_to_db, data.get("user").get("user"),
+                                                     get_account_source(headers), get_header_info(headers))
+            new_images = await db_session.run_sync(select_new_images, loaded)
+
+            semaphore = asyncio.Semaphore(Config.INGEST_EMBEDDING_CONCURRENCY)
+
+            async def embed(item):
+                async with semaphore:
+                    try:
+                        embedding = await get_image_embedding_async(resources.vectorizer, item[3], item[4])
+                    except Exception as e:
+                        item[0].update(status="failed", details=f"Could not embed image: {e}")
+                        return None
+                    return embedded_record(item, embedding)
+
+            records = [record for record in await asyncio.gather(*(embed(item) for item in new_images)) if record]
+            await db_session.run_sync(store_records, records, account_item.id)
+            await db_session.commit()
+    except ValidationError as e:
+        return await send_json(send, {"error": "Invalid data", "details": str(e)}, 400)
+    except VectorizerError as e:
+        return await send_json(send, {"error": "Embedding service unavailable", "details": str(e)}, 503)
+    except Exception as e:
+        return await send_json(send, {"error": "An error occurred", "details": str(e)}, 500)
+    finally:
+        close_loaded(loaded)
+
+    processed_images = [r for r in results if r["status"] in ("processed", "duplicate")]
+    await send_json(send, {"message": "Images processed successfully", "processed_images": len(processed_images),
+                           "images": results})
+
+
+ASYNC_ROUTES = {
+    ("POST", "/process_chat_json"): process_chat_json,
+    ("POST", "/upload_images"): upload_images,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            resources.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await resources.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    handler = ASYNC_ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if handler is upload_images:
+        query = parse_qs(scope.get("query_string", b"").decode())
+        if query.get("async", [""])[0].lower() in ("1", "true", "yes"):
+            handler = None  # Enqueuing a job is a quick insert, left to the Flask route
+    if handler is None:
+        return await flask_asgi(scope, receive, send)
+
+    # Same limit as the Flask routes: checked on the declared length, then while reading
+    limit = flask_app.config.get("MAX_CONTENT_LENGTH")
+    declared = content_length(scope)
+    try:
+        if limit and declared is not None and declared > limit:
+            raise BodyTooLarge()
+        body = await read_body(receive, limit)
+    except BodyTooLarge:
+        return await send_json(send, {"error": "Request body too large", "details": f"The limit is {limit} bytes."}, 413)
+
+    resources.start()  # No-op when the server ran the lifespan startup
+    await handler(scope, body, send)
@@ -0,0 +1,47 @@
+import click
+from flask.cli import with_appcontext
+from flask_migrate import Migrate, stamp
+
+from app.models import db
+
+migrate = Migrate()
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create the tables of an empty database and mark it as migrated to the latest revision."""
+    db.create_all()
+    stamp()
+    click.echo("Created the tables and stamped the database with the head revision.")
+
+
+@click.command("compact-accounts")
+@click.option("--dry-run", is_flag=True, help="Only report what would be merged.")
+@with_appcontext
+def compact_accounts_command(dry_run):
+    """
+    Merge accounts duplicated by the old header-string source and normalize their source.
+
+    Running servers keep merged-away account ids in their identity cache for up to
+    IDENTITY_CACHE_TTL seconds, and requests that use one fail in that time. Restart the
+    workers after compacting (or stop them first) to make it safe.
+    """
+    from app.utilities.db_common import compact_accounts
+
+    try:
+        counts = compact_accounts(db.session, dry_run=dry_run)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    action = "Would merge" if dry_run else "Merged"
+    click.echo(f"{action} {counts['merged']} of {counts['accounts']} accounts; "
+               f"{counts['renamed']} kept accounts get a normalized source.")
+
+
+def register_commands(app):
+    """Registers `flask db` (Flask-Migrate) and the maintenance commands."""
+    migrate.init_app(app, db)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(compact_accounts_command)
@@ -0,0 +1,5 @@
+from flask_sqlalchemy import SQLAlchemy
+
+# Defined apart from the models so create_app can set it up without importing them (and their
+# pgvector and geoalchemy2 column types); app.models re-exports it
+db = SQLAlchemy()
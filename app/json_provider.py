@@ -0,0 +1,35 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson, for request bodies carrying base64 images and for the
+    responses of jsonify().
+
+    Request bodies are parsed from bytes without decoding them to str first, and responses are
+    built as bytes. Dates, dataclasses, decimals and UUIDs still go through
+    DefaultJSONProvider.default, so they serialize as with Flask's provider. Unlike it, non-ASCII
+    text is written as UTF-8 instead of \\u escapes.
+    """
+
+    def _options(self, kwargs) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=self._options(kwargs)).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default,
+                            option=self._options({"indent": pretty}) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
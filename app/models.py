@@ -5,31 +5,54 @@ from geoalchemy2 import Geography
 
 from geoalchemy2 import Geometry, Geography
 from geoalchemy2.elements import WKTElement
-from flask_sqlalchemy import SQLAlchemy
 
 #from app import db
-db = SQLAlchemy()
 
 from sqlalchemy import (
-    BigInteger, Integer, String, Float, Column, ForeignKey, TIMESTAMP, JSON, Text
+    BigInteger, Integer, String, Float, Column, ForeignKey, TIMESTAMP, JSON, Text, Index, UniqueConstraint
 )
 from sqlalchemy.orm import relationship
 from pgvector.sqlalchemy import Vector
 from geoalchemy2 import Geography
-from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from app.config import Config
+from app.extensions import db
+
+
+def vector_index(name, column_name):
+    """
+    Builds the cosine-distance ANN index for a vector column, using the index type from Config.
+    The same definition is used by the migrations so both paths create identical indexes.
+    """
+    if Config.VECTOR_INDEX_TYPE == "ivfflat":
+        return Index(
+            name, column_name,
+            postgresql_using="ivfflat",
+            postgresql_with={"lists": Config.IVFFLAT_LISTS},
+            postgresql_ops={column_name: "vector_cosine_ops"},
+        )
+    return Index(
+        name, column_name,
+        postgresql_using="hnsw",
+        postgresql_with={"m": Config.HNSW_M, "ef_construction": Config.HNSW_EF_CONSTRUCTION},
+        postgresql_ops={column_name: "vector_cosine_ops"},
+    )
 
 class Account(db.Model):
     __tablename__ = 'account'
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    source = Column(String, nullable=False)
+    source = Column(String, nullable=False)  # Normalized client, see normalize_account_source
+    raw_headers = Column(Text, nullable=True)  # Request headers the account was first seen with
     create_time = Column(TIMESTAMP(timezone=True), nullable=False)
 
     images = relationship('Image', back_populates='creator')  # Plural for many-to-one
     chat_histories = relationship('ChatHistory', back_populates='account')  # Plural for many-to-one
 
+    __table_args__ = (
+        UniqueConstraint('name', 'source', name='uq_account_name_source'),
+    )
+
 
 class Device(db.Model):
     __tablename__ = 'device'
@@ -39,6 +62,10 @@ class Device(db.Model):
 
     images = relationship('Image', back_populates='device')  # Plural for many-to-one
 
+    __table_args__ = (
+        UniqueConstraint('device_maker', 'device_model', name='uq_device_maker_model'),
+    )
+
 
 class Transcript(db.Model):
     __tablename__ = 'transcript'
@@ -53,30 +80,58 @@ class Embedding(db.Model):
     id = Column(BigInteger, primary_key=True)
     image_id = Column(BigInteger, ForeignKey('image.id'), nullable=False)
     transcript_id = Column(BigInteger, ForeignKey('transcript.id'), nullable=True)
-    image_embedding = Column(Vector, nullable=False)
-    transcript_embedding = Column(Vector, nullable=True)
+    image_embedding = Column(Vector(Config.VECTOR_DIMENSION), nullable=False)
+    transcript_embedding = Column(Vector(Config.VECTOR_DIMENSION), nullable=True)
+    model_version = Column(String, nullable=True)  # Vectorizer model that produced image_embedding
 
     image = relationship('Image', back_populates='embeddings')  # Plural for one-to-many
     transcript = relationship('Transcript', back_populates='embeddings')  # Plural for one-to-many
 
+    __table_args__ = (
+        UniqueConstraint('image_id', name='uq_embedding_image_id'),  # One embedding per image
+        vector_index('ix_embedding_image_embedding', 'image_embedding'),
+        vector_index('ix_embedding_transcript_embedding', 'transcript_embedding'),
+    )
+
+
+class PromptEmbedding(db.Model):
+    __tablename__ = 'prompt_embedding'
+    id = Column(BigInteger, primary_key=True)
+    prompt_hash = Column(String, nullable=False)  # prompt_hash of the normalized prompt text
+    model_version = Column(String, nullable=False)  # Vectorizer model that produced embedding
+    embedding = Column(Vector(Config.VECTOR_DIMENSION), nullable=False)
+    create_time = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('prompt_hash', 'model_version', name='uq_prompt_embedding_hash_model'),
+    )
+
 
 class ChatSession(db.Model):
     __tablename__ = 'chat_session'
     id = Column(BigInteger, primary_key=True)
     session_id = Column(String, nullable=False)
     create_time = Column(TIMESTAMP(timezone=True), nullable=True)
+    # Progress through the conversation the client resends on every turn, see load_chat_turn
+    processed_message_count = Column(Integer, nullable=False, default=0, server_default='0')
+    last_message_hash = Column(String, nullable=True)  # message_hash of the last processed message
+    last_image_id = Column(BigInteger, ForeignKey('image.id'), nullable=True)  # Latest image of the conversation
 
     chat_histories = relationship('ChatHistory', back_populates='session')  # Plural for one-to-many
 
+    __table_args__ = (
+        UniqueConstraint('session_id', name='uq_chat_session_session_id'),
+    )
+
 
 class Image(db.Model):
     __tablename__ = 'image'
     id = Column(BigInteger, primary_key=True)
     path = Column(String, nullable=True)
-    md5 = Column(String, nullable=False)
+    md5 = Column(String, nullable=False)  # Unique, see uq_image_md5
     creator_id = Column(Integer, ForeignKey('account.id'), nullable=False)
     device_id = Column(Integer, ForeignKey('device.id'), nullable=True)
-    location = Column(Geography('POINT', srid=4326), nullable=True)
+    location = Column(Geography('POINT', srid=4326, spatial_index=True), nullable=True)  # GiST idx_image_location
     taken_time = Column(TIMESTAMP(timezone=True), nullable=True)
     focus_35mm = Column(Integer, nullable=True)
     orientation_from_north = Column(Float, nullable=True)
@@ -87,6 +142,10 @@ class Image(db.Model):
     embeddings = relationship('Embedding', back_populates='image')  # Plural for one-to-many
     chat_histories = relationship('ChatHistory', back_populates='image')  # Plural for one-to-many
 
+    __table_args__ = (
+        UniqueConstraint('md5', name='uq_image_md5'),
+    )
+
 
 class ChatHistory(db.Model):
     __tablename__ = 'chat_history'
@@ -95,10 +154,36 @@ class ChatHistory(db.Model):
     account_id = Column(Integer, ForeignKey('account.id'), nullable=False)
     image_id = Column(BigInteger, ForeignKey('image.id'), nullable=True)
     time = Column(TIMESTAMP(timezone=True), nullable=False)
-    location = Column(Geography('POINT', srid=4326), nullable=True)
+    location = Column(Geography('POINT', srid=4326, spatial_index=True), nullable=True)  # GiST idx_chat_history_location
     prompt = Column(JSON, nullable=False)
     llm_reply = Column(String, nullable=True)
 
     session = relationship('ChatSession', back_populates='chat_histories')  # Plural for one-to-many
     account = relationship('Account', back_populates='chat_histories')  # Plural for one-to-many
     image = relationship('Image', back_populates='chat_histories', foreign_keys=[image_id])  # Plural for one-to-many
+
+    __table_args__ = (
+        # Latest turn of a session first, for the location lookup on every chat request
+        Index('ix_chat_history_session_account_time', session_id, account_id, time.desc()),
+    )
+
+
+class IngestJob(db.Model):
+    __tablename__ = 'ingest_job'
+    id = Column(BigInteger, primary_key=True)
+    account_id = Column(Integer, ForeignKey('account.id'), nullable=False)
+    status = Column(String, nullable=False)  # queued, running, done, failed
+    payload = Column(JSON, nullable=False)  # The 'images' list of the upload request
+    total = Column(Integer, nullable=False)
+    processed = Column(Integer, nullable=False, default=0)  # Images handled so far, whatever their outcome
+    results = Column(JSON, nullable=True)  # Per-image status, in payload order
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    create_time = Column(TIMESTAMP(timezone=True), nullable=False)
+    update_time = Column(TIMESTAMP(timezone=True), nullable=False)  # Also the heartbeat of a running job
+
+    account = relationship('Account')
+
+    __table_args__ = (
+        Index('ix_ingest_job_status_update_time', 'status', 'update_time'),
+    )
@@ -2,6 +2,15 @@ from pydantic import BaseModel, Field, validator
 from datetime import datetime
 import os
 from typing import List
+from jsonschema.validators import validator_for
+from jsonschema.exceptions import best_match
+
+from app.config import Config
+
+try:
+    import fastjsonschema
+except ImportError:  # Optional; SchemaValidator then uses jsonschema alone
+    fastjsonschema = None
 
 class ImageEntry(BaseModel):
     dir_path: str
@@ -133,3 +142,39 @@ ImageUploadJsonSchema = {
     },
     "required": ["images"]
 }
+
+
+class SchemaValidator:
+    """
+    A JSON schema compiled once, for validating request bodies.
+
+    The schema is checked against its metaschema and its jsonschema validator built here, instead
+    of on every jsonschema.validate() call. With fastjsonschema installed and
+    Config.JSON_SCHEMA_FAST_PATH set, bodies are first run through the Python code it generates
+    for the schema; a body it rejects is validated again by jsonschema, which is authoritative and
+    reports the error, so failures raise exactly what jsonschema.validate() would.
+    """
+
+    def __init__(self, schema: dict, fast_path: bool = None):
+        fast_path = Config.JSON_SCHEMA_FAST_PATH if fast_path is None else fast_path
+        validator_class = validator_for(schema)
+        validator_class.check_schema(schema)
+        self.schema = schema
+        self.validator = validator_class(schema)
+        self.fast_validate = fastjsonschema.compile(schema) if fast_path and fastjsonschema else None
+
+    def validate(self, instance):
+        """:raises jsonschema.ValidationError: The best matching error, as jsonschema.validate() raises."""
+        if self.fast_validate is not None:
+            try:
+                self.fast_validate(instance)
+                return
+            except fastjsonschema.JsonSchemaException:
+                pass
+        error = best_match(self.validator.iter_errors(instance))
+        if error is not None:
+            raise error
+
+
+ChatJsonValidator = SchemaValidator(ChatJsonSchema)
+ImageUploadJsonValidator = SchemaValidator(ImageUploadJsonSchema)
@@ -4,8 +4,7 @@ from app import create_app
 @pytest.fixture
 def client():
     """Fixture to set up a test client for the app."""
-    app = create_app()
-    app.testing = True
+    app = create_app("testing")
     with app.test_client() as client:
         yield client
 
@@ -29,3 +28,22 @@ def test_handle_data_no_payload(client):
     response = client.post("/api/data", json={})
     assert response.status_code == 400
     assert response.json["error"] == "No data provided"
+
+def test_oversized_body_rejected_before_parsing(client):
+    """Bodies over MAX_CONTENT_LENGTH get a JSON 413 without reaching the view."""
+    client.application.config["MAX_CONTENT_LENGTH"] = 64
+    response = client.post("/process_chat_json", data=b'{"messages": "' + b"A" * 100 + b'"}',
+                           content_type="application/json")
+    assert response.status_code == 413
+    assert response.json["error"] == "Request body too large"
+
+def test_create_app_does_not_import_request_handlers():
+    """The development profile stays as light as the others: no ingest workers, no handler modules."""
+    import os
+    import subprocess
+    import sys
+    code = ("import sys; from app.app import create_app; create_app('development'); "
+            "print(sorted(m for m in ('app.utilities.jobs', 'app.utilities.ingest', 'app.models', 'PIL') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__)))).stdout
+    assert out.strip() == "[]"
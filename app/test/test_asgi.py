@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app import asgi
+from app.utilities import jobs
+
+
+def run_lifespan(until):
+    """Runs the ASGI lifespan protocol: startup, then 'until()' in a thread, then shutdown."""
+    async def main():
+        messages = asyncio.Queue()
+        sent = []
+
+        async def receive():
+            return await messages.get()
+
+        async def send(message):
+            sent.append(message["type"])
+
+        await messages.put({"type": "lifespan.startup"})
+        task = asyncio.create_task(asgi.app({"type": "lifespan"}, receive, send))
+        while "lifespan.startup.complete" not in sent:
+            await asyncio.sleep(0.01)
+        result = await asyncio.to_thread(until)
+        await messages.put({"type": "lifespan.shutdown"})
+        await task
+        return result, sent
+
+    return asyncio.run(main())
+
+
+def test_lifespan_starts_ingest_workers_that_claim_queued_jobs():
+    claimed = threading.Event()
+    job = SimpleNamespace(id=1)
+    queue = [job]
+
+    def fake_claim(db_session):
+        return queue.pop() if queue else None
+
+    def fake_run(db_session, claimed_job):
+        assert claimed_job is job
+        claimed.set()
+
+    vectorizer = MagicMock(aclose=AsyncMock())
+    engine = MagicMock(dispose=AsyncMock())
+    config = {"INGEST_JOB_AUTOSTART": True, "INGEST_JOB_WORKERS": 1, "INGEST_JOB_POLL_INTERVAL": 0.05}
+
+    with patch.dict(asgi.flask_app.config, config), \
+            patch.object(asgi, "create_async_engine", return_value=engine), \
+            patch.object(asgi.AsyncVectorizerClient, "from_config", return_value=vectorizer), \
+            patch.object(jobs, "claim_next_job", side_effect=fake_claim), \
+            patch.object(jobs, "run_ingest_job", side_effect=fake_run):
+        was_claimed, sent = run_lifespan(lambda: claimed.wait(5))
+
+    assert was_claimed
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert jobs._worker_pool is None  # Stopped with the lifespan shutdown
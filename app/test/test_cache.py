@@ -0,0 +1,42 @@
+import time
+from unittest.mock import patch
+
+from app.utilities.cache import LRUCache
+from app.utilities import llm
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(maxsize=2, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_get_image_embedding_skips_vectorizer_on_hit():
+    llm.EMBEDDING_CACHE.clear()
+    with patch.object(llm, "find_embedding_by_md5", return_value=None) as db_lookup, \
+            patch.object(llm, "get_embedding", return_value=[0.1, 0.2]) as vectorize:
+        assert llm.get_image_embedding(b"data", "md5-a", db_session=object()) == [0.1, 0.2]
+        assert llm.get_image_embedding(b"data", "md5-a", db_session=object()) == [0.1, 0.2]
+    assert vectorize.call_count == 1
+    assert db_lookup.call_count == 1
+
+
+def test_get_image_embedding_uses_embedding_table():
+    llm.EMBEDDING_CACHE.clear()
+    with patch.object(llm, "find_embedding_by_md5", return_value=[0.3]), \
+            patch.object(llm, "get_embedding") as vectorize:
+        assert llm.get_image_embedding(b"data", "md5-b", db_session=object()) == [0.3]
+    vectorize.assert_not_called()
@@ -0,0 +1,176 @@
+import json
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
+
+from app.utilities import chat
+
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), 'images')
+
+
+def chat_data(messages, stream=False):
+    return {"model": "gpt-4o-mini", "user": "alice", "session": "s1", "stream": stream, "messages": messages}
+
+
+def run_events(data, **patches):
+    defaults = dict(
+        account_to_db=MagicMock(return_value=SimpleNamespace(id=1)),
+        chat_session_to_db=MagicMock(return_value=SimpleNamespace(id=2)),
+        get_location_from_db=MagicMock(return_value=None),
+        get_image_embeddings=MagicMock(side_effect=lambda images, db_session: [[0.5]] * len(images)),
+        device_to_db=MagicMock(return_value=None),
+        images_to_db=MagicMock(side_effect=lambda db_session, records, account_id:
+                               [SimpleNamespace(id=3 + i) for i in range(len(records))]),
+        images_by_md5=MagicMock(return_value={}),
+        chat_history_to_db=MagicMock(),
+        set_session_location=MagicMock(),
+        search_images_multi=MagicMock(return_value=[{"image_id": 4, "image_location": "POINT(1 2)"}]),
+        get_chat_progress=MagicMock(return_value=None),
+        chat_progress_to_db=MagicMock(),
+        get_stored_image_embedding=MagicMock(return_value=[0.25]),
+        get_text_embedding=MagicMock(return_value=[0.75]),
+        search_images_by_text=MagicMock(return_value=[{"image_id": 5, "matched_on": "transcript"}]),
+    )
+    defaults.update(patches)
+    with patch.multiple(chat, **defaults):
+        return list(chat.chat_turn_events(MagicMock(), data, "web", "headers")), defaults
+
+
+def test_chat_turn_events_with_image_and_location_message():
+    messages = [
+        {"role": "user", "content": [
+            {"type": "text", "text": "What is near here?"},
+            {"type": "image_url", "image_url": {"url": os.path.join(IMAGE_DIR, 'IMG_0475.JPG'), "detail": "auto"}},
+        ]},
+        {"role": "user", "content": {"type": "location", "location": {"longitude": 1.5, "latitude": 2.5}}},
+    ]
+    events, mocks = run_events(chat_data(messages))
+
+    assert [event for event, _ in events] == ["location", "image_embedded", "matches", "result"]
+    assert events[0][1]["location"].startswith("POINT(1.5 2.5")
+    assert events[1][1]["image_id"] == 3
+    assert len(events[1][1]["images"]) == 1
+    assert events[-1][1]["images"] == [{"image_id": 4, "image_location": "POINT(1 2)"}]
+    mocks["get_location_from_db"].assert_not_called()  # The location message wins
+    mocks["set_session_location"].assert_called_once()
+
+
+def test_chat_turn_events_asks_for_a_location_when_none_is_known():
+    events, mocks = run_events(chat_data([{"role": "user", "content": "Hello"}]))
+
+    assert [event for event, _ in events] == ["location", "result"]
+    assert events[-1][1] == {"assistant": chat.ASK_FOR_LOCATION}
+    mocks["chat_history_to_db"].assert_not_called()
+    mocks["get_text_embedding"].assert_not_called()  # Nothing to search without a location
+
+
+def test_processed_message_count_needs_the_same_last_processed_message():
+    messages = [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}, {"role": "user", "content": "c"}]
+    progress = {"processed_message_count": 2, "last_message_hash": chat.message_hash(messages[1])}
+
+    assert chat.processed_message_count(messages, progress) == 2
+    assert chat.processed_message_count(messages, None) == 0
+    assert chat.processed_message_count(messages[:2], progress) == 0  # No new message
+    edited = [messages[0], {"role": "assistant", "content": "edited"}, messages[2]]
+    assert chat.processed_message_count(edited, progress) == 0
+
+
+def test_find_image_urls_collects_every_image_from_start():
+    def image(url):
+        return {"type": "image_url", "image_url": {"url": url, "detail": "auto"}}
+
+    messages = [
+        {"role": "user", "content": [image("a"), {"type": "text", "text": "and"}, image("b")]},
+        {"role": "assistant", "content": "Two photos."},
+        {"role": "user", "content": [image("c")]},
+    ]
+    assert chat.find_image_urls(messages) == ["a", "b", "c"]
+    assert chat.find_image_urls(messages, start=1) == ["c"]
+    assert chat.find_image_urls([{"role": "user", "content": "hi"}]) == []
+
+
+def test_chat_turn_events_embeds_and_stores_every_new_image_at_once():
+    def image(name):
+        return {"type": "image_url", "image_url": {"url": os.path.join(IMAGE_DIR, name), "detail": "auto"}}
+
+    messages = [
+        {"role": "user", "content": [image('IMG_0475.JPG'), image('IMG_0476.JPG')]},
+        {"role": "user", "content": [image('IMG_0475.JPG'), {"type": "text", "text": "Same as the first one"}]},
+        {"role": "user", "content": {"type": "location", "location": {"longitude": 1.5, "latitude": 2.5}}},
+    ]
+    events, mocks = run_events(chat_data(messages))
+
+    assert [event for event, _ in events] == ["location", "image_embedded", "matches", "result"]
+    mocks["get_image_embeddings"].assert_called_once()
+    assert len(mocks["get_image_embeddings"].call_args.args[0]) == 2  # The repeated photo is embedded once
+    mocks["images_to_db"].assert_called_once()
+    records = mocks["images_to_db"].call_args.args[1]
+    assert [os.path.basename(record["path"]) for record in records] == ['IMG_0476.JPG', 'IMG_0475.JPG']
+    assert events[1][1]["image_id"] == 4  # The latest image
+    assert mocks["search_images_multi"].call_args.kwargs["embeddings"] == [[0.5], [0.5]]
+
+
+def test_chat_turn_events_reuses_the_image_of_earlier_turns():
+    messages = [
+        {"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": "/not/read/again.jpg", "detail": "auto"}},
+        ]},
+        {"role": "assistant", "content": "A church."},
+        {"role": "user", "content": "When was it built?"},
+    ]
+    progress = {"processed_message_count": 2, "last_message_hash": chat.message_hash(messages[1]),
+                "last_image": SimpleNamespace(id=9, md5="abc"), "last_image_location": "POINT(1 2)"}
+    events, mocks = run_events(chat_data(messages), get_chat_progress=MagicMock(return_value=progress))
+
+    assert [event for event, _ in events] == ["location", "matches", "result"]
+    assert events[0][1]["location"] == "POINT(1 2)"  # The earlier image's GPS position
+    mocks["get_image_embeddings"].assert_not_called()
+    mocks["images_to_db"].assert_not_called()
+    mocks["get_stored_image_embedding"].assert_called_once()
+    assert mocks["search_images_multi"].call_args.kwargs["embeddings"] == [[0.25]]
+    assert mocks["chat_history_to_db"].call_args.args[3].id == 9
+    assert mocks["chat_progress_to_db"].call_args.args[2:] == (3, chat.message_hash(messages[2]),
+                                                               progress["last_image"])
+
+
+def test_find_prompt_text_takes_the_latest_user_text():
+    messages = [
+        {"role": "user", "content": "Where is the castle?"},
+        {"role": "assistant", "content": "Over there."},
+        {"role": "user", "content": [{"type": "text", "text": " How old "}, {"type": "text", "text": "is it?"}]},
+        {"role": "user", "content": {"type": "location", "location": {"longitude": 1.5, "latitude": 2.5}}},
+    ]
+    assert chat.find_prompt_text(messages) == "How old is it?"
+    assert chat.find_prompt_text(messages[:2]) == "Where is the castle?"
+    assert chat.find_prompt_text(messages, start=3) is None
+
+
+def test_chat_turn_events_searches_by_text_without_an_image():
+    messages = [
+        {"role": "user", "content": "Who designed this bridge?"},
+        {"role": "user", "content": {"type": "location", "location": {"longitude": 1.5, "latitude": 2.5}}},
+    ]
+    events, mocks = run_events(chat_data(messages))
+
+    assert [event for event, _ in events] == ["location", "matches", "result"]
+    assert mocks["get_text_embedding"].call_args.args[0] == "Who designed this bridge?"
+    assert mocks["search_images_by_text"].call_args.kwargs["embedding"] == [0.75]
+    mocks["search_images_multi"].assert_not_called()
+    assert events[-1][1]["images"] == [{"image_id": 5, "matched_on": "transcript"}]
+
+
+def test_sse_stream_reports_a_failed_stage_as_an_error_event():
+    def events():
+        yield "location", {"location": "POINT(1 2)"}
+        raise chat.VectorizerError("down")
+
+    db_session = MagicMock()
+    with Flask(__name__).app_context():
+        body = list(chat.sse_stream(events(), db_session))
+
+    assert body[0] == 'event: location\ndata: {"location": "POINT(1 2)"}\n\n'
+    assert body[1].startswith("event: error\n")
+    assert json.loads(body[1].split("data: ", 1)[1])["error"] == "Embedding service unavailable"
+    db_session.rollback.assert_called_once()
@@ -0,0 +1,35 @@
+from app.utilities.common import normalize_account_source, parse_header_info
+from app.utilities.db_common import plan_account_compaction
+
+
+def header_info(user_agent, referer, x_forwarded_for):
+    return f"User-Agent: {user_agent}, Referer: {referer}, X-Forwarded-For: {x_forwarded_for}"
+
+
+def test_normalize_account_source():
+    assert normalize_account_source("Mozilla/5.0 (X11; Linux) Chrome/120", "https://Chat.Example.com:3080/c/new") == "chat.example.com"
+    assert normalize_account_source("axios/1.7.2", None) == "axios"
+    assert normalize_account_source("axios/1.7.2", "None") == "axios"
+    assert normalize_account_source(None, None) == "unknown"
+
+
+def test_parse_header_info_round_trips():
+    header = header_info("Mozilla/5.0 (X11, Linux)", None, "10.0.0.1, 10.0.0.2")
+    assert parse_header_info(header) == {"user_agent": "Mozilla/5.0 (X11, Linux)", "referer": None,
+                                         "x_forwarded_for": "10.0.0.1, 10.0.0.2"}
+    assert parse_header_info("axios") == {}
+
+
+def test_plan_account_compaction_merges_by_normalized_source():
+    accounts = [
+        (1, "alice", header_info("axios/1.6.0", None, "10.0.0.1"), None),
+        (2, "alice", header_info("axios/1.7.2", None, "10.0.0.2, 10.0.0.3"), None),
+        (3, "alice", "axios", None),
+        (4, "bob", header_info("axios/1.7.2", None, None), None),
+        (5, "bob", "web.example.com", None),
+    ]
+    merges, renames = plan_account_compaction(accounts)
+
+    assert merges == [{"id": 2, "keep_id": 1}, {"id": 3, "keep_id": 1}]
+    assert [(r["id"], r["source"]) for r in renames] == [(1, "axios"), (4, "axios")]
+    assert renames[0]["raw_headers"] == accounts[0][2]
@@ -0,0 +1,24 @@
+import pytest
+
+from app.config import Config, engine_options, get_config, ProductionConfig, DevelopmentConfig
+
+
+def test_engine_options_sizes_pool_for_threads_and_ingest_workers():
+    options = engine_options(workers=2, threads=4)
+    assert options["pool_size"] == 4 + Config.INGEST_JOB_WORKERS
+    assert options["max_overflow"] == options["pool_size"]
+    assert options["pool_pre_ping"] is True
+
+
+def test_engine_options_stays_within_connection_budget():
+    options = engine_options(workers=4, threads=8, max_connections=40)
+    assert 4 * (options["pool_size"] + options["max_overflow"]) <= 40
+
+
+def test_get_config_profiles(monkeypatch):
+    monkeypatch.setenv("APP_ENV", "production")
+    assert get_config() is ProductionConfig
+    assert get_config("development") is DevelopmentConfig
+    assert ProductionConfig.DEBUG is False
+    with pytest.raises(ValueError):
+        get_config("staging")
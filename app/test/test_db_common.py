@@ -0,0 +1,117 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql
+
+from app.models import Account
+from app.utilities import db_common
+from app.utilities.db_common import unit_of_work, account_to_db, chat_history_to_db, image_to_db
+
+
+@pytest.fixture(autouse=True)
+def empty_identity_cache():
+    db_common.IDENTITY_CACHE.clear()
+    yield
+    db_common.IDENTITY_CACHE.clear()
+
+
+def compiled_sql(db_session, call=-1):
+    return str(db_session.execute.call_args_list[call].args[0].compile(dialect=postgresql.dialect()))
+
+
+def test_helpers_flush_and_unit_of_work_commits_once():
+    db_session = MagicMock()
+
+    with unit_of_work(db_session):
+        account = account_to_db(db_session, "alice", "web")
+        chat_history_to_db(db_session, MagicMock(id=1), account, None, "hi", "POINT(1 2)")
+
+    db_session.flush.assert_called_once()
+    db_session.commit.assert_called_once()
+    db_session.rollback.assert_not_called()
+
+
+def test_unit_of_work_rolls_back_on_error():
+    db_session = MagicMock()
+
+    with pytest.raises(ValueError):
+        with unit_of_work(db_session):
+            raise ValueError("boom")
+
+    db_session.commit.assert_not_called()
+    db_session.rollback.assert_called_once()
+
+
+def test_account_to_db_is_a_single_insert_for_a_new_account():
+    db_session = MagicMock()
+
+    account_to_db(db_session, "alice", "web")
+
+    db_session.execute.assert_called_once()
+    sql = compiled_sql(db_session)
+    assert "ON CONFLICT (name, source) DO NOTHING" in sql and "RETURNING account.id" in sql
+
+
+def test_account_to_db_selects_an_existing_account_without_locking_it():
+    db_session = MagicMock()
+    account = MagicMock(id=4)
+    db_session.execute.return_value.scalar_one_or_none.side_effect = [None, account]
+
+    assert account_to_db(db_session, "alice", "web") is account
+
+    assert db_session.execute.call_count == 2
+    sql = compiled_sql(db_session)
+    assert sql.startswith("SELECT") and "FOR UPDATE" not in sql
+
+
+def test_image_to_db_only_embeds_a_newly_inserted_image():
+    db_session = MagicMock()
+    image = MagicMock(id=3)
+
+    db_session.execute.return_value.scalar_one_or_none.side_effect = [None, image]
+    assert image_to_db(db_session, "a.jpg", {}, "md5", [0.1], 1, None) is image
+    db_session.add.assert_not_called()
+    assert "ON CONFLICT (md5) DO NOTHING" in compiled_sql(db_session, 0)
+
+    db_session.execute.return_value.scalar_one_or_none.side_effect = [image]
+    image_to_db(db_session, "a.jpg", {}, "md5", [0.1], 1, None)
+    assert db_session.add.call_args.args[0].image_id == 3
+
+
+def test_identity_cache_is_filled_only_after_commit():
+    db_session = MagicMock(info={})
+    db_session.execute.return_value.scalar_one_or_none.return_value = Account(
+        id=7, name="alice", source="web", create_time=datetime(2024, 1, 1))
+
+    account_to_db(db_session, "alice", "web")
+    assert ("account", "alice", "web") not in db_common.IDENTITY_CACHE
+
+    db_common._promote_pending_identities(db_session)
+    assert db_common.IDENTITY_CACHE.get(("account", "alice", "web"))["id"] == 7
+
+    account_to_db(db_session, "alice", "web")
+    db_session.execute.assert_called_once()
+
+
+def test_identity_cache_hit_runs_no_sql_and_is_evicted_on_rollback():
+    db_common.IDENTITY_CACHE.set(("account", "bob", "web"),
+                                 {"id": 5, "name": "bob", "source": "web", "create_time": datetime(2024, 1, 1)})
+    db_session = Session()  # Unbound: any SQL would raise
+
+    account = account_to_db(db_session, "bob", "web")
+    assert account.id == 5 and account in db_session
+
+    db_common._discard_pending_identities(db_session)
+    assert ("account", "bob", "web") not in db_common.IDENTITY_CACHE
+
+
+def test_get_latest_location_is_one_projected_row():
+    db_session = MagicMock()
+    db_session.execute.return_value.scalar.return_value = "POINT(1 2)"
+
+    assert db_common.get_latest_location_from_db(db_session, 3, 4, back_hours=1) == "POINT(1 2)"
+    sql = compiled_sql(db_session)
+    assert sql.startswith("SELECT ST_AsText(coalesce(chat_history.location, image.location))")
+    assert "ORDER BY chat_history.time DESC" in sql and "LIMIT" in sql
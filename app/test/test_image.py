@@ -0,0 +1,180 @@
+import os
+import pytest
+
+from app.utilities.image import ImageBytes, extract_image_metadata, get_md5_of_image, image_to_base64
+
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), 'images')
+IMAGE_FILES = sorted(f for f in os.listdir(IMAGE_DIR) if f.endswith('.JPG'))
+
+
+@pytest.mark.parametrize("filename", IMAGE_FILES)
+def test_image_bytes_matches_legacy_path(filename):
+    image_path = os.path.join(IMAGE_DIR, filename)
+    expected_md5 = get_md5_of_image(image_path)
+    expected_metadata = extract_image_metadata(image_path, fast=False)
+    assert extract_image_metadata(image_path) == expected_metadata
+
+    with ImageBytes.load(image_path) as from_file:
+        assert from_file.path == image_path
+        assert from_file.md5 == expected_md5
+        assert extract_image_metadata(from_file) == expected_metadata
+
+    data_url = f"data:image/jpeg;base64,{image_to_base64(image_path)}"
+    from_url = ImageBytes.load(data_url)
+    assert from_url.path is None
+    assert from_url.md5 == expected_md5
+    assert extract_image_metadata(from_url) == expected_metadata
+
+
+def test_image_bytes_readers_are_independent():
+    with ImageBytes.from_file(os.path.join(IMAGE_DIR, IMAGE_FILES[0])) as image_bytes:
+        first, second = image_bytes.open(), image_bytes.open()
+        assert first.read(4) == second.read(4) == image_bytes.getvalue()[:4]
+        first.seek(0, os.SEEK_END)
+        assert first.tell() == len(image_bytes)
+        assert second.tell() == 4
+        first.close()
+        second.close()
+
+
+def heif_with_exif(exif_tiff):
+    """Builds a minimal HEIF container whose only item is an Exif block stored in mdat."""
+    import struct
+
+    def box(box_type, payload):
+        return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+    def full_box(box_type, version, payload):
+        return box(box_type, struct.pack(">B3x", version) + payload)
+
+    exif_payload = struct.pack(">I", 6) + b"Exif\0\0" + exif_tiff
+    ftyp = box(b"ftyp", b"heic" + struct.pack(">I", 0) + b"mif1heic")
+    iinf = full_box(b"iinf", 0, struct.pack(">H", 1) + full_box(b"infe", 2, struct.pack(">HH", 1, 0) + b"Exif" + b"\0"))
+
+    def build(mdat_offset):
+        iloc = full_box(b"iloc", 0, bytes([0x44, 0x00]) + struct.pack(">HHHHII", 1, 1, 0, 1, mdat_offset, len(exif_payload)))
+        meta = full_box(b"meta", 0, full_box(b"hdlr", 0, b"\0" * 4 + b"pict" + b"\0" * 13) + iinf + iloc)
+        return ftyp + meta
+
+    header = build(0)
+    return build(len(header) + 8) + box(b"mdat", exif_payload)
+
+
+def test_read_exif_heif_matches_jpeg():
+    import io
+    import piexif
+    from app.utilities.image import read_exif
+
+    image_path = os.path.join(IMAGE_DIR, IMAGE_FILES[0])
+    exif_tiff = piexif.dump(piexif.load(image_path))[6:]  # Strip the "Exif\0\0" APP1 prefix
+    heif = io.BytesIO(heif_with_exif(exif_tiff))
+
+    from_heif = read_exif(heif)
+    from_jpeg = read_exif(image_path)
+    assert from_heif["Make"] == from_jpeg["Make"] == "Apple"
+    assert from_heif["GPSInfo"] == from_jpeg["GPSInfo"]
+    assert extract_image_metadata(heif)["WKT Point"] == extract_image_metadata(image_path)["WKT Point"]
+
+
+def test_fast_exif_without_gps_matches_pil():
+    import io
+    import piexif
+    from PIL import Image
+
+    exif = piexif.load(os.path.join(IMAGE_DIR, IMAGE_FILES[0]))
+    exif["GPS"] = {}
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, format="JPEG", exif=piexif.dump(exif))
+
+    fast = extract_image_metadata(io.BytesIO(buffer.getvalue()))
+    assert fast == extract_image_metadata(io.BytesIO(buffer.getvalue()), fast=False)
+    assert fast["Make"] == "Apple" and fast["WKT Point"] is None
+
+
+def test_fast_exif_with_corrupt_ifd_falls_back_to_pil():
+    import io
+    import piexif
+    import struct
+    from PIL import Image
+
+    exif_block = bytearray(piexif.dump(piexif.load(os.path.join(IMAGE_DIR, IMAGE_FILES[0]))))
+    endian = "<" if exif_block[6:8] == b"II" else ">"
+    struct.pack_into(f"{endian}I", exif_block, 10, 0x7FFFFFF0)  # IFD0 offset far past the block
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, format="JPEG", exif=bytes(exif_block))
+
+    fast = extract_image_metadata(io.BytesIO(buffer.getvalue()))
+    assert "Error" not in fast
+    assert fast == extract_image_metadata(io.BytesIO(buffer.getvalue()), fast=False)
+
+
+def test_timezone_lookups_are_cached_per_rounded_position():
+    from unittest.mock import MagicMock, patch
+    from app.utilities import image
+
+    finder = MagicMock()
+    finder.timezone_at.return_value = "Europe/London"
+    image._timezone_at.cache_clear()
+    with patch.object(image, "get_timezone_finder", return_value=finder):
+        timezones = image.get_timezones_from_coordinates([
+            (52.19011, -1.70791),
+            (52.19012, -1.70792),  # Same ~100 m cell
+            (None, None),
+            (48.85837, 2.29448),
+        ])
+    image._timezone_at.cache_clear()
+
+    assert timezones == ["Europe/London", "Europe/London", None, "Europe/London"]
+    assert finder.timezone_at.call_count == 2
+
+
+def test_timezone_finder_is_shared():
+    from app.utilities.image import get_timezone_finder
+    assert get_timezone_finder() is get_timezone_finder()
+
+
+def test_prepare_image_for_embedding_downscales_a_stripped_copy():
+    from PIL import Image
+    from app.utilities.image import prepare_image_for_embedding
+
+    with ImageBytes.from_file(os.path.join(IMAGE_DIR, IMAGE_FILES[0])) as image_bytes:
+        original = image_bytes.getvalue()
+        body, stats = prepare_image_for_embedding(image_bytes, max_side=512, quality=80)
+        with Image.open(body) as prepared:
+            assert max(prepared.size) == 512
+            assert "exif" not in prepared.info
+        assert stats["resized"] and stats["sent_bytes"] < stats["original_bytes"]
+        assert image_bytes.getvalue() == original
+
+
+def test_prepare_image_for_embedding_strips_small_images_without_resizing():
+    from PIL import Image
+    from app.utilities.image import prepare_image_for_embedding
+
+    with ImageBytes.from_file(os.path.join(IMAGE_DIR, IMAGE_FILES[0])) as image_bytes:
+        with Image.open(image_bytes.open()) as original:
+            original_size = sorted(original.size)
+        body, stats = prepare_image_for_embedding(image_bytes, max_side=100_000)
+        with Image.open(body) as prepared:
+            assert sorted(prepared.size) == original_size  # exif_transpose may swap the sides
+            assert "exif" not in prepared.info
+        assert stats["stripped"] and not stats["resized"]
+
+
+def test_prepare_image_for_embedding_never_falls_back_to_the_original():
+    from app.utilities.image import prepare_image_for_embedding
+
+    with ImageBytes.from_file(os.path.join(IMAGE_DIR, IMAGE_FILES[0])) as image_bytes:
+        corrupt = ImageBytes(image_bytes.getvalue()[:200])  # Headers and EXIF only, no image data
+    with pytest.raises(ValueError):
+        prepare_image_for_embedding(corrupt, max_side=512)
+
+
+def test_prepare_image_for_embedding_sends_the_original_when_disabled():
+    from app.utilities.image import prepare_image_for_embedding
+
+    with ImageBytes.from_file(os.path.join(IMAGE_DIR, IMAGE_FILES[0])) as image_bytes:
+        body, stats = prepare_image_for_embedding(image_bytes, max_side=0)
+        assert not stats["resized"] and not stats["stripped"]
+        assert body.read() == image_bytes.getvalue()
+        body.close()
@@ -0,0 +1,142 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.utilities import ingest
+from app.utilities.llm import VectorizerError
+
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), 'images')
+
+
+def image_item(filename, location=None):
+    item = {'type': 'image/jpeg', 'image_url': {'url': os.path.join(IMAGE_DIR, filename), 'detail': 'auto'}}
+    if location:
+        item['location'] = location
+    return item
+
+
+def fake_images_to_db(db_session, records, account_id):
+    return [SimpleNamespace(id=i + 1) for i in range(len(records))]
+
+
+def test_ingest_images_reports_status_per_image():
+    images = [
+        image_item('IMG_0475.JPG', {'longitude': 1.0, 'latitude': 2.0}),
+        image_item('IMG_0476.JPG'),
+        image_item('IMG_0476.JPG'),  # Repeated within the upload
+        image_item('missing.JPG'),
+        {'type': 'image/jpeg'},
+    ]
+    existing_md5 = ingest.load_image_file(os.path.join(IMAGE_DIR, 'IMG_0475.JPG'))[1]
+
+    with patch.object(ingest, 'find_existing_md5s', return_value={existing_md5}), \
+            patch.object(ingest, 'get_image_embedding', return_value=[0.5]) as embed, \
+            patch.object(ingest, 'images_to_db', side_effect=fake_images_to_db) as bulk_insert:
+        results = ingest.ingest_images(object(), images, account_id=7)
+
+    assert [r['status'] for r in results] == ['duplicate', 'processed', 'duplicate', 'skipped', 'skipped']
+    assert results[1]['image_id'] == 1
+    assert embed.call_count == 1
+    records = bulk_insert.call_args.args[1]
+    assert len(records) == 1 and records[0]['embedding'] == [0.5]
+
+
+def test_ingest_images_keeps_going_when_an_embedding_fails():
+    images = [image_item('IMG_0475.JPG'), image_item('IMG_0476.JPG')]
+    failing_md5 = ingest.load_image_file(os.path.join(IMAGE_DIR, 'IMG_0475.JPG'))[1]
+
+    def embed(data, image_md5):
+        if image_md5 == failing_md5:
+            raise VectorizerError("boom")
+        return [0.5]
+
+    with patch.object(ingest, 'find_existing_md5s', return_value=set()), \
+            patch.object(ingest, 'get_image_embedding', side_effect=embed), \
+            patch.object(ingest, 'images_to_db', side_effect=fake_images_to_db):
+        results = ingest.ingest_images(object(), images, account_id=7)
+
+    assert [r['status'] for r in results] == ['failed', 'processed']
+
+
+def test_ingest_images_releases_file_mappings_when_a_stage_fails():
+    import pytest
+
+    loaded = []
+
+    def load_image_file(image_path):
+        item = real_load_image_file(image_path)
+        loaded.append(item[0])
+        return item
+
+    real_load_image_file = ingest.load_image_file
+    with patch.object(ingest, 'load_image_file', side_effect=load_image_file), \
+            patch.object(ingest, 'find_existing_md5s', side_effect=RuntimeError("database is down")):
+        with pytest.raises(RuntimeError):
+            ingest.ingest_images(object(), [image_item('IMG_0475.JPG'), image_item('IMG_0476.JPG')], account_id=7)
+
+    assert len(loaded) == 2
+    assert all(image_bytes._buffer.closed for image_bytes in loaded)
+
+
+def test_ingest_images_reports_images_stored_concurrently_as_duplicates():
+    images = [image_item('IMG_0475.JPG'), image_item('IMG_0476.JPG')]
+
+    with patch.object(ingest, 'find_existing_md5s', return_value=set()), \
+            patch.object(ingest, 'get_image_embedding', return_value=[0.5]), \
+            patch.object(ingest, 'images_to_db', return_value=[None, SimpleNamespace(id=9)]):
+        results = ingest.ingest_images(object(), images, account_id=7)
+
+    assert [r['status'] for r in results] == ['duplicate', 'processed']
+    assert results[1]['image_id'] == 9
+
+
+def test_run_ingest_job_resumes_and_records_progress():
+    from unittest.mock import MagicMock
+    from app.utilities import jobs
+
+    payload = [image_item('IMG_0475.JPG'), image_item('IMG_0476.JPG'), image_item('IMG_1005.JPG')]
+    job = SimpleNamespace(id=1, account_id=7, payload=payload, total=3, status="running", error=None,
+                          results=[{"url": "done-before-restart", "status": "processed"}], processed=1)
+    db_session = MagicMock()
+
+    def fake_ingest(db_session, chunk, account_id):
+        return [{"url": item['image_url']['url'], "status": "processed"} for item in chunk]
+
+    with patch.object(jobs.Config, 'INGEST_JOB_CHUNK_SIZE', 1), \
+            patch.object(jobs, 'ingest_images', side_effect=fake_ingest) as ingest_mock:
+        jobs.run_ingest_job(db_session, job)
+
+    assert ingest_mock.call_count == 2  # The first image was already processed
+    assert job.status == "done"
+    assert job.processed == 3
+    assert db_session.commit.call_count == 3
+
+
+def test_stale_job_threshold_covers_a_chunk_of_timed_out_embeddings():
+    from app.utilities import jobs
+
+    with patch.multiple(jobs.Config, INGEST_JOB_STALE_SECONDS=60, INGEST_JOB_CHUNK_SIZE=20,
+                        INGEST_EMBEDDING_CONCURRENCY=4, AZURE_VISION_CONNECT_TIMEOUT=5,
+                        AZURE_VISION_READ_TIMEOUT=20, AZURE_VISION_MAX_RETRIES=1, AZURE_VISION_BACKOFF_MAX=10):
+        assert jobs.stale_job_seconds() == 5 * (25 * 2 + 10)
+
+    with patch.multiple(jobs.Config, INGEST_JOB_STALE_SECONDS=3600, INGEST_JOB_CHUNK_SIZE=1):
+        assert jobs.stale_job_seconds() == 3600
+
+
+def test_claim_next_job_fails_jobs_out_of_attempts():
+    from unittest.mock import MagicMock
+    from app.utilities import jobs
+
+    poisoned = SimpleNamespace(id=1, status="running", attempts=3, error=None, update_time=None)
+    queued = SimpleNamespace(id=2, status="queued", attempts=0, error=None, update_time=None)
+    db_session = MagicMock()
+    db_session.execute.return_value.scalar_one_or_none.side_effect = [poisoned, queued]
+
+    with patch.object(jobs.Config, 'INGEST_JOB_MAX_ATTEMPTS', 3):
+        claimed = jobs.claim_next_job(db_session)
+
+    assert claimed is queued and queued.status == "running" and queued.attempts == 1
+    assert poisoned.status == "failed" and poisoned.attempts == 3
+    assert "3 attempts" in poisoned.error
+    assert db_session.commit.call_count == 2
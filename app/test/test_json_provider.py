@@ -0,0 +1,29 @@
+import json
+from datetime import datetime
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.json_provider import OrjsonProvider
+
+
+def make_app():
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    return app
+
+
+def test_round_trip_matches_default_provider():
+    app = make_app()
+    payload = {"b": [1, 2.5, None, True], "a": "定位", "when": datetime(2024, 1, 2, 3, 4, 5)}
+    default = DefaultJSONProvider(app)
+    assert json.loads(app.json.dumps(payload)) == json.loads(default.dumps(payload))
+    assert app.json.loads(b'{"url": "data:image/jpeg;base64,AAAA"}') == {"url": "data:image/jpeg;base64,AAAA"}
+
+
+def test_response_is_sorted_bytes_with_newline():
+    app = make_app()
+    with app.app_context():
+        response = app.json.response({"b": 1, "a": 2})
+    assert response.mimetype == "application/json"
+    assert response.get_data() == b'{"a":2,"b":1}\n'
@@ -0,0 +1,157 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from app.utilities.llm import CircuitBreaker, CircuitOpenError, VectorizerClient, VectorizerError
+
+
+def make_client(status_code=200, json_body=None, threshold=2):
+    client = VectorizerClient("https://vision.example/", "key", "?api-version=test",
+                              breaker=CircuitBreaker(failure_threshold=threshold, reset_timeout=60))
+    response = MagicMock(status_code=status_code, text="body")
+    response.json.return_value = json_body or {"vector": [0.1, 0.2]}
+    client.session.post = MagicMock(return_value=response)
+    return client
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.02)
+    assert breaker.allow()        # Trial request
+    assert not breaker.allow()    # Only one trial at a time
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_vectorize_image_uses_pooled_session_with_timeouts():
+    client = make_client()
+    assert client.vectorize_image(b"jpeg") == [0.1, 0.2]
+
+    args, kwargs = client.session.post.call_args
+    assert args[0] == "https://vision.example/computervision/retrieval:vectorizeImage?api-version=test"
+    assert kwargs["timeout"] == client.timeout
+    assert client.session.get_adapter("https://vision.example/").max_retries.total == 3
+
+
+def test_server_errors_open_the_circuit():
+    client = make_client(status_code=503)
+    for _ in range(2):
+        with pytest.raises(VectorizerError):
+            client.vectorize_text("hello")
+    with pytest.raises(CircuitOpenError):
+        client.vectorize_text("hello")
+    assert client.session.post.call_count == 2
+
+
+def test_client_errors_do_not_open_the_circuit():
+    client = make_client(status_code=400)
+    for _ in range(3):
+        with pytest.raises(VectorizerError):
+            client.vectorize_image(b"not an image")
+    assert not client.breaker.is_open
+
+
+def run_async_client(responses, threshold=2):
+    import asyncio
+    import httpx
+    from app.utilities.llm_async import AsyncVectorizerClient
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    async def run():
+        client = AsyncVectorizerClient("https://vision.example/", "key", "?api-version=test", backoff_factor=0,
+                                       breaker=CircuitBreaker(failure_threshold=threshold, reset_timeout=60))
+        client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler), headers=client.client.headers)
+        try:
+            return await client.vectorize_image(b"jpeg"), client
+        except VectorizerError as e:
+            return e, client
+        finally:
+            await client.aclose()
+
+    result, client = asyncio.run(run())
+    return result, client, calls
+
+
+def test_async_client_retries_server_errors():
+    import httpx
+
+    result, client, calls = run_async_client([httpx.Response(503), httpx.Response(200, json={"vector": [0.3]})])
+
+    assert result == [0.3]
+    assert len(calls) == 2
+    assert calls[0].headers["Ocp-Apim-Subscription-Key"] == "key"
+    assert not client.breaker.is_open
+
+
+def test_async_client_gives_up_after_max_retries():
+    import httpx
+
+    result, client, calls = run_async_client([httpx.Response(503)], threshold=1)
+
+    assert isinstance(result, VectorizerError)
+    assert len(calls) == 4  # The first attempt and 3 retries
+    assert client.breaker.is_open
+
+
+def test_get_image_embeddings_looks_up_stored_ones_in_one_query(monkeypatch):
+    from app.utilities import llm
+
+    llm.EMBEDDING_CACHE.clear()
+    llm.EMBEDDING_CACHE.set(("cached", llm.Config.AZURE_VISION_MODEL_VERSION), [0.1])
+    find = MagicMock(return_value={"stored": [0.2]})
+    vectorize = MagicMock(side_effect=lambda image_data, mode: [len(image_data)])
+    monkeypatch.setattr(llm, "find_embeddings_by_md5s", find)
+    monkeypatch.setattr(llm, "get_embedding", vectorize)
+
+    embeddings = llm.get_image_embeddings([("a", "cached"), ("bb", "stored"), ("ccc", "new")], db_session=MagicMock())
+
+    assert embeddings == [[0.1], [0.2], [3]]
+    assert find.call_args.args[1] == ["stored", "new"]
+    vectorize.assert_called_once_with("ccc", "image")
+    assert llm.EMBEDDING_CACHE.get(("new", llm.Config.AZURE_VISION_MODEL_VERSION)) == [3]
+    llm.EMBEDDING_CACHE.clear()
+
+
+def test_get_text_embedding_caches_by_normalized_prompt(monkeypatch):
+    from app.utilities import llm
+
+    llm.TEXT_EMBEDDING_CACHE.clear()
+    find = MagicMock(return_value=None)
+    store = MagicMock()
+    vectorize = MagicMock(return_value=[0.3])
+    monkeypatch.setattr(llm, "find_prompt_embedding", find)
+    monkeypatch.setattr(llm, "prompt_embedding_to_db", store)
+    monkeypatch.setattr(llm, "get_embedding", vectorize)
+
+    assert llm.get_text_embedding("What is this  Tower?", db_session=MagicMock()) == [0.3]
+    assert llm.get_text_embedding("what is this tower", db_session=MagicMock()) == [0.3]
+    assert llm.get_text_embedding(" ? ") is None
+
+    vectorize.assert_called_once_with("what is this tower", mode="text")
+    find.assert_called_once()
+    assert store.call_args.args[1:] == (llm.prompt_hash("what is this tower"), llm.Config.AZURE_VISION_MODEL_VERSION,
+                                        [0.3])
+    llm.TEXT_EMBEDDING_CACHE.clear()
+
+
+def test_get_embedding_sends_nothing_when_the_image_cannot_be_stripped(monkeypatch):
+    from app.utilities import llm
+    from app.utilities.image import ImageBytes
+
+    client = MagicMock()
+    monkeypatch.setattr(llm, "get_vectorizer_client", lambda: client)
+    monkeypatch.setattr(llm.Config, "EMBEDDING_MAX_SIDE", 512)
+
+    with pytest.raises(ValueError):
+        llm.get_embedding(ImageBytes(b"\xff\xd8\xff\xe1 not really a JPEG"), mode="image")
+    client.vectorize_image.assert_not_called()
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.utilities import chat
+from app.utilities import location_cache
+
+
+class DictStore(location_cache.LocationStore):
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key, (None,))[0]
+
+    def set(self, key, location_wkt, ttl):
+        self.data[key] = (location_wkt, ttl)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def make_store():
+    return DictStore()
+
+
+@pytest.fixture
+def store():
+    with patch.object(location_cache.Config, 'LOCATION_CACHE_BACKEND', f'{__name__}:make_store'), \
+            patch.object(location_cache, '_store', None):
+        yield location_cache.get_location_store()
+
+
+def test_set_session_location_uses_back_hours_as_ttl(store):
+    assert isinstance(store, DictStore)
+    location_cache.set_session_location(1, 2, "POINT(1 2)", back_hours=2)
+    assert store.data["location:1:2"] == ("POINT(1 2)", 7200)
+
+    location_cache.set_session_location(1, 3, None)
+    assert "location:1:3" not in store.data
+
+
+def test_get_location_from_db_skips_the_query_on_a_cache_hit(store):
+    chat_session, account = SimpleNamespace(id=1), SimpleNamespace(id=2)
+
+    with patch.object(chat, 'get_latest_location_from_db', return_value="POINT(5 6)") as query:
+        assert chat.get_location_from_db(None, chat_session, account) == "POINT(5 6)"
+        location_cache.set_session_location(1, 2, "POINT(7 8)")
+        assert chat.get_location_from_db(None, chat_session, account) == "POINT(7 8)"
+
+    query.assert_called_once()
+
+
+def test_in_memory_store_expires_entries():
+    memory = location_cache.InMemoryLocationStore(maxsize=4)
+    memory.set("a", "POINT(1 2)", ttl=-1)
+    memory.set("b", "POINT(3 4)", ttl=60)
+    assert memory.get("a") is None
+    assert memory.get("b") == "POINT(3 4)"
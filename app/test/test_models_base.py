@@ -0,0 +1,43 @@
+import pytest
+from jsonschema import validate, ValidationError
+
+from app.models_base import SchemaValidator, ChatJsonSchema
+
+
+def chat_payload(content):
+    return {"model": "gpt-4o-mini", "user": "u", "session": "s", "stream": False, "max_tokens": 100,
+            "messages": [{"role": "user", "content": content}]}
+
+
+VALID = [
+    chat_payload("hello"),
+    chat_payload([{"type": "text", "text": "hi"},
+                  {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AA==", "detail": "auto"}}]),
+    chat_payload({"type": "location", "location": {"longitude": -1.7, "latitude": 52.2}}),
+]
+
+INVALID = [
+    None,
+    {"model": "gpt-4o-mini"},
+    chat_payload(42),
+    chat_payload([{"text": "no type"}]),
+    chat_payload({"type": "location", "location": {"longitude": "east", "latitude": 52.2}}),
+    dict(chat_payload("hello"), max_tokens=1.5),
+]
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+@pytest.mark.parametrize("payload", VALID)
+def test_valid_payloads_pass(payload, fast_path):
+    SchemaValidator(ChatJsonSchema, fast_path=fast_path).validate(payload)
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+@pytest.mark.parametrize("payload", INVALID)
+def test_errors_match_jsonschema_validate(payload, fast_path):
+    with pytest.raises(ValidationError) as expected:
+        validate(instance=payload, schema=ChatJsonSchema)
+    with pytest.raises(ValidationError) as raised:
+        SchemaValidator(ChatJsonSchema, fast_path=fast_path).validate(payload)
+    assert str(raised.value) == str(expected.value)
+
@@ -5,14 +5,16 @@ from unittest.mock import patch, MagicMock
 
 from app.utilities.image import image_to_base64
 from app.app import create_app
+from app.models import db
 
 IMAGE_DIR = os.path.join(os.path.dirname(__file__), 'images')
 
 @pytest.fixture
 def client():
     """Fixture to create a test client for the Flask app."""
-    app = create_app()
-    app.config["TESTING"] = True
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()  # No longer done by create_app; a no-op for a migrated database
     with app.test_client() as client:
         yield client
 
@@ -131,7 +133,7 @@ def test_chat(client):
         "model": "gpt-4o-mini",
         "user": "671756edd40f99d73854437a",
         "session": "1234567abcd",
-        "stream": True,
+        "stream": False,
         "messages": [
             {"role": "system", "content": "你是一个资深导游"}, 
             {"role": "user", "content": "你好！"}, 
@@ -217,3 +219,31 @@ def test_upload_images(client):
     assert len(response_data['processed_images']) == len(image_files)  # Ensure all images are processed
 
 # Note: Adjust the actual Flask route handling logic to properly parse this mixed data format.
+
+
+def test_chat_stream(client):
+    """ With "stream": true the stages are sent as Server-Sent Events, ending with the result """
+    data = {
+        "model": "gpt-4o-mini",
+        "user": "671756edd40f99d73854437a",
+        "session": "1234567abcd-stream",
+        "stream": True,
+        "messages": [
+            {"role": "system", "content": "你是一个资深导游"},
+            {"role": "user",
+                "content": {
+                    "type": "location",
+                    "location": {
+                        "longitude":    -1.706313888888889,
+                        "latitude":     52.19267222222222
+                    }
+                }
+            }
+        ],
+        "max_tokens": 4000
+    }
+    response = client.post('/process_chat_json', json=data)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = [block.split('\n')[0] for block in response.get_data(as_text=True).strip().split('\n\n')]
+    assert events == ['event: location', 'event: matches', 'event: result']
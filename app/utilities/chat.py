@@ -0,0 +1,358 @@
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+from flask import current_app
+
+from app.config import Config
+from app.utilities.common import TZ
+from app.utilities.image import extract_image_metadata, convert_to_wkt, ImageBytes
+from app.utilities.llm import get_image_embeddings, get_stored_image_embedding, get_text_embedding, VectorizerError
+from app.utilities.db_common import account_to_db, device_to_db, images_to_db, images_by_md5, chat_session_to_db, \
+    chat_history_to_db, unit_of_work, search_images_multi, search_images_by_text, get_latest_location_from_db, \
+    get_chat_progress, chat_progress_to_db
+from app.utilities.location_cache import get_session_location, set_session_location
+
+ASK_FOR_LOCATION = "请发送定位确定你的位置，以便给你个性化的体验！"
+
+
+def find_image_urls(messages, start=0):
+    """
+    Collects the url of every 'image_url' item in the 'content' of the messages, in order.
+
+    :param messages: list of messages coming from the JSON data.
+    :param start: Index of the first message to look at; earlier ones were processed by a previous turn.
+    """
+    urls = []
+    for message in messages[start:]:
+        content = message.get('content')
+        # 'content' is a string, a single item, or a list of items; only lists carry images
+        if isinstance(content, list):
+            for item in content:
+                if item.get('type') == 'image_url' and item.get('image_url') and item['image_url'].get('url'):
+                    urls.append(item['image_url']['url'])
+    return urls
+
+
+def find_prompt_text(messages, start=0):
+    """
+    The text of the latest user message with any, among messages[start:]; the items of a
+    message with several 'text' items are joined by a space.
+
+    :param messages: list of messages coming from the JSON data.
+    :param start: Index of the first message to look at; earlier ones were processed by a previous turn.
+    :return: The text, or None.
+    """
+    for message in reversed(messages[start:]):
+        if message.get('role') != 'user':
+            continue
+        content = message.get('content')
+        if isinstance(content, str):
+            texts = [content]
+        else:
+            items = content if isinstance(content, list) else [content]
+            texts = [item.get('text') for item in items if isinstance(item, dict) and item.get('type') == 'text']
+        text = " ".join(text.strip() for text in texts if text and text.strip())
+        if text:
+            return text
+    return None
+
+
+def find_location(message):
+    """:return: The WKT Point of a user 'location' message, or None."""
+    if not message or message.get('role') != 'user':
+        return None
+    content = message.get('content')
+    items = content if isinstance(content, list) else [content]
+    for item in items:
+        if isinstance(item, dict) and item.get('type') == 'location' and item.get('location'):
+            return convert_to_wkt(item['location'])
+    return None
+
+
+def message_hash(message) -> str:
+    """SHA-1 of a message's canonical JSON, identifying the last message a turn processed."""
+    return hashlib.sha1(orjson.dumps(message, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def processed_message_count(messages, progress) -> int:
+    """
+    Number of leading messages already processed by earlier turns of the session. The client
+    resends the whole conversation, so this is the stored count if the message at that position
+    is still the one processed last; 0 (process everything) if the history was edited, cut, or
+    has no new message.
+
+    :param progress: What get_chat_progress returned for the session, or None.
+    """
+    if not progress:
+        return 0
+    count = progress["processed_message_count"]
+    if 0 < count < len(messages) and message_hash(messages[count - 1]) == progress["last_message_hash"]:
+        return count
+    return 0
+
+
+def get_location_from_db(db_session, chat_session, account, back_hours=None):
+    """
+    Looks up the latest location known for the chat session, from the session location cache
+    and, on a miss, from the chat history.
+
+    :param db_session: database connection session.
+    :param chat_session: chat_session database item.
+    :param account: account database item.
+    :return: A WKT Point string representing the location, or None.
+    """
+    back_hours = Config.LOCATION_BACK_HOURS if back_hours is None else back_hours
+    location = get_session_location(chat_session.id, account.id)
+    if location is None:
+        location = get_latest_location_from_db(db_session, chat_session.id, account.id, back_hours)
+    return location
+
+
+class ChatImage:
+    """One image of a chat turn, from reading it to its stored row."""
+
+    def __init__(self, image_data, metadata):
+        self.image_data = image_data
+        self.md5 = image_data.md5
+        self.metadata = metadata
+        self.embedding = None
+        self.image = None
+
+
+class ChatTurn:
+    """State of one /process_chat_json request as it moves through the stages."""
+
+    def __init__(self, data, images=None):
+        self.data = data
+        self.messages = data.get("messages")
+        self.images = images or []  # ChatImage per distinct image of the new messages, in message order
+        latest = self.images[-1] if self.images else None
+        # The latest image of the conversation, which the location and the chat history refer to
+        self.image_metadata = latest.metadata if latest else {}
+        self.image_md5 = latest.md5 if latest else None
+        self.image_embedding = None
+        self.image = None
+        self.account = None
+        self.chat_session = None
+        self.location = None
+        self.image_reused = False  # The latest image was found and stored by an earlier turn
+        self.prompt = None  # Text of the latest new user message, searched when the turn has no image
+        self.text_embedding = None
+
+    def close_images(self):
+        for chat_image in self.images:
+            chat_image.image_data.close()
+
+
+def load_chat_image(image_url) -> ChatImage:
+    image_data = ImageBytes.load(image_url)
+    return ChatImage(image_data, extract_image_metadata(image_data))
+
+
+def load_chat_turn(data, progress=None) -> ChatTurn:
+    """
+    Stage without database or network access: reads every image of the new messages, their
+    MD5 and EXIF metadata; an image sent twice is kept once.
+
+    Only the messages added since the previous turn of the session are searched. If none of them
+    has an image, the latest image of the earlier turns is carried over instead of being decoded
+    again.
+
+    :param data: The request body, validated against ChatJsonSchema.
+    :param progress: What get_chat_progress returned for the session, or None.
+    """
+    messages = data.get("messages")
+    start = processed_message_count(messages, progress)
+    image_urls = find_image_urls(messages, start)
+    if len(image_urls) > 1:
+        with ThreadPoolExecutor(max_workers=Config.INGEST_READ_WORKERS) as pool:
+            loaded = list(pool.map(load_chat_image, image_urls))
+    else:
+        loaded = [load_chat_image(image_url) for image_url in image_urls]
+
+    images = {}
+    for chat_image in loaded:
+        repeated = images.pop(chat_image.md5, None)
+        if repeated is not None:
+            repeated.image_data.close()
+        images[chat_image.md5] = chat_image  # A repeated image counts at its latest position
+    turn = ChatTurn(data, list(images.values()))
+    turn.prompt = find_prompt_text(messages, start)
+
+    if not turn.images and start and progress["last_image"] is not None:
+        turn.image = progress["last_image"]
+        turn.image_md5 = turn.image.md5
+        turn.image_reused = True
+        if progress["last_image_location"]:
+            turn.image_metadata = {"WKT Point": progress["last_image_location"]}
+    return turn
+
+
+def resolve_chat_location(db_session, turn: ChatTurn, account_source, raw_headers):
+    """
+    Stores the account and chat session, then settles the location the turn is answered for.
+    A location message after the image wins over the image's GPS, which wins over the session's.
+
+    :return: The WKT Point, or None.
+    """
+    turn.account = account_to_db(db_session, turn.data.get("user"), account_source, raw_headers)
+    turn.chat_session = chat_session_to_db(db_session, turn.data.get("session"), datetime.now(TZ))
+
+    location = find_location(turn.messages[-1]) if turn.messages else None
+    turn.location = location or turn.image_metadata.get("WKT Point") \
+        or get_location_from_db(db_session, turn.chat_session, turn.account)
+    return turn.location
+
+
+def embed_chat_images(db_session, turn: ChatTurn):
+    """Embeds all images of the turn at once, see get_image_embeddings, and releases their bytes."""
+    try:
+        embeddings = get_image_embeddings([(chat_image.image_data, chat_image.md5) for chat_image in turn.images],
+                                          db_session)
+    finally:
+        turn.close_images()
+    for chat_image, embedding in zip(turn.images, embeddings):
+        chat_image.embedding = embedding
+    turn.image_embedding = turn.images[-1].embedding
+
+
+def embed_chat_prompt(db_session, turn: ChatTurn):
+    """
+    Embeds the prompt of a turn without an image embedding, see get_text_embedding; a prompt
+    asked before is served from the cache or the prompt_embedding table.
+    """
+    if turn.image_embedding is None and turn.prompt:
+        turn.text_embedding = get_text_embedding(turn.prompt, db_session)
+    return turn.text_embedding
+
+
+def store_chat_images(db_session, turn: ChatTurn):
+    """
+    Stores the turn's images, with their devices and embeddings, in one bulk insert; images
+    already stored are looked up instead. :return: The Image row of the latest image.
+    """
+    records = []
+    for chat_image in turn.images:
+        device_item = device_to_db(db_session, chat_image.metadata)
+        records.append({"path": chat_image.image_data.path, "md5": chat_image.md5, "metadata": chat_image.metadata,
+                        "embedding": chat_image.embedding, "device_id": device_item.id if device_item else None})
+    stored = images_to_db(db_session, records, turn.account.id)
+    existing = images_by_md5(db_session, [chat_image.md5 for chat_image, image in zip(turn.images, stored)
+                                          if image is None])
+    for chat_image, image in zip(turn.images, stored):
+        chat_image.image = image if image is not None else existing[chat_image.md5]
+    turn.image = turn.images[-1].image
+    return turn.image
+
+
+def chat_images_event(turn: ChatTurn) -> dict:
+    """Payload of the 'image_embedded' event: the latest image, and every image of the turn."""
+    return {"md5": turn.image_md5, "image_id": turn.image.id,
+            "images": [{"md5": chat_image.md5, "image_id": chat_image.image.id} for chat_image in turn.images]}
+
+
+def store_chat_history(db_session, turn: ChatTurn):
+    return chat_history_to_db(db_session, turn.chat_session, turn.account, turn.image, turn.messages[-1], turn.location)
+
+
+def store_chat_progress(db_session, turn: ChatTurn):
+    """Records that the turn processed all of its messages, for the next turn of the session."""
+    chat_progress_to_db(db_session, turn.chat_session, len(turn.messages), message_hash(turn.messages[-1]), turn.image)
+
+
+def find_chat_matches(db_session, turn: ChatTurn) -> list:
+    """
+    Images near the turn's location similar to any of its images (or to the image carried over
+    from an earlier turn), merged into one top 3. A turn without an image is matched on its
+    prompt's text embedding, against the image and transcript embeddings; empty if it has neither.
+    """
+    # TODO:
+    #   1. To implement the functions to associate transcripts to existing image data
+    #   2. To return transcript or mp3
+    #   3. if none similar image found, return a instruction to Libre to query GPT instead
+    embeddings = [chat_image.embedding for chat_image in turn.images] or [turn.image_embedding]
+    if not any(embeddings):
+        if turn.text_embedding is None:
+            return []
+        return search_images_by_text(db_session=db_session, location_wkt=turn.location,
+                                     embedding=turn.text_embedding, radius=1000, limit=3)
+    return search_images_multi(db_session=db_session, location_wkt=turn.location, embeddings=embeddings,
+                               radius=1000, threshold=0.5, limit=3)
+
+
+def chat_result(turn: ChatTurn, images: list) -> dict:
+    return {"message": "JSON data is valid", "location": turn.location, "images": images}
+
+
+def chat_turn_events(db_session, data, account_source, raw_headers):
+    """
+    Runs one validated /process_chat_json request stage by stage and yields an (event, payload)
+    pair as each stage completes:
+
+    - 'location': the location the turn is answered for (latest image GPS, an explicit location
+      message, or the session's previous location), possibly None,
+    - 'image_embedded': the images of the new messages were embedded and stored (only if there
+      are any; an image carried over from an earlier turn reuses its stored embedding),
+    - 'matches': images near the location similar to any of the turn's images or, for a turn
+      without an image, to the text of its prompt,
+    - 'result': the final payload.
+
+    The database writes of the turn run as one unit of work. Nothing runs until the first
+    event is requested.
+
+    :param data: The request body, validated against ChatJsonSchema.
+    :param account_source: Normalized client, see normalize_account_source.
+    :param raw_headers: The request headers, stored with a new account.
+    """
+    with unit_of_work(db_session):
+        turn = load_chat_turn(data, get_chat_progress(db_session, data.get("session")))
+
+        location = resolve_chat_location(db_session, turn, account_source, raw_headers)
+        yield "location", {"location": location}
+
+        if turn.images:
+            embed_chat_images(db_session, turn)
+            store_chat_images(db_session, turn)
+            yield "image_embedded", chat_images_event(turn)
+        elif turn.image_reused:
+            turn.image_embedding = get_stored_image_embedding(turn.image_md5, db_session)
+
+        store_chat_progress(db_session, turn)
+
+        if not location:
+            yield "result", {"assistant": ASK_FOR_LOCATION}
+            return
+
+        embed_chat_prompt(db_session, turn)
+        store_chat_history(db_session, turn)
+
+    # Only cache the location once it is committed with the chat history
+    set_session_location(turn.chat_session.id, turn.account.id, location)
+
+    images = find_chat_matches(db_session, turn)
+    yield "matches", {"images": images}
+
+    yield "result", chat_result(turn, images)
+
+
+def format_sse(event, payload) -> str:
+    """Encodes one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {current_app.json.dumps(payload)}\n\n"
+
+
+def sse_stream(events, db_session):
+    """
+    Turns chat_turn_events into an SSE body. The status line is already sent when a stage
+    fails, so errors are reported as a final 'error' event.
+    """
+    try:
+        for event, payload in events:
+            yield format_sse(event, payload)
+    except VectorizerError as e:
+        db_session.rollback()
+        yield format_sse("error", {"error": "Embedding service unavailable", "details": str(e)})
+    except Exception as e:
+        db_session.rollback()
+        yield format_sse("error", {"error": "An error occurred", "details": str(e)})
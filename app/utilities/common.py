@@ -1,11 +1,23 @@
+import re
 import tzlocal
 import json
+import logging
 from datetime import datetime
+from urllib.parse import urlsplit
 from pytz import timezone, UTC
 
 TZ = tzlocal.get_localzone()
 
 
+def get_logger():
+    """The Flask app's logger inside an app context, else the 'app' logger (e.g. on worker threads)."""
+    from flask import current_app, has_app_context
+    return current_app.logger if has_app_context() else logging.getLogger("app")
+
+# Format written by routes.get_header_info, and stored in account.source before it was normalized
+HEADER_INFO_PATTERN = re.compile(r"^User-Agent: (?P<user_agent>.*), Referer: (?P<referer>.*?), X-Forwarded-For: (?P<x_forwarded_for>.*)$")
+
+
 
 def write_embedding_to_file(embedding: list, file_path: str):
     """
@@ -57,4 +69,38 @@ def convert_datetime_with_timezone(local_time: str, tz_name: str = "UTC", format
         return local_tz.localize(naive_datetime)
     except Exception as e:
         print(f"An error occurred while converting datetime with timezone: {e}")
-        return datetime.now(UTC)
\ No newline at end of file
+        return datetime.now(UTC)
+
+
+def normalize_account_source(user_agent: str = None, referer: str = None) -> str:
+    """
+    Reduces the request headers to a source that stays stable across proxies and client updates:
+    the Referer host if there is one, else the User-Agent product name without its version.
+    X-Forwarded-For is ignored because it changes with every proxy hop.
+
+    :param user_agent: The User-Agent header, e.g. "axios/1.7.2".
+    :param referer: The Referer header, e.g. "https://chat.example.com/c/new".
+    :return: The normalized source, e.g. "chat.example.com" or "axios"; "unknown" if neither is usable.
+    """
+    if referer and referer != "None":
+        host = urlsplit(referer if "//" in referer else f"//{referer}").hostname
+        if host:
+            return host.lower()
+    if user_agent and user_agent != "None":
+        product = user_agent.strip().split(" ", 1)[0].split("/", 1)[0]
+        if product:
+            return product.lower()
+    return "unknown"
+
+
+def parse_header_info(header_info: str) -> dict:
+    """
+    Splits a string built by get_header_info back into its headers.
+
+    :param header_info: "User-Agent: ..., Referer: ..., X-Forwarded-For: ...".
+    :return: A dict with keys user_agent, referer and x_forwarded_for, or an empty dict if the format does not match.
+    """
+    match = HEADER_INFO_PATTERN.match(header_info or "")
+    if not match:
+        return {}
+    return {key: (None if value == "None" else value) for key, value in match.groupdict().items()}
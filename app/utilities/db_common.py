@@ -1,79 +1,375 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy import event, inspect
 from contextlib import contextmanager
 from flask import Blueprint, request, jsonify
-from sqlalchemy import func, select, and_, or_
+from sqlalchemy import func, select, update, and_, or_, text, literal, union_all, Integer, String
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import aliased, joinedload
 from datetime import datetime, timedelta
 from geoalchemy2.functions import ST_DWithin, ST_GeogFromText
 from sqlalchemy.dialects.postgresql import ARRAY
 
-from app.utilities.common import TZ, convert_datetime_with_timezone 
+from app.config import Config
+from app.utilities.common import TZ, convert_datetime_with_timezone, normalize_account_source, parse_header_info
+from app.utilities.cache import LRUCache
 from app.utilities.image import convert_to_wkt
-from app.models import Account, ChatSession, ChatHistory, Image, Embedding, Device
+from app.models import Account, ChatSession, ChatHistory, Image, Embedding, Device, PromptEmbedding
 
 
-def account_to_db(db_session, account_name, account_source):
-    account = db_session.query(Account).filter_by(name=account_name, source=account_source).first()
-    if not account:
-        account = Account(name=account_name, source=account_source, create_time=datetime.now(TZ))
-        db_session.add(account)
+@contextmanager
+def unit_of_work(db_session):
+    """
+    Runs a block of *_to_db calls as one transaction. The helpers only flush, so the rows they
+    create get their ids immediately but are committed once, when the block exits cleanly.
+    Any exception rolls the whole block back and is re-raised.
+
+    :param db_session: SQLAlchemy session object.
+    """
+    try:
+        yield db_session
         db_session.commit()
-    return account
+    except Exception:
+        db_session.rollback()
+        raise
+
+
+def _upsert(db_session, model, values, conflict_columns, returning_inserted=False):
+    """
+    Get-or-create: INSERT ... ON CONFLICT (conflict_columns) DO NOTHING RETURNING, then a SELECT by
+    the conflict columns when the row already existed. DO NOTHING takes no row lock on the existing
+    row, so the request's transaction (which may run through vectorizer calls before it commits)
+    never makes concurrent requests for the same account or session wait. A conflicting INSERT
+    waits for the other transaction to finish, so the SELECT, with its fresh snapshot, sees its row.
+
+    :param model: Mapped class whose table has a unique constraint on conflict_columns.
+    :param values: Column values for a new row.
+    :param conflict_columns: Names of the columns of that unique constraint.
+    :param returning_inserted: Also return whether the row was inserted by this statement.
+    :return: The mapped object, or (object, inserted) if returning_inserted is set.
+    """
+    insert_stmt = insert(model).values(**values).on_conflict_do_nothing(index_elements=conflict_columns)
+    insert_stmt = insert_stmt.returning(model)
+    select_stmt = select(model).where(*(getattr(model, column) == values[column] for column in conflict_columns))
+    options = {"populate_existing": True}
+
+    while True:
+        instance = db_session.execute(insert_stmt, execution_options=options).scalar_one_or_none()
+        inserted = instance is not None
+        if not inserted:
+            instance = db_session.execute(select_stmt, execution_options=options).scalar_one_or_none()
+        if instance is not None:  # None only if the conflicting row was deleted in between: insert again
+            return (instance, inserted) if returning_inserted else instance
+
+
+# Accounts, devices and chat sessions never change the values they are created with, so their
+# rows are cached by natural key (a chat session's progress columns change, and are not cached). Rows created or served inside a transaction only become (or stay) cached if that
+# transaction commits; see the session listeners below.
+IDENTITY_CACHE = LRUCache(Config.IDENTITY_CACHE_SIZE, ttl=Config.IDENTITY_CACHE_TTL)
+PENDING_IDENTITIES = "identity_cache_pending"  # session.info key: rows to cache after commit
+USED_IDENTITIES = "identity_cache_used"  # session.info key: cache hits to evict after rollback
+
+
+def _cached_upsert(db_session, model, values, conflict_columns):
+    """
+    _upsert() behind IDENTITY_CACHE. A hit attaches the cached row to the session without any
+    SQL, so only cache misses reach Postgres. Only the primary key and the columns in 'values' are
+    cached; other columns are left unloaded on a cached row and read when accessed.
+
+    :return: The mapped object, attached to db_session.
+    """
+    key = (model.__tablename__,) + tuple(values[column] for column in conflict_columns)
+    cached = IDENTITY_CACHE.get(key)
+    if cached is not None:
+        db_session.info.setdefault(USED_IDENTITIES, set()).add(key)
+        instance = model(**cached)
+        make_transient_to_detached(instance)
+        return db_session.merge(instance, load=False)
+
+    instance = _upsert(db_session, model, values, conflict_columns)
+    cached_columns = set(values) | {column.key for column in inspect(model).primary_key}
+    db_session.info.setdefault(PENDING_IDENTITIES, {})[key] = {
+        column: getattr(instance, column) for column in cached_columns
+    }
+    return instance
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending_identities(session):
+    for key, values in session.info.pop(PENDING_IDENTITIES, {}).items():
+        IDENTITY_CACHE.set(key, values)
+    session.info.pop(USED_IDENTITIES, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_identities(session):
+    session.info.pop(PENDING_IDENTITIES, None)
+    # A cached id may be why the transaction failed (e.g. the row was deleted), so drop it too
+    for key in session.info.pop(USED_IDENTITIES, ()):
+        IDENTITY_CACHE.delete(key)
+
+
+def account_to_db(db_session, account_name, account_source, raw_headers=None):
+    return _cached_upsert(db_session, Account,
+                          {"name": account_name, "source": account_source, "raw_headers": raw_headers,
+                           "create_time": datetime.now(TZ)},
+                          ["name", "source"])
+
+# Columns that point at account.id and are rewritten when duplicate accounts are merged
+ACCOUNT_REFERENCES = [('image', 'creator_id'), ('chat_history', 'account_id'), ('ingest_job', 'account_id')]
+
+
+def plan_account_compaction(accounts):
+    """
+    Works out which accounts are duplicates once their source is normalized. Sources still holding
+    the full header string (as stored before normalization) are normalized; the lowest id of each
+    (name, normalized source) group is kept.
+
+    :param accounts: Iterable of (id, name, source, raw_headers) rows, in id order.
+    :return: A tuple (merges, renames): [{"id", "keep_id"}] for the duplicates to fold into the kept
+             account, and [{"id", "source", "raw_headers"}] for kept accounts whose source changes.
+    """
+    kept = {}
+    merges, renames = [], []
+    for account_id, name, source, raw_headers in accounts:
+        headers = parse_header_info(source)
+        normalized = normalize_account_source(headers.get("user_agent"), headers.get("referer")) if headers else source
+        key = (name, normalized)
+        if key in kept:
+            merges.append({"id": account_id, "keep_id": kept[key]})
+            continue
+        kept[key] = account_id
+        if normalized != source:
+            renames.append({"id": account_id, "source": normalized, "raw_headers": raw_headers or source})
+    return merges, renames
+
+
+def compact_accounts(db_session, dry_run=False) -> dict:
+    """
+    Merges accounts that only differ by the header string they were created with. References are
+    moved in bulk through a temporary mapping table (one UPDATE per referencing column), the
+    duplicates are deleted, then the kept accounts get their normalized source. Runs as one
+    transaction; the caller commits. Only this process's IDENTITY_CACHE is cleared: other server
+    processes can serve merged-away ids until IDENTITY_CACHE_TTL expires or they are restarted.
+
+    :param dry_run: Only compute the counts.
+    :return: Counts of accounts seen, merged away and renamed.
+    """
+    accounts = db_session.execute(
+        select(Account.id, Account.name, Account.source, Account.raw_headers).order_by(Account.id)
+    ).all()
+    merges, renames = plan_account_compaction(accounts)
+
+    if not dry_run:
+        if merges:
+            db_session.execute(text(
+                "CREATE TEMP TABLE account_merge (id integer PRIMARY KEY, keep_id integer NOT NULL) ON COMMIT DROP"
+            ))
+            db_session.execute(text("INSERT INTO account_merge (id, keep_id) VALUES (:id, :keep_id)"), merges)
+            for table, column in ACCOUNT_REFERENCES:
+                db_session.execute(text(
+                    f"UPDATE {table} SET {column} = m.keep_id FROM account_merge m WHERE {table}.{column} = m.id"
+                ))
+            db_session.execute(text("DELETE FROM account USING account_merge m WHERE account.id = m.id"))
+        if renames:
+            db_session.execute(update(Account), renames)
+        IDENTITY_CACHE.clear()
+
+    return {"accounts": len(accounts), "merged": len(merges), "renamed": len(renames)}
 
 def device_to_db(db_session, image_metadata):
     device = None
     if 'Make' in image_metadata and 'Model' in image_metadata:
-        device_maker = image_metadata['Make']
-        device_model = image_metadata['Model']
-        device = db_session.query(Device).filter_by(device_maker=device_maker, device_model=device_model).first()
-        if not device:
-            device = Device(device_maker=device_maker, device_model=device_model)
-            db_session.add(device)
-            db_session.commit()
+        device = _cached_upsert(db_session, Device,
+                                {"device_maker": image_metadata['Make'], "device_model": image_metadata['Model']},
+                                ["device_maker", "device_model"])
     return device
 
-def image_to_db(db_session, image_path, image_metadata, image_md5, image_embedding, account_id, device_id):
+def image_values(image_path, image_metadata, image_md5, account_id, device_id):
+    """Builds the Image column values from the metadata returned by extract_image_metadata."""
     if image_metadata.get("Datetime Taken") and image_metadata.get("Timezone"):
         taken_time = convert_datetime_with_timezone(image_metadata.get("Datetime Taken"), image_metadata.get("Timezone"))
     else:
         taken_time = datetime.now(TZ)
-    image = db_session.query(Image).filter_by(md5=image_md5).first()
-    if not image:
-        image = Image(
-            path=image_path,
-            md5=image_md5,
-            creator_id=account_id,
-            device_id=device_id,
-            location=image_metadata.get("WKT Point"),
-            taken_time=taken_time,
-            focus_35mm=image_metadata.get("Focal Length (35mm)"),
-            orientation_from_north=image_metadata.get("Orientation (degrees)"),
-            other_metadata={
-                "Make": image_metadata.get("Make"),
-                "Model": image_metadata.get("Model"),
-                "Altitude": image_metadata.get("Altitude"),
-                #"Latitude": image_metadata.get("Latitude"),
-                #"Longitude": image_metadata.get("Longitude"),
-            }
-        )
-        db_session.add(image)
-        db_session.commit()
+    return dict(
+        path=image_path,
+        md5=image_md5,
+        creator_id=account_id,
+        device_id=device_id,
+        location=image_metadata.get("WKT Point"),
+        taken_time=taken_time,
+        focus_35mm=image_metadata.get("Focal Length (35mm)"),
+        orientation_from_north=image_metadata.get("Orientation (degrees)"),
+        other_metadata={
+            "Make": image_metadata.get("Make"),
+            "Model": image_metadata.get("Model"),
+            "Altitude": image_metadata.get("Altitude"),
+            #"Latitude": image_metadata.get("Latitude"),
+            #"Longitude": image_metadata.get("Longitude"),
+        }
+    )
 
-        embedding = Embedding(image_id=image.id, image_embedding=image_embedding)
+def image_to_db(db_session, image_path, image_metadata, image_md5, image_embedding, account_id, device_id):
+    image, inserted = _upsert(db_session, Image,
+                              image_values(image_path, image_metadata, image_md5, account_id, device_id),
+                              ["md5"], returning_inserted=True)
+    if inserted:
+        embedding = Embedding(image_id=image.id, image_embedding=image_embedding,
+                              model_version=Config.AZURE_VISION_MODEL_VERSION)
         db_session.add(embedding)
-        db_session.commit()
+        db_session.flush()
 
     return image
 
 
+def find_existing_md5s(db_session, image_md5s) -> set:
+    """
+    Returns the subset of the given MD5s that already have an Image row.
+
+    :param image_md5s: Iterable of image MD5s.
+    :return: A set of MD5s already stored.
+    """
+    image_md5s = list(image_md5s)
+    if not image_md5s:
+        return set()
+    return set(db_session.execute(select(Image.md5).where(Image.md5.in_(image_md5s))).scalars())
+
+
+def images_to_db(db_session, records, account_id):
+    """
+    Inserts many images and their embeddings with one bulk INSERT per table. Nothing is
+    committed; the caller's unit of work decides when. Images whose MD5 is already stored
+    (e.g. inserted by a concurrent upload since the caller checked) are skipped by ON CONFLICT.
+
+    :param records: List of dicts with keys 'path', 'md5', 'metadata', 'embedding' and optionally
+                    'location' (WKT used when the metadata has no GPS position) and 'device_id'.
+    :param account_id: The creator of the images.
+    :return: A list in the order of 'records' with the new Image, or None where the MD5 already existed.
+    """
+    rows = []
+    for record in records:
+        values = image_values(record["path"], record["metadata"], record["md5"], account_id, record.get("device_id"))
+        if values["location"] is None and record.get("location"):
+            values["location"] = record["location"]
+        rows.append(values)
+
+    # Single INSERT ... ON CONFLICT DO NOTHING RETURNING for the whole batch
+    stmt = insert(Image).on_conflict_do_nothing(index_elements=["md5"]).returning(Image)
+    inserted = {image.md5: image for image in db_session.scalars(stmt, rows)}
+    images = [inserted.pop(record["md5"], None) for record in records]
+
+    embeddings = [
+        Embedding(image_id=image.id, image_embedding=record["embedding"],
+                  model_version=Config.AZURE_VISION_MODEL_VERSION)
+        for image, record in zip(images, records) if image is not None
+    ]
+    if embeddings:
+        db_session.add_all(embeddings)
+        db_session.flush()
+    return images
+
+
+def images_by_md5(db_session, image_md5s) -> dict:
+    """:return: The stored Image rows among the given MD5s, keyed by MD5."""
+    image_md5s = list(image_md5s)
+    if not image_md5s:
+        return {}
+    return {image.md5: image for image in db_session.scalars(select(Image).where(Image.md5.in_(image_md5s)))}
+
+
+def find_embeddings_by_md5s(db_session, image_md5s, model_version) -> dict:
+    """
+    find_embedding_by_md5 for several images in one query.
+
+    :return: The embeddings found, as lists of floats keyed by image MD5.
+    """
+    image_md5s = list(image_md5s)
+    if not image_md5s:
+        return {}
+    query = (
+        select(Image.md5, Embedding.image_embedding)
+        .join(Image, Embedding.image_id == Image.id)
+        .where(Image.md5.in_(image_md5s), Embedding.model_version == model_version)
+    )
+    return {image_md5: embedding.tolist() for image_md5, embedding in db_session.execute(query)}
+
+
+def find_embedding_by_md5(db_session, image_md5, model_version):
+    """
+    Looks up a stored image embedding by the image's MD5 and the vectorizer model version.
+
+    :param image_md5: MD5 of the image bytes.
+    :param model_version: Vectorizer model version the embedding must come from.
+    :return: The embedding as a list of floats, or None if the image was never embedded.
+    """
+    query = (
+        select(Embedding.image_embedding)
+        .join(Image, Embedding.image_id == Image.id)
+        .where(Image.md5 == image_md5, Embedding.model_version == model_version)
+        .limit(1)
+    )
+    embedding = db_session.execute(query).scalar()
+    return embedding.tolist() if embedding is not None else None
+
+
+def find_prompt_embedding(db_session, prompt_hash, model_version):
+    """
+    Looks up a stored prompt embedding by the hash of the normalized prompt and the vectorizer
+    model version.
+
+    :return: The embedding as a list of floats, or None if the prompt was never embedded.
+    """
+    embedding = db_session.execute(
+        select(PromptEmbedding.embedding)
+        .where(PromptEmbedding.prompt_hash == prompt_hash, PromptEmbedding.model_version == model_version)
+    ).scalar_one_or_none()
+    return embedding.tolist() if embedding is not None else None
+
+
+def prompt_embedding_to_db(db_session, prompt_hash, model_version, embedding):
+    """Stores a prompt embedding; a concurrent request storing the same prompt first wins."""
+    db_session.execute(
+        insert(PromptEmbedding)
+        .values(prompt_hash=prompt_hash, model_version=model_version, embedding=embedding,
+                create_time=datetime.now(TZ))
+        .on_conflict_do_nothing(index_elements=["prompt_hash", "model_version"])
+    )
+
 
 def chat_session_to_db(db_session, session_id, create_time):
-    chat_session = db_session.query(ChatSession).filter_by(session_id=session_id).first()
-    if not chat_session:
-        chat_session = ChatSession(session_id=session_id, create_time=create_time)
-        db_session.add(chat_session)
-        db_session.commit()
-    return chat_session
+    return _cached_upsert(db_session, ChatSession, {"session_id": session_id, "create_time": create_time},
+                          ["session_id"])
+
+
+def get_chat_progress(db_session, session_id):
+    """
+    Reads how far earlier turns of a chat session got through its messages, with the latest image
+    they found, in one query by session_id.
+
+    :param session_id: The client's session id (chat_session.session_id).
+    :return: A dict with 'processed_message_count', 'last_message_hash', 'last_image' (Image or
+             None) and 'last_image_location' (WKT or None), or None for a new session.
+    """
+    query = (
+        select(ChatSession.processed_message_count, ChatSession.last_message_hash, Image,
+               func.ST_AsText(Image.location))
+        .select_from(ChatSession)
+        .outerjoin(Image, Image.id == ChatSession.last_image_id)
+        .where(ChatSession.session_id == session_id)
+    )
+    row = db_session.execute(query).first()
+    if row is None:
+        return None
+    return {"processed_message_count": row[0], "last_message_hash": row[1], "last_image": row[2],
+            "last_image_location": row[3]}
+
+
+def chat_progress_to_db(db_session, chat_session, processed_message_count, last_message_hash, last_image):
+    db_session.execute(
+        update(ChatSession)
+        .where(ChatSession.id == chat_session.id)
+        .values(processed_message_count=processed_message_count, last_message_hash=last_message_hash,
+                last_image_id=last_image.id if last_image else None)
+    )
 
 
 def chat_history_to_db(db_session, chat_session, account, image, prompt, location):
@@ -81,13 +377,13 @@ def chat_history_to_db(db_session, chat_session, account, image, prompt, locatio
         session_id=chat_session.id,
         account_id=account.id,
         location=location,
-        image_id=image.id,
+        image_id=image.id if image else None,
         time=datetime.now(TZ),
         prompt=prompt,
         llm_reply=None  
     )
     db_session.add(chat_history)
-    db_session.commit()
+    db_session.flush()
     return chat_history
 
 def _image_data_to_db(
@@ -123,7 +419,7 @@ def _image_data_to_db(
                 create_time=datetime.now(TZ)
             )
             db_session.add(account)
-            db_session.commit()
+            db_session.flush()
 
         # Ensure the chat session exists or create a new one
         chat_session = db_session.query(ChatSession).filter_by(session_id=session_id).first()
@@ -133,7 +429,7 @@ def _image_data_to_db(
                 create_time= datetime.now(TZ)
             )
             db_session.add(chat_session)
-            db_session.commit()
+            db_session.flush()
 
         image = db_session.query(Image).filter_by(md5=image_md5).first()
 
@@ -149,7 +445,7 @@ def _image_data_to_db(
                         device_model=device_model
                     )
                     db_session.add(device)
-                    db_session.commit()
+                    db_session.flush()
             else:
                 device = None
 
@@ -178,15 +474,16 @@ def _image_data_to_db(
                 }
             )
             db_session.add(image)
-            db_session.commit()
+            db_session.flush()
 
             # Create a new Embedding record
             embedding = Embedding(
                 image_id=image.id,
-                image_embedding=image_embedding
+                image_embedding=image_embedding,
+                model_version=Config.AZURE_VISION_MODEL_VERSION
             )
             db_session.add(embedding)
-            db_session.commit()
+            db_session.flush()
 
         # Optionally add to chat_history (if applicable)
         chat_history = ChatHistory(
@@ -211,6 +508,16 @@ def _image_data_to_db(
 
 
 
+def _within_radius(location_wkt: str, radius: float):
+    """
+    Builds the ST_DWithin predicate for image locations.
+
+    Image.location is already a geography column, so it is compared as-is; wrapping it in a
+    Geography() cast would hide the column from its spatial index.
+    """
+    return ST_DWithin(Image.location, ST_GeogFromText(location_wkt), radius)
+
+
 def find_images_by_location(db_session: Session, location_wkt: str, radius: float = 1000) -> list:
     """
     Finds images within a specified radius of a location.
@@ -222,13 +529,7 @@ def find_images_by_location(db_session: Session, location_wkt: str, radius: floa
     try:
         return (
             db_session.query(Image)
-            .filter(
-                ST_DWithin(
-                    func.Geography(Image.location),  # Geography type for location
-                    func.Geography(ST_GeogFromText(location_wkt)),  # Convert WKT to Geography
-                    radius
-                )
-            )
+            .filter(_within_radius(location_wkt, radius))
             .all()
         )
     except Exception as e:
@@ -236,66 +537,117 @@ def find_images_by_location(db_session: Session, location_wkt: str, radius: floa
 
 
 
-def find_images_by_similarity(db_session: Session, image_ids: list, embedding: list, threshold: float = 0.5, limit: int = 10) -> list:
+@contextmanager
+def vector_search_settings(db_session: Session, exact: bool = None, limit: int = 10):
+    """
+    Applies the pgvector query-time settings from Config for the statements run inside the block.
+
+    Approximate mode sizes the HNSW candidate list (or IVFFlat probes) for the current transaction.
+    Exact mode turns off plain index scans so the ANN index is skipped and every candidate is ranked;
+    the GiST location index is still reachable through a bitmap scan.
+
+    :param exact: True for an exact scan, False for the ANN index, None for Config.VECTOR_SEARCH_EXACT.
+    :param limit: The number of rows the search returns; ef_search is raised to at least this.
+    """
+    if exact is None:
+        exact = Config.VECTOR_SEARCH_EXACT
+
+    if exact:
+        db_session.execute(text("SET LOCAL enable_indexscan = off"))
+    elif Config.VECTOR_INDEX_TYPE == "ivfflat":
+        db_session.execute(text(f"SET LOCAL ivfflat.probes = {int(Config.IVFFLAT_PROBES)}"))
+    else:
+        db_session.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(Config.HNSW_EF_SEARCH), int(limit))}"))
+        if Config.HNSW_ITERATIVE_SCAN:
+            db_session.execute(text("SELECT set_config('hnsw.iterative_scan', :mode, true)"),
+                               {"mode": Config.HNSW_ITERATIVE_SCAN})
+    yield
+    # Only on success: after an error the transaction is aborted and any statement would fail, masking
+    # the original exception; the rollback discards the SET LOCAL anyway.
+    if exact:
+        db_session.execute(text("SET LOCAL enable_indexscan = on"))
+
+
+def _similarity_query(embedding: list, threshold: float, limit: int, image_ids: list = None,
+                      location_wkt: str = None, radius: float = 1000, *, extra_columns: tuple = (),
+                      vector_column=Embedding.image_embedding):
+    """
+    The top-'limit' images closest to 'embedding' under 'threshold', see find_images_by_similarity.
+    'extra_columns' are appended to the selected columns; 'vector_column' is the embedding column
+    ranked, image_embedding or transcript_embedding.
+    """
+    cosine_distance = vector_column.cosine_distance(embedding)
+    filters = [cosine_distance < threshold]
+    if image_ids is not None:
+        filters.append(Image.id.in_(image_ids))
+    if location_wkt:
+        filters.append(_within_radius(location_wkt, radius))
+
+    return select(
+            Embedding.id.label("embedding_id"),
+            cosine_distance.label("cosine_distance"),
+            Image.id.label("image_id"),
+            Image.path.label("image_path"),
+            func.ST_AsText(Image.location).label("image_location"),
+            Image.other_metadata.label("image_other_metadata"),
+            *extra_columns
+            ).select_from(Embedding).\
+                join(Image, Embedding.image_id == Image.id).\
+                filter(*filters).\
+                order_by(cosine_distance.asc()).\
+                limit(limit)
+
+
+def find_images_by_similarity(db_session: Session, image_ids: list, embedding: list, threshold: float = 0.5, limit: int = 10,
+                              location_wkt: str = None, radius: float = 1000, exact: bool = None) -> list:
     """
     Finds images based on cosine similarity of embeddings.
 
-    :param image_ids: A list of image IDs to filter by (e.g., results of location-based search).
+    :param image_ids: A list of image IDs to filter by, or None to search all images.
     :param embedding: The vector embedding for cosine similarity search.
     :param threshold: The similarity threshold for filtering results (default: 0.5).
     :param limit: Maximum number of similar images to return (default: 10).
-    :return: A list of dictionaries containing similar images and their metadata.
+    :param location_wkt: Optional WKT location; when given, only images within 'radius' are ranked.
+    :param radius: The radius in meters used with 'location_wkt' (default: 1 km).
+    :param exact: Exact (True) or index-based approximate (False) ranking; None uses Config.VECTOR_SEARCH_EXACT.
+    :return: A list of rows containing similar images and their metadata.
     """
     try:
-        if not image_ids:
+        if image_ids is not None and not image_ids:
             return []  # No images to process
 
         if not isinstance(embedding, list) or not embedding:
             raise ValueError("Embedding must be a non-empty list.")
 
-        query = select(
-                Embedding.id.label("embedding_id"),
-                Embedding.image_embedding.cosine_distance(embedding).label("cosine_distance"),
-                Image.id.label("image_id"),
-                Image.path.label("image_path"),
-                Image.location.label("image_location"),
-                Image.other_metadata.label("image_other_metadata")
-                ).select_from(Embedding).\
-                    join(Image, Embedding.image_id == Image.id).\
-                    filter(Embedding.image_embedding.cosine_distance(embedding) < threshold).\
-                    order_by(Embedding.image_embedding.cosine_distance(embedding).asc()).\
-                    limit(limit)
-
-        return db_session.execute(query).fetchall()
+        query = _similarity_query(embedding, threshold, limit, image_ids, location_wkt, radius)
+
+        with vector_search_settings(db_session, exact, limit):
+            return db_session.execute(query).fetchall()
 
     except Exception as e:
         raise ValueError(f"Error performing cosine similarity search: {e}")
 
 
-def search_images(db_session: Session, location_wkt: str, embedding: list, radius: float = 1000, threshold: float = 0.5, limit: int = 10) -> list:
+def search_images(db_session: Session, location_wkt: str, embedding: list, radius: float = 1000, threshold: float = 0.5, limit: int = 10,
+                  exact: bool = None) -> list:
     """
     Combines location-based and cosine similarity searches to find relevant images.
 
+    The radius filter and the cosine ranking run as a single statement, so Postgres can pick
+    the spatial index or the vector index depending on how selective the radius is.
+
     :param location_wkt: The WKT string representing the location (POINT or POINTZ).
     :param embedding: The vector embedding for cosine similarity search.
     :param radius: The radius in meters for the location search (default: 1 km).
     :param threshold: The similarity threshold for cosine similarity search (default: 0.5).
     :param limit: Maximum number of similar images to return (default: 10).
-    :return: A list of dictionaries containing the final filtered images.
+    :param exact: Passed through to find_images_by_similarity.
+    :return: A list of dictionaries containing the final filtered images, with 'image_location' as WKT.
     """
     try:
-        # Step 1: Find images by location
-        location_results = find_images_by_location(db_session, location_wkt, radius)
-        if not location_results:
-            return []
-
-        # Extract image IDs from location-based search results
-        image_ids = [image.id for image in location_results]
+        similarity_results = find_images_by_similarity(db_session, None, embedding, threshold, limit,
+                                                       location_wkt=location_wkt, radius=radius, exact=exact)
 
-        # Step 2: Find images by cosine similarity within the location results
-        similarity_results = find_images_by_similarity(db_session, image_ids, embedding, threshold, limit)
-
-        # Step 3: Format and return the results
         return [
             {
                 "embedding_id": result.embedding_id,
@@ -311,6 +663,101 @@ def search_images(db_session: Session, location_wkt: str, embedding: list, radiu
         raise ValueError(f"Error performing combined search: {e}")
 
 
+def _closest_per_image(queries: list, limit: int):
+    """
+    Merges _similarity_query results: a UNION ALL of 'queries', each image kept once with its
+    smallest distance (DISTINCT ON image_id), cut to the overall top 'limit'.
+    """
+    per_query = union_all(*queries).subquery("per_query")
+    closest = (
+        select(per_query)
+        .distinct(per_query.c.image_id)
+        .order_by(per_query.c.image_id, per_query.c.cosine_distance)
+        .subquery("closest")
+    )
+    return select(closest).order_by(closest.c.cosine_distance).limit(limit)
+
+
+def search_images_multi(db_session: Session, location_wkt: str, embeddings: list, radius: float = 1000,
+                        threshold: float = 0.5, limit: int = 10, exact: bool = None) -> list:
+    """
+    search_images for several query embeddings at once, e.g. every image of a chat turn, in one
+    statement: a UNION ALL of one top-'limit' search per embedding (each can use the vector index),
+    merged so every image appears once, with its smallest distance, and cut to the overall top 'limit'.
+
+    :param embeddings: The query embeddings.
+    :return: As search_images, each dict also holding 'query_index', the position in 'embeddings'
+             of the query the image is closest to.
+    """
+    embeddings = [embedding for embedding in embeddings if embedding]
+    if not embeddings:
+        return []
+    try:
+        query = _closest_per_image([
+            _similarity_query(embedding, threshold, limit, location_wkt=location_wkt, radius=radius,
+                              extra_columns=(literal(index, Integer).label("query_index"),))
+            for index, embedding in enumerate(embeddings)
+        ], limit)
+
+        with vector_search_settings(db_session, exact, limit):
+            rows = db_session.execute(query).fetchall()
+        return [
+            {
+                "embedding_id": row.embedding_id,
+                "cosine_distance": row.cosine_distance,
+                "image_id": row.image_id,
+                "image_path": row.image_path,
+                "image_location": row.image_location,
+                "image_other_metadata": row.image_other_metadata,
+                "query_index": row.query_index,
+            }
+            for row in rows
+        ]
+    except Exception as e:
+        raise ValueError(f"Error performing combined search: {e}")
+
+
+def search_images_by_text(db_session: Session, location_wkt: str, embedding: list, radius: float = 1000,
+                          threshold: float = None, limit: int = 10, exact: bool = None) -> list:
+    """
+    Text-to-image search for a chat prompt without an image: the prompt's vectorizeText embedding
+    lives in the same space as the image embeddings and the transcript embeddings, so both are
+    ranked within the radius, one top-'limit' each, and merged as in search_images_multi.
+
+    :param embedding: The text embedding of the prompt.
+    :param threshold: Cosine distance cut-off; None uses Config.TEXT_SEARCH_THRESHOLD.
+    :return: As search_images, each dict also holding 'matched_on', "image" or "transcript".
+    """
+    if not embedding:
+        return []
+    threshold = Config.TEXT_SEARCH_THRESHOLD if threshold is None else threshold
+    try:
+        query = _closest_per_image([
+            _similarity_query(embedding, threshold, limit, location_wkt=location_wkt, radius=radius,
+                              extra_columns=(literal(matched_on, String).label("matched_on"),),
+                              vector_column=vector_column)
+            for matched_on, vector_column in (("image", Embedding.image_embedding),
+                                              ("transcript", Embedding.transcript_embedding))
+        ], limit)
+
+        with vector_search_settings(db_session, exact, limit):
+            rows = db_session.execute(query).fetchall()
+        return [
+            {
+                "embedding_id": row.embedding_id,
+                "cosine_distance": row.cosine_distance,
+                "image_id": row.image_id,
+                "image_path": row.image_path,
+                "image_location": row.image_location,
+                "image_other_metadata": row.image_other_metadata,
+                "matched_on": row.matched_on,
+            }
+            for row in rows
+        ]
+    except Exception as e:
+        raise ValueError(f"Error performing text search: {e}")
+
+
 def get_chat_histories_from_db(db_session: Session, session_id: str, account_id: str, back_hours: int = 0) -> list:
     """
     Fetch previous chat histories based on session_id and account_id within the last 'back_hours',
@@ -347,21 +794,35 @@ def get_chat_histories_from_db(db_session: Session, session_id: str, account_id:
 
         # Execute and return the query
         results = query.all()
-        data = [
-            {
-                "id": result.id,
-                "session_id": result.session_id,
-                "account_id": result.account_id,
-                "time": result.time,
-                "location": str(result.location) if result.location else None,
-                "prompt": result.prompt,
-                "llm_reply": result.llm_reply,
-                "image_path": result.image.path if result.image else None,
-                "device_maker": result.image.device.device_maker if result.image and result.image.device else None
-            } for result in results ]
-        print(data)
         return results
 
     except Exception as e:
         raise ValueError(f"Error fetching chat histories: {e}")
 
+
+
+
+def get_latest_location_from_db(db_session: Session, chat_session_id: int, account_id: int, back_hours: int = 0):
+    """
+    Returns the most recent location of a chat session: the turn's own location, or else the
+    location of the image sent with it. Only that one value is fetched; the query walks
+    ix_chat_history_session_account_time newest first and stops at the first row with a location.
+
+    :param chat_session_id: Primary key of the ChatSession.
+    :param account_id: Primary key of the Account.
+    :param back_hours: Only consider turns from the last 'back_hours' hours (default: 0, means all).
+    :return: A WKT Point string, or None if no turn has a location.
+    """
+    location = func.coalesce(ChatHistory.location, Image.location)
+    query = (
+        select(func.ST_AsText(location))
+        .select_from(ChatHistory)
+        .outerjoin(Image, ChatHistory.image_id == Image.id)
+        .where(ChatHistory.session_id == chat_session_id, ChatHistory.account_id == account_id,
+               location.isnot(None))
+        .order_by(ChatHistory.time.desc())
+        .limit(1)
+    )
+    if back_hours > 0:
+        query = query.where(ChatHistory.time >= datetime.now(TZ) - timedelta(hours=back_hours))
+    return db_session.execute(query).scalar()
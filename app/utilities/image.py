@@ -1,14 +1,156 @@
 import pprint
 import io
 import os
+import re
+import mmap
+import struct
 import hashlib
-import piexif
+import time
+import threading
+from functools import lru_cache
 import base64
-from typing import Optional, Tuple, Dict, Union
-from PIL import Image, ExifTags
-from timezonefinder import TimezoneFinder
+from typing import Optional, Tuple, Dict, Union, TYPE_CHECKING
+from PIL import Image, ExifTags, ImageOps
 from pytz import timezone
 
+from app.config import Config
+from app.utilities.common import get_logger
+
+if TYPE_CHECKING:
+    from timezonefinder import TimezoneFinder  # Imported lazily at runtime, see get_timezone_finder
+
+
+DATA_URL_PATTERN = re.compile(r'^data:image/[\w.+-]+;base64,')
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file object over a buffer; reads copy only the requested slice."""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def __len__(self):
+        return len(self._view)
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class ImageBytes:
+    """
+    The bytes of one image, loaded once and shared by hashing, EXIF parsing and the vectorizer request.
+
+    Local files are memory-mapped, so pages are only read when touched and never copied into the
+    Python heap; data: URLs and bare base64 strings are decoded exactly once. open() hands out
+    independent, seekable readers over the same buffer.
+    """
+
+    def __init__(self, buffer, path: str = None):
+        self._buffer = buffer
+        self.path = path
+        self._md5 = None
+
+    @classmethod
+    def from_file(cls, path: str) -> "ImageBytes":
+        with open(path, "rb") as image_file:
+            if os.fstat(image_file.fileno()).st_size == 0:
+                return cls(b"", path)
+            return cls(mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+    @classmethod
+    def from_base64(cls, base64_string: str) -> "ImageBytes":
+        return cls(base64.b64decode(DATA_URL_PATTERN.sub('', base64_string, count=1)))
+
+    @classmethod
+    def load(cls, source) -> "ImageBytes":
+        """
+        :param source: Image bytes, a local file path, a data:image/...;base64 URL or a bare base64 string.
+        """
+        if isinstance(source, ImageBytes):
+            return source
+        if isinstance(source, (bytes, bytearray)):
+            return cls(bytes(source))
+        if isinstance(source, str) and not DATA_URL_PATTERN.match(source) and os.path.isfile(source):
+            return cls.from_file(source)
+        if isinstance(source, str):
+            return cls.from_base64(source)
+        raise ValueError("Input must be image bytes, a file path, a data URL or a base64 string")
+
+    @property
+    def md5(self) -> str:
+        """MD5 hex digest of the image, computed on first use straight from the shared buffer."""
+        if self._md5 is None:
+            hash_md5 = hashlib.md5()
+            view = memoryview(self._buffer)
+            for start in range(0, len(view), 1 << 20):
+                hash_md5.update(view[start:start + (1 << 20)])
+            view.release()
+            self._md5 = hash_md5.hexdigest()
+        return self._md5
+
+    def open(self):
+        """Returns a new seekable binary reader positioned at the start of the image."""
+        if isinstance(self._buffer, bytes):
+            return io.BytesIO(self._buffer)  # Shares the bytes object until written to
+        return _BufferReader(self._buffer)
+
+    @property
+    def buffer(self) -> memoryview:
+        """A read-only view of the shared buffer."""
+        return memoryview(self._buffer).toreadonly()
+
+    def getvalue(self) -> bytes:
+        """Returns the image as a bytes object (a copy for memory-mapped files)."""
+        return self._buffer if isinstance(self._buffer, bytes) else self._buffer[:]
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            try:
+                self._buffer.close()
+            except BufferError:
+                pass  # A reader is still alive; the map is released once it is collected
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
 
 def image_to_binary(path):
     """
@@ -126,6 +268,55 @@ def _resize_image(input_path, output_path=None, max_side_length=1024):
 
 
 
+def prepare_image_for_embedding(image_bytes: ImageBytes, max_side: int = None, quality: int = None):
+    """
+    Produces the copy of an image that is sent to the vectorizer: re-encoded as JPEG without EXIF
+    (so no GPS position or device details leave the service) and capped to 'max_side' pixels on its
+    longest side. Images already within the cap are re-encoded at their own size. JPEGs are decoded
+    straight at a reduced scale via draft() (DCT-domain downscaling), so a 12 MP photo is never
+    decoded at full size. The EXIF orientation is applied first, so the vectorizer sees the photo
+    upright. The original bytes are not modified.
+
+    :param image_bytes: The original image.
+    :param max_side: Longest side in pixels (default Config.EMBEDDING_MAX_SIDE); 0 sends the original
+                     bytes unchanged, metadata included.
+    :param quality: JPEG quality of the copy (default Config.EMBEDDING_JPEG_QUALITY).
+    :return: A tuple (body, stats). 'body' is a binary reader over the bytes to send; 'stats' holds
+             original_bytes, sent_bytes, resized, stripped and elapsed_ms.
+    :raises ValueError: If the image cannot be re-encoded; the original, metadata included, is never
+                        sent in its place.
+    """
+    max_side = Config.EMBEDDING_MAX_SIDE if max_side is None else max_side
+    quality = Config.EMBEDDING_JPEG_QUALITY if quality is None else quality
+    start = time.perf_counter()
+    stats = {"original_bytes": len(image_bytes), "sent_bytes": len(image_bytes), "resized": False,
+             "stripped": False}
+
+    if max_side > 0:
+        try:
+            with Image.open(image_bytes.open()) as image:
+                resized = max(image.size) > max_side
+                if resized:
+                    image.draft("RGB", (max_side, max_side))
+                image = ImageOps.exif_transpose(image)
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+                image.thumbnail((max_side, max_side), Image.LANCZOS)  # No-op within the cap
+
+                output = io.BytesIO()
+                image.save(output, format="JPEG", quality=quality)  # No exif= argument: metadata is dropped
+                stats.update(sent_bytes=output.tell(), resized=resized, stripped=True,
+                             elapsed_ms=(time.perf_counter() - start) * 1000)
+                output.seek(0)
+                return output, stats
+        except Exception as e:
+            get_logger().warning("Could not prepare the image for embedding: %s", e)
+            raise ValueError(f"Could not prepare the image for embedding: {e}") from e
+
+    stats["elapsed_ms"] = (time.perf_counter() - start) * 1000
+    return image_bytes.open(), stats
+
+
 def pretty_print_exif(exif_dict):
     # Use pprint to pretty print the EXIF data
     pp = pprint.PrettyPrinter(indent=4)
@@ -214,21 +405,68 @@ def get_decimal_coordinates(gps_info: Dict) -> Tuple[Optional[float], Optional[f
 
 
 
+_timezone_finder = None
+_timezone_finder_lock = threading.Lock()
+
+
+def get_timezone_finder() -> "TimezoneFinder":
+    """
+    Returns the process-wide TimezoneFinder. Building one loads its polygon data from disk, so it is
+    created once, on first use; Config.TIMEZONE_FINDER_IN_MEMORY keeps that data in memory. The
+    module itself is imported here too, keeping it off the app's import path.
+    """
+    global _timezone_finder
+    if _timezone_finder is None:
+        with _timezone_finder_lock:
+            if _timezone_finder is None:
+                from timezonefinder import TimezoneFinder
+                _timezone_finder = TimezoneFinder(in_memory=Config.TIMEZONE_FINDER_IN_MEMORY)
+    return _timezone_finder
+
+
+@lru_cache(maxsize=Config.TIMEZONE_CACHE_SIZE)
+def _timezone_at(latitude: float, longitude: float) -> Optional[str]:
+    tz_finder = get_timezone_finder()
+    with _timezone_finder_lock:  # The file-backed finder seeks in shared file handles
+        return tz_finder.timezone_at(lat=latitude, lng=longitude)
+
+
+def get_timezone_at(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    """
+    Resolves the timezone name of a position. Coordinates are rounded to
+    Config.TIMEZONE_CACHE_PRECISION decimals so nearby photos share one cached lookup.
+
+    :return: A timezone name (e.g. "Europe/London") or None if unknown.
+    """
+    if latitude is None or longitude is None:
+        return None
+    precision = Config.TIMEZONE_CACHE_PRECISION
+    return _timezone_at(round(latitude, precision), round(longitude, precision)) or None
+
+
+def get_timezones_from_coordinates(coordinates) -> list:
+    """
+    Resolves the timezones of many positions in one pass, looking up each distinct rounded position once.
+
+    :param coordinates: Iterable of (latitude, longitude) tuples; either value may be None.
+    :return: A list of timezone names (or None), in input order.
+    """
+    coordinates = list(coordinates)
+    resolved = {}
+    for latitude, longitude in coordinates:
+        if (latitude, longitude) not in resolved:
+            resolved[(latitude, longitude)] = get_timezone_at(latitude, longitude)
+    return [resolved[position] for position in coordinates]
+
+
 def get_timezone_from_gps(gps_info):
     if gps_info is None:
         return None
 
     # Extract latitude and longitude
-    latitude, longitude = get_decimal_coordinates(gps_info)  # Implement this function to parse GPSInfo
-
-    # Infer timezone
-    tz_finder = TimezoneFinder()
-    tz_name = tz_finder.timezone_at(lat=latitude, lng=longitude)
+    latitude, longitude = get_decimal_coordinates(gps_info)
 
-    if tz_name:
-        #return timezone(tz_name)
-        return tz_name
-    return None
+    return get_timezone_at(latitude, longitude)
 
 
 def get_altitude(gps_info: Dict) -> Optional[float]:
@@ -271,53 +509,248 @@ def get_orientation(gps_info: Dict) -> Optional[float]:
     return orientation
 
 
-def extract_image_metadata(image_input: Union[str, io.BytesIO]) -> Dict[str, Optional[str]]:
+# Header-only EXIF reader. Only the tags used by extract_image_metadata are decoded, values are
+# returned in the same types PIL's _getexif() produces (str, int, bytes, tuples) except that
+# rationals are plain floats.
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+IFD0_TAGS = {0x010F: "Make", 0x0110: "Model"}
+EXIF_IFD_TAGS = {0x9003: "DateTimeOriginal", 0xA405: "FocalLengthIn35mmFilm"}
+GPS_IFD_TAGS = {1, 2, 3, 4, 5, 6, 17}  # Lat/lng refs and values, altitude ref and value, image direction
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+TIFF_INT_FORMATS = {3: "H", 4: "I", 9: "i"}
+
+
+def _tiff_value(tiff, value_type, count, value_offset, endian):
+    raw = bytes(tiff[value_offset:value_offset + TIFF_TYPE_SIZES[value_type] * count])
+    if value_type == 2:  # ASCII, same trimming as PIL
+        return (raw[:-1] if raw.endswith(b"\0") else raw).decode("latin-1", "replace")
+    if value_type in (1, 7):  # BYTE, UNDEFINED
+        return raw
+    if value_type in (5, 10):  # RATIONAL, SRATIONAL
+        pairs = struct.unpack(f"{endian}{2 * count}{'I' if value_type == 5 else 'i'}", raw)
+        values = tuple(num / den if den else float("nan") for num, den in zip(pairs[::2], pairs[1::2]))
+    else:  # SHORT, LONG, SLONG
+        values = struct.unpack(f"{endian}{count}{TIFF_INT_FORMATS[value_type]}", raw)
+    return values[0] if count == 1 else values
+
+
+def _read_ifd(tiff, offset, endian, wanted) -> dict:
+    (entry_count,) = struct.unpack_from(f"{endian}H", tiff, offset)
+    values = {}
+    for entry in range(offset + 2, offset + 2 + 12 * entry_count, 12):
+        tag, value_type, count = struct.unpack_from(f"{endian}HHI", tiff, entry)
+        if tag not in wanted or value_type not in TIFF_TYPE_SIZES:
+            continue
+        if TIFF_TYPE_SIZES[value_type] * count <= 4:
+            value_offset = entry + 8
+        else:
+            (value_offset,) = struct.unpack_from(f"{endian}I", tiff, entry + 8)
+        values[tag] = _tiff_value(tiff, value_type, count, value_offset, endian)
+    return values
+
+
+def _parse_tiff_exif(tiff) -> dict:
+    """Reads IFD0, the Exif IFD and the GPS IFD of a TIFF-structured EXIF block."""
+    endian = {b"II": "<", b"MM": ">"}.get(bytes(tiff[:2]))
+    if endian is None:
+        raise ValueError("Invalid TIFF header in EXIF block")
+    (ifd0_offset,) = struct.unpack_from(f"{endian}I", tiff, 4)
+
+    ifd0 = _read_ifd(tiff, ifd0_offset, endian, set(IFD0_TAGS) | {EXIF_IFD_POINTER, GPS_IFD_POINTER})
+    exif_data = {name: ifd0[tag] for tag, name in IFD0_TAGS.items() if tag in ifd0}
+    if EXIF_IFD_POINTER in ifd0:
+        exif_ifd = _read_ifd(tiff, ifd0[EXIF_IFD_POINTER], endian, set(EXIF_IFD_TAGS))
+        exif_data.update({name: exif_ifd[tag] for tag, name in EXIF_IFD_TAGS.items() if tag in exif_ifd})
+    if GPS_IFD_POINTER in ifd0:
+        exif_data["GPSInfo"] = _read_ifd(tiff, ifd0[GPS_IFD_POINTER], endian, GPS_IFD_TAGS)
+    return exif_data
+
+
+def _find_jpeg_exif(view):
+    """Walks the JPEG marker segments up to the image data and returns the APP1 Exif TIFF block."""
+    pos = 2
+    while pos + 4 <= len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # End of image, start of scan: no more metadata segments
+            return None
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # Markers without a length
+            pos += 2
+            continue
+        (length,) = struct.unpack_from(">H", view, pos + 2)
+        if marker == 0xE1 and view[pos + 4:pos + 10] == b"Exif\0\0":
+            return view[pos + 10:pos + 2 + length]
+        pos += 2 + length
+    return None
+
+
+def _iter_boxes(view, start, end):
+    """Yields (type, payload start, box end) for the ISO BMFF boxes between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", view, pos)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", view, pos + 8)
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _find_heif_exif(view):
+    """Locates the Exif item of a HEIF/HEIC file through its meta box (iinf + iloc)."""
+    meta = next(((start, end) for box_type, start, end in _iter_boxes(view, 0, len(view)) if box_type == b"meta"), None)
+    if meta is None:
+        return None
+
+    exif_item_id, location = None, {}
+    for box_type, start, end in _iter_boxes(view, meta[0] + 4, meta[1]):  # meta is a FullBox
+        version = view[start]
+        if box_type == b"iinf":
+            entries_start = start + (6 if version == 0 else 8)
+            for entry_type, entry_start, _ in _iter_boxes(view, entries_start, end):
+                if entry_type != b"infe" or view[entry_start] < 2:
+                    continue
+                id_format = ">H" if view[entry_start] == 2 else ">I"
+                item_id = struct.unpack_from(id_format, view, entry_start + 4)[0]
+                type_offset = entry_start + 4 + struct.calcsize(id_format) + 2
+                if bytes(view[type_offset:type_offset + 4]) == b"Exif":
+                    exif_item_id = item_id
+        elif box_type == b"iloc":
+            offset_size, length_size = view[start + 4] >> 4, view[start + 4] & 0x0F
+            base_offset_size, index_size = view[start + 5] >> 4, (view[start + 5] & 0x0F if version in (1, 2) else 0)
+            pos = start + 6
+
+            def read(size):
+                nonlocal pos
+                value = int.from_bytes(view[pos:pos + size], "big") if size else 0
+                pos += size
+                return value
+
+            item_count = read(2 if version < 2 else 4)
+            for _ in range(item_count):
+                item_id = read(2 if version < 2 else 4)
+                construction_method = read(2) & 0x0F if version in (1, 2) else 0
+                read(2)  # data_reference_index
+                base_offset = read(base_offset_size)
+                extents = []
+                for _ in range(read(2)):
+                    read(index_size)
+                    extents.append((read(offset_size), read(length_size)))
+                if construction_method == 0 and extents:
+                    location[item_id] = (base_offset + extents[0][0], extents[0][1])
+
+    if exif_item_id not in location:
+        return None
+    offset, length = location[exif_item_id]
+    (tiff_header_offset,) = struct.unpack_from(">I", view, offset)
+    return view[offset + 4 + tiff_header_offset:offset + length]
+
+
+def _read_exif_fast(view):
+    """
+    Returns the EXIF tags of a JPEG or HEIF/HEIC buffer, reading only its header structures.
+
+    :return: A dict of tag name to value ({} when the image has no EXIF), or None for other formats.
+    """
+    if view[:2] == b"\xff\xd8":
+        tiff = _find_jpeg_exif(view)
+    elif view[4:8] == b"ftyp" and bytes(view[8:12]) in (b"heic", b"heix", b"heim", b"heis", b"mif1", b"msf1"):
+        tiff = _find_heif_exif(view)
+    else:
+        return None
+    return _parse_tiff_exif(tiff) if tiff is not None and len(tiff) >= 8 else {}
+
+
+def _read_exif_pil(image_input) -> dict:
+    """Reads EXIF tags through PIL; slower, but covers every format PIL can open."""
+    if isinstance(image_input, ImageBytes):
+        image_input = image_input.open()
+    with Image.open(image_input) as image:
+        exif = image._getexif()
+    if not exif:
+        return {}
+    return {ExifTags.TAGS.get(k, k): v for k, v in exif.items()}
+
+
+def read_exif(image_input: Union[str, io.BytesIO, ImageBytes], fast: bool = True) -> dict:
+    """
+    Reads the EXIF tags of an image, keyed by PIL tag name (GPSInfo stays keyed by GPS tag number).
+
+    :param image_input: Path to the image file, binary image data (io.BytesIO) or ImageBytes.
+    :param fast: Try the header-only JPEG/HEIF reader first and use PIL for other formats or when the
+                 EXIF block is malformed.
+    :return: A dictionary of EXIF tags, empty if the image has none.
+    """
+    if fast:
+        try:
+            if isinstance(image_input, str):
+                with ImageBytes.from_file(image_input) as image_bytes:
+                    view = image_bytes.buffer
+                    try:
+                        exif_data = _read_exif_fast(view)
+                    finally:
+                        view.release()
+            else:
+                view = image_input.getbuffer() if isinstance(image_input, io.BytesIO) else image_input.buffer
+                try:
+                    exif_data = _read_exif_fast(view)
+                finally:
+                    view.release()
+        except (struct.error, IndexError, ValueError):
+            # Malformed APP1/TIFF structures: PIL is more forgiving (it skips what it cannot read)
+            exif_data = None
+        if exif_data is not None:
+            return exif_data
+    return _read_exif_pil(image_input)
+
+
+def extract_image_metadata(image_input: Union[str, io.BytesIO, ImageBytes], fast: bool = True,
+                           resolve_timezone: bool = True) -> Dict[str, Optional[str]]:
     """
     Extracts metadata from an image file or binary image data, including location, focal length, orientation,
     altitude, device details, and capture datetime. GPSInfo is formatted for PostGIS.
 
-    :param image_input: Path to the image file or binary image data (io.BytesIO).
+    :param image_input: Path to the image file, binary image data (io.BytesIO) or ImageBytes.
+    :param fast: Use the header-only EXIF reader when the format allows it (see read_exif).
+    :param resolve_timezone: Set to False to leave "Timezone" as None, e.g. to resolve a batch with
+                             get_timezones_from_coordinates afterwards.
     :return: A dictionary with extracted metadata.
     """
     try:
-        # Open the image (handle both file path and binary data)
-        if isinstance(image_input, str) and os.path.exists(image_input):
-            image = Image.open(image_input)
-        elif isinstance(image_input, io.BytesIO):
-            image = Image.open(image_input)
-        else:
+        if isinstance(image_input, str) and not os.path.exists(image_input):
+            return {"Error": "Unsupported input type. Provide a file path or binary data."}
+        if not isinstance(image_input, (str, io.BytesIO, ImageBytes)):
             return {"Error": "Unsupported input type. Provide a file path or binary data."}
 
-        #image.show()
-        # Extract EXIF data
-        exif = image._getexif()
-        if not exif:
+        exif_data = read_exif(image_input, fast=fast)
+        if not exif_data:
             return {}
 
-        # Map EXIF tags to human-readable names
-        exif_data = {ExifTags.TAGS.get(k, k): v for k, v in exif.items()}
-
         # Extract GPSInfo
         gps_info = exif_data.get("GPSInfo")
         if gps_info:
-            # Convert GPS tags to human-readable names
-            gps_data = {}
-            for key, value in gps_info.items():
-                tag_name = ExifTags.GPSTAGS.get(key, key)
-                gps_data[tag_name] = value
-            exif_data["GPSInfo"] = gps_data
             latitude, longitude = get_decimal_coordinates(gps_info)
             altitude = get_altitude(gps_info)
             wkt_point = convert_to_postgis_point(latitude, longitude )
+            orientation = get_orientation(gps_info)  # Orientation in degrees
         else:
-            wkt_point, latitude, longitude, altitude = None, None, None, None
+            wkt_point, latitude, longitude, altitude, orientation = None, None, None, None, None
 
         # Extract other metadata
         make = exif_data.get("Make", None)  # Device make
         model = exif_data.get("Model", None)  # Device model
         datetime_taken = exif_data.get("DateTimeOriginal", None)  # Datetime the image was taken
         focal_length_35mm = exif_data.get("FocalLengthIn35mmFilm", None)  # Focal length (35mm equivalent)
-        orientation = get_orientation(gps_info)  # Orientation in degrees
 
         return {
             "WKT Point": wkt_point,
@@ -327,7 +760,7 @@ def extract_image_metadata(image_input: Union[str, io.BytesIO]) -> Dict[str, Opt
             "Make": make,
             "Model": model,
             "Datetime Taken": datetime_taken,
-            "Timezone": get_timezone_from_gps(gps_info), 
+            "Timezone": get_timezone_at(latitude, longitude) if resolve_timezone else None,
             "Focal Length (35mm)": focal_length_35mm,
             "Orientation (degrees)": orientation,
         }
@@ -363,9 +796,12 @@ def get_md5_of_image(input_data):
     """
     Computes the MD5 hash of an image given directly as bytes, from a file path, or from a base64-encoded string.
 
-    :param input_data: Either the bytes of the image, a string path to an image file, or a base64-encoded string.
+    :param input_data: Either the bytes of the image, a string path to an image file, a base64-encoded string or ImageBytes.
     :return: The hexadecimal MD5 hash of the image.
     """
+    if isinstance(input_data, ImageBytes):
+        return input_data.md5
+
     hash_md5 = hashlib.md5()
     
     if isinstance(input_data, bytes):
@@ -0,0 +1,146 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+from app.utilities.image import extract_image_metadata, get_timezones_from_coordinates, ImageBytes
+from app.utilities.llm import get_image_embedding
+from app.utilities.db_common import find_existing_md5s, images_to_db
+
+
+def load_image_file(image_path):
+    """
+    Maps an image file once and derives everything the pipeline needs from the same buffer.
+
+    :param image_path: Path to the image file.
+    :return: A tuple (ImageBytes, md5 hex digest, metadata dict). The timezone is resolved later for the whole batch.
+    """
+    image_bytes = ImageBytes.from_file(image_path)
+    return image_bytes, image_bytes.md5, extract_image_metadata(image_bytes, resolve_timezone=False)
+
+
+def load_upload(images):
+    """
+    Stage 1 of ingestion: validates the upload items, then reads, hashes and parses EXIF for
+    every file on a worker pool and resolves the timezones in one batch.
+
+    :param images: The 'images' items of an ImageUploadJsonSchema payload.
+    :return: A tuple (results, loaded): one status dict per input image, in input order, and a
+             (result, image_path, location_wkt, ImageBytes, md5, metadata) tuple per readable file.
+    """
+    results = []
+    pending = []  # (result, image_path, location)
+    for image in images:
+        image_url = image.get('image_url', {}).get('url')
+        result = {"url": image_url, "status": "skipped"}
+        results.append(result)
+
+        if not image_url or not image.get('type'):
+            result["details"] = "Missing image URL or type"
+        elif not os.path.isfile(image_url):
+            result["details"] = "Not a file"
+        else:
+            location = image.get('location')
+            location_wkt = f"POINT({location['longitude']} {location['latitude']})" if location else None
+            pending.append((result, image_url, location_wkt))
+
+    loaded = []
+    with ThreadPoolExecutor(max_workers=Config.INGEST_READ_WORKERS) as pool:
+        futures = [pool.submit(load_image_file, image_path) for _, image_path, _ in pending]
+        for (result, image_path, location_wkt), future in zip(pending, futures):
+            try:
+                data, image_md5, metadata = future.result()
+            except Exception as e:
+                result.update(status="failed", details=f"Could not read image: {e}")
+                continue
+            result["md5"] = image_md5
+            loaded.append((result, image_path, location_wkt, data, image_md5, metadata))
+
+    try:
+        timezones = get_timezones_from_coordinates((item[5].get("Latitude"), item[5].get("Longitude")) for item in loaded)
+    except Exception:
+        close_loaded(loaded)
+        raise
+    for item, tz_name in zip(loaded, timezones):
+        if "Timezone" in item[5]:
+            item[5]["Timezone"] = tz_name
+    return results, loaded
+
+
+def close_loaded(loaded):
+    """Releases the file mappings of the items returned by load_upload."""
+    for item in loaded:
+        item[3].close()
+
+
+def select_new_images(db_session, loaded):
+    """
+    Marks images already stored, or repeated within this upload, as duplicates; they are not embedded again.
+
+    :param loaded: The loaded items returned by load_upload.
+    :return: The loaded items still to embed and store.
+    """
+    seen = find_existing_md5s(db_session, {item[4] for item in loaded})
+    new_images = []
+    for item in loaded:
+        result, image_md5 = item[0], item[4]
+        if image_md5 in seen:
+            result["status"] = "duplicate"
+        else:
+            seen.add(image_md5)
+            new_images.append(item)
+    return new_images
+
+
+def embedded_record(item, embedding) -> dict:
+    """The images_to_db record of a loaded item and its embedding."""
+    result, image_path, location_wkt, _, image_md5, metadata = item
+    return {"path": image_path, "md5": image_md5, "metadata": metadata,
+            "embedding": embedding, "location": location_wkt, "result": result}
+
+
+def store_records(db_session, records, account_id):
+    """Stage 3 of ingestion: one bulk insert, and the final status of each record."""
+    if not records:
+        return
+    stored = images_to_db(db_session, records, account_id)
+    for record, image in zip(records, stored):
+        if image is None:  # Stored by a concurrent upload in the meantime
+            record["result"]["status"] = "duplicate"
+        else:
+            record["result"].update(status="processed", image_id=image.id)
+
+
+def ingest_images(db_session, images, account_id):
+    """
+    Ingests a batch of uploaded images in three stages:
+
+    1. read, hash and parse EXIF for every file on a worker pool,
+    2. request embeddings for the new images with bounded concurrency,
+    3. write all Image and Embedding rows with one bulk insert in one transaction.
+
+    :param db_session: Database session, only used from the calling thread.
+    :param images: The 'images' items of an ImageUploadJsonSchema payload.
+    :param account_id: The account uploading the images.
+    :return: One status dict per input image, in input order.
+    """
+    results, loaded = load_upload(images)
+    # The mappings are released on every path, so a failing batch does not leak them in long-lived workers
+    try:
+        new_images = select_new_images(db_session, loaded)
+
+        # Stage 2: embeddings, bounded by INGEST_EMBEDDING_CONCURRENCY in-flight vectorizer calls
+        records = []
+        with ThreadPoolExecutor(max_workers=Config.INGEST_EMBEDDING_CONCURRENCY) as pool:
+            futures = [pool.submit(get_image_embedding, item[3], item[4]) for item in new_images]
+            for item, future in zip(new_images, futures):
+                try:
+                    embedding = future.result()
+                except Exception as e:
+                    item[0].update(status="failed", details=f"Could not embed image: {e}")
+                    continue
+                records.append(embedded_record(item, embedding))
+    finally:
+        close_loaded(loaded)
+
+    store_records(db_session, records, account_id)
+    return results
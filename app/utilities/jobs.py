@@ -0,0 +1,198 @@
+import math
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, and_, or_
+
+from app.config import Config
+from app.models import db, IngestJob
+from app.utilities.common import TZ
+from app.utilities.ingest import ingest_images
+
+
+def enqueue_ingest_job(db_session, images, account_id) -> IngestJob:
+    """
+    Stores an upload as a queued ingestion job.
+
+    :param images: The 'images' items of a validated ImageUploadJsonSchema payload.
+    :param account_id: The account uploading the images.
+    :return: The pending IngestJob; it becomes visible to the workers when the caller commits.
+    """
+    now = datetime.now(TZ)
+    job = IngestJob(account_id=account_id, status="queued", payload=images, total=len(images),
+                    processed=0, results=[], attempts=0, create_time=now, update_time=now)
+    db_session.add(job)
+    db_session.flush()
+    return job
+
+
+def stale_job_seconds() -> float:
+    """
+    How long a running job may go without a heartbeat before another worker takes it over.
+
+    The heartbeat is only refreshed when a chunk commits, so the threshold is never below the
+    longest a healthy chunk can take: every vectorizer call of the chunk timing out on each retry,
+    INGEST_EMBEDDING_CONCURRENCY calls at a time. Config.INGEST_JOB_STALE_SECONDS is the floor.
+    """
+    per_call = ((Config.AZURE_VISION_CONNECT_TIMEOUT + Config.AZURE_VISION_READ_TIMEOUT)
+                * (Config.AZURE_VISION_MAX_RETRIES + 1)
+                + Config.AZURE_VISION_BACKOFF_MAX * Config.AZURE_VISION_MAX_RETRIES)
+    rounds = math.ceil(max(1, Config.INGEST_JOB_CHUNK_SIZE) / max(1, Config.INGEST_EMBEDDING_CONCURRENCY))
+    return max(Config.INGEST_JOB_STALE_SECONDS, rounds * per_call)
+
+
+def claim_next_job(db_session):
+    """
+    Claims the oldest queued job, or a running job whose worker stopped heartbeating
+    (e.g. the process was restarted). SKIP LOCKED lets several workers poll concurrently.
+    A job that has already been claimed INGEST_JOB_MAX_ATTEMPTS times is marked 'failed'
+    instead, so a job that keeps crashing its worker is not retried forever.
+
+    :return: The claimed IngestJob, now 'running', or None if the queue is empty.
+    """
+    while True:
+        now = datetime.now(TZ)
+        stale_before = now - timedelta(seconds=stale_job_seconds())
+        query = (
+            select(IngestJob)
+            .where(or_(
+                IngestJob.status == "queued",
+                and_(IngestJob.status == "running", IngestJob.update_time < stale_before),
+            ))
+            .order_by(IngestJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = db_session.execute(query).scalar_one_or_none()
+        if job is None:
+            db_session.rollback()
+            return None
+
+        job.update_time = now
+        if job.attempts >= Config.INGEST_JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = job.error or f"Gave up after {job.attempts} attempts without finishing"
+            db_session.commit()
+            continue
+
+        job.status = "running"
+        job.attempts += 1
+        db_session.commit()
+        return job
+
+
+def run_ingest_job(db_session, job):
+    """
+    Ingests a claimed job chunk by chunk. Each chunk's rows and the job's progress are committed
+    together, so a crash never leaves stored images without a matching result. Images that
+    already have a result are skipped, so a job picked up again after a restart resumes.
+    """
+    results = list(job.results or [])
+    try:
+        chunk_size = max(1, Config.INGEST_JOB_CHUNK_SIZE)
+        for start in range(len(results), job.total, chunk_size):
+            chunk = job.payload[start:start + chunk_size]
+            results.extend(ingest_images(db_session, chunk, job.account_id))
+
+            job.results = list(results)
+            job.processed = len(results)
+            job.update_time = datetime.now(TZ)
+            db_session.commit()
+
+        job.status = "done"
+    except Exception as e:
+        db_session.rollback()
+        job.status = "failed"
+        job.error = str(e)
+    job.update_time = datetime.now(TZ)
+    db_session.commit()
+
+
+def ingest_job_status(job) -> dict:
+    """Serializes a job for the status endpoint."""
+    results = job.results or []
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "failed": sum(1 for r in results if r.get("status") == "failed"),
+        "error": job.error,
+        "images": results,
+        "create_time": job.create_time.isoformat(),
+        "update_time": job.update_time.isoformat(),
+    }
+
+
+class IngestWorkerPool:
+    """
+    Background threads that poll the ingest_job table and process jobs inside an app context.
+    """
+
+    def __init__(self, app, workers: int, poll_interval: float):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = None
+            try:
+                with self.app.app_context():
+                    job = claim_next_job(db.session)
+                    if job is not None:
+                        run_ingest_job(db.session, job)
+            except Exception as e:
+                print(f"An error occurred while processing ingest jobs: {e}")
+            if job is None:
+                self._stop.wait(self.poll_interval)
+
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def start_ingest_workers(app):
+    """Starts the process-wide ingest worker pool once; later calls are no-ops."""
+    global _worker_pool
+    workers = app.config.get("INGEST_JOB_WORKERS", 0)
+    if workers <= 0:
+        return None
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = IngestWorkerPool(app, workers, app.config.get("INGEST_JOB_POLL_INTERVAL", 2))
+            _worker_pool.start()
+    return _worker_pool
+
+
+def stop_ingest_workers(timeout: float = None):
+    """Stops the process-wide ingest worker pool, if one was started."""
+    global _worker_pool
+    with _worker_pool_lock:
+        pool, _worker_pool = _worker_pool, None
+    if pool is not None:
+        pool.stop(timeout)
+
+
+def autostart_ingest_workers(app):
+    """
+    Starts the ingest workers when the app's INGEST_JOB_AUTOSTART is set. Called by the server entry
+    points in the process that serves requests (after gunicorn forks, in the ASGI lifespan), so
+    CLI commands and preloading master processes never poll the queue.
+    """
+    if not app.config.get("INGEST_JOB_AUTOSTART"):
+        return None
+    return start_ingest_workers(app)
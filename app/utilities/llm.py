@@ -1,73 +1,340 @@
-import os
-import requests
+import io
+import re
 import json
+import time
+import hashlib
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.config import Config
-from app.utilities.image import image_to_binary, resize_image, extract_image_metadata, pretty_print_exif
+from app.utilities.image import ImageBytes, prepare_image_for_embedding
+from app.utilities.cache import LRUCache
+from app.utilities.db_common import find_embedding_by_md5, find_embeddings_by_md5s, find_prompt_embedding, \
+    prompt_embedding_to_db
 
-import base64
-import io
-import requests
-from PIL import Image
+# Image embeddings keyed by (image md5, model version)
+EMBEDDING_CACHE = LRUCache(maxsize=Config.EMBEDDING_CACHE_SIZE)
+# Prompt embeddings keyed by (prompt hash, model version)
+TEXT_EMBEDDING_CACHE = LRUCache(maxsize=Config.TEXT_EMBEDDING_CACHE_SIZE)
+
+
+class VectorizerError(RuntimeError):
+    """Raised when the vectorizer cannot produce an embedding."""
+
+
+class CircuitOpenError(VectorizerError):
+    """Raised without contacting the vectorizer while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After 'failure_threshold' failures in a row the circuit opens and calls are rejected for
+    'reset_timeout' seconds. Then a single trial call is let through (half-open); its outcome
+    closes the circuit again or re-opens it for another 'reset_timeout'.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class VectorizerClient:
+    """
+    Reusable client for the Azure AI Vision retrieval (vectorize) APIs.
+
+    Requests go through one requests.Session with a pooled keep-alive HTTPAdapter, so TLS
+    handshakes happen once per pooled connection instead of once per call. Connection errors,
+    429 and 5xx responses are retried with bounded exponential backoff (honouring Retry-After),
+    and a circuit breaker fails fast while the service keeps failing.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, endpoint: str, key: str, version: str,
+                 connect_timeout: float = 3.05, read_timeout: float = 20,
+                 max_retries: int = 3, backoff_factor: float = 0.5, backoff_max: float = 10,
+                 pool_size: int = 10, breaker: CircuitBreaker = None):
+        self.base_url = f"{endpoint}computervision/"
+        self.version = version
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            backoff_max=backoff_max,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),  # Vectorizing is idempotent
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Ocp-Apim-Subscription-Key"] = key
+
+    @classmethod
+    def from_config(cls, config=Config):
+        return cls(
+            endpoint=config.AZURE_VISION_ENDPOINT,
+            key=config.AZURE_VISION_KEY,
+            version=config.AZURE_VISION_VERSION,
+            connect_timeout=config.AZURE_VISION_CONNECT_TIMEOUT,
+            read_timeout=config.AZURE_VISION_READ_TIMEOUT,
+            max_retries=config.AZURE_VISION_MAX_RETRIES,
+            backoff_factor=config.AZURE_VISION_BACKOFF_FACTOR,
+            backoff_max=config.AZURE_VISION_BACKOFF_MAX,
+            pool_size=config.AZURE_VISION_POOL_SIZE,
+            breaker=CircuitBreaker(config.AZURE_VISION_BREAKER_THRESHOLD, config.AZURE_VISION_BREAKER_RESET),
+        )
+
+    def vectorize_image(self, data) -> list:
+        """
+        :param data: Image bytes, or a seekable binary file object.
+        :return: The image embedding.
+        """
+        return self._vectorize("retrieval:vectorizeImage", data=data,
+                               headers={"Content-type": "application/octet-stream"})
+
+    def vectorize_text(self, text: str) -> list:
+        """
+        :param text: The text to embed.
+        :return: The text embedding.
+        """
+        return self._vectorize("retrieval:vectorizeText", data=json.dumps({"text": text}),
+                               headers={"Content-type": "application/json"})
+
+    def close(self):
+        self.session.close()
+
+    def _vectorize(self, operation: str, **kwargs) -> list:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Vectorizer circuit is open, {operation} not attempted.")
+
+        try:
+            r = self.session.post(f"{self.base_url}{operation}{self.version}", timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise VectorizerError(f"{operation} request failed: {e}") from e
+
+        if r.status_code == 200:
+            self.breaker.record_success()
+            return r.json()["vector"]
+
+        if r.status_code in self.RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            # Client errors (bad image, bad key) say nothing about the service's health
+            self.breaker.record_success()
+        raise VectorizerError(f"{operation} failed. Error code: {r.status_code}, Response: {r.text}")
+
+
+_vectorizer_client = None
+_vectorizer_client_lock = threading.Lock()
+
+
+def get_vectorizer_client() -> VectorizerClient:
+    """Returns the process-wide VectorizerClient, creating it from Config on first use."""
+    global _vectorizer_client
+    if _vectorizer_client is None:
+        with _vectorizer_client_lock:
+            if _vectorizer_client is None:
+                _vectorizer_client = VectorizerClient.from_config()
+    return _vectorizer_client
+
+
+def reset_vectorizer_client():
+    """
+    Drops the process-wide VectorizerClient so the next call creates a new one. Used after a
+    fork: pooled connections inherited from the parent must not be shared with it.
+    """
+    global _vectorizer_client
+    with _vectorizer_client_lock:
+        _vectorizer_client = None
 
 
 def get_embedding(input_data, mode="image"):
     """
     Generates a vector embedding for an image or text using Azure AI Vision 4.0 APIs.
 
-    :param input_data: Filepath, base64 string, or BytesIO to the image (for "image" mode) or a text string (for "text" mode).
+    :param input_data: ImageBytes, filepath, base64 string, or BytesIO to the image (for "image" mode) or a text string (for "text" mode).
     :param mode: Either "image" for image embeddings or "text" for text embeddings.
     :return: The vector embedding of the image or text.
+    :raises VectorizerError: If the vectorizer call fails or the circuit breaker is open.
     """
-    endpoint = f"{Config.AZURE_VISION_ENDPOINT}computervision/"
-    key = Config.AZURE_VISION_KEY
-    version = Config.AZURE_VISION_VERSION
-
-    # Determine the correct API URL
     if mode == "image":
-        vectorize_url = f"{endpoint}retrieval:vectorizeImage{version}"
-        headers = {
-            "Content-type": "application/octet-stream",
-            "Ocp-Apim-Subscription-Key": key
-        }
+        if isinstance(input_data, ImageBytes):
+            image_bytes = input_data
+        elif isinstance(input_data, (bytes, str)):
+            image_bytes = ImageBytes.load(input_data)
+        elif isinstance(input_data, io.BytesIO):
+            image_bytes = ImageBytes(input_data.getvalue())
+        else:
+            raise ValueError("Unsupported image input type. Must be ImageBytes, bytes, filepath, Base64 string, or BytesIO.")
+
+        # Only the downscaled, EXIF-free copy is uploaded; the original stays untouched
+        body, _ = prepare_image_for_embedding(image_bytes)
+        return get_vectorizer_client().vectorize_image(body)
     elif mode == "text":
-        vectorize_url = f"{endpoint}retrieval:vectorizeText{version}"
-        headers = {
-            "Content-type": "application/json",
-            "Ocp-Apim-Subscription-Key": key
-        }
+        return get_vectorizer_client().vectorize_text(input_data)
     else:
         raise ValueError(f"Invalid mode: {mode}. Supported modes are 'image' and 'text'.")
 
-    try:
-        # Process input based on mode
-        if mode == "image":
-            if isinstance(input_data, str):
-                if os.path.isfile(input_data):
-                    with open(input_data, "rb") as image_file:
-                        data = image_file.read()
-                else: 
-                    data = base64.b64decode(input_data)
-            elif isinstance(input_data, io.BytesIO):
-                input_data.seek(0)
-                data = input_data.read()
-            else:
-                raise ValueError("Unsupported image input type. Must be filepath, Base64 string, or BytesIO.")
-            
-            #data = resize_image(data, output_path=None, max_side_length=1024)  # Adjust if necessary
-        elif mode == "text":
-            data = {"text": input_data}
-
-        # Send the request to the Azure API
-        r = requests.post(vectorize_url, data=data if mode == "image" else json.dumps(data), headers=headers)
-
-        # Check the response
-        if r.status_code == 200:
-            return r.json()["vector"]
-        else:
-            print(f"An error occurred. Mode: {mode}. Error code: {r.status_code}, Response: {r.text}")
 
-    except Exception as e:
-        print(f"An error occurred while processing {input_data}: {e}")
+def get_image_embedding(image_data, image_md5, db_session=None):
+    """
+    Returns the embedding of an image, calling the vectorizer only when the image is unknown.
+
+    The in-process cache is checked first, then the embedding table (when a db_session is given);
+    both are keyed by the image MD5 and Config.AZURE_VISION_MODEL_VERSION.
+
+    :param image_data: Anything get_embedding accepts in "image" mode.
+    :param image_md5: MD5 of the image bytes.
+    :param db_session: Optional database session used for the embedding table lookup.
+    :return: The vector embedding of the image.
+    :raises VectorizerError: If the image is not cached and the vectorizer call fails.
+    """
+    embedding = get_stored_image_embedding(image_md5, db_session)
+    if embedding is None:
+        embedding = get_embedding(image_data, mode="image")
+        if embedding is not None:
+            EMBEDDING_CACHE.set((image_md5, Config.AZURE_VISION_MODEL_VERSION), embedding)
+    return embedding
+
+
+def get_stored_image_embedding(image_md5, db_session=None):
+    """
+    Returns the embedding of an already embedded image from the in-process cache or, when a
+    db_session is given, the embedding table, without calling the vectorizer.
+
+    :param image_md5: MD5 of the image bytes.
+    :param db_session: Optional database session used for the embedding table lookup.
+    :return: The vector embedding, or None if the image has no embedding from the current model.
+    """
+    model_version = Config.AZURE_VISION_MODEL_VERSION
+    cache_key = (image_md5, model_version)
+
+    embedding = EMBEDDING_CACHE.get(cache_key)
+    if embedding is None and db_session is not None:
+        embedding = find_embedding_by_md5(db_session, image_md5, model_version)
+        if embedding is not None:
+            EMBEDDING_CACHE.set(cache_key, embedding)
+    return embedding
+
+
+def get_image_embeddings(images, db_session=None):
+    """
+    get_image_embedding for several images, e.g. all images of a chat turn. The cache is checked
+    first, then the embedding table with one query for all the remaining images (when a
+    db_session is given); the vectorizer, which has no batch endpoint, is then called for the
+    rest concurrently, at most Config.INGEST_EMBEDDING_CONCURRENCY calls at a time.
+
+    :param images: List of (image_data, image_md5) tuples, image_data as get_embedding accepts it.
+    :param db_session: Optional database session, only used from the calling thread.
+    :return: The embeddings, in the order of 'images'.
+    :raises VectorizerError: If any vectorizer call fails.
+    """
+    model_version = Config.AZURE_VISION_MODEL_VERSION
+    embeddings = {image_md5: EMBEDDING_CACHE.get((image_md5, model_version)) for _, image_md5 in images}
+    missing = [image_md5 for image_md5, embedding in embeddings.items() if embedding is None]
+    if missing and db_session is not None:
+        embeddings.update(find_embeddings_by_md5s(db_session, missing, model_version))
+
+    to_embed = {image_md5: image_data for image_data, image_md5 in images if embeddings[image_md5] is None}
+    if to_embed:
+        with ThreadPoolExecutor(max_workers=Config.INGEST_EMBEDDING_CONCURRENCY) as pool:
+            futures = {image_md5: pool.submit(get_embedding, image_data, "image")
+                       for image_md5, image_data in to_embed.items()}
+            for image_md5, future in futures.items():
+                embeddings[image_md5] = future.result()
+
+    for image_md5, embedding in embeddings.items():
+        if embedding is not None:
+            EMBEDDING_CACHE.set((image_md5, model_version), embedding)
+    return [embeddings[image_md5] for _, image_md5 in images]
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    The form a prompt is embedded and cached in: NFKC (full-width characters become their ASCII
+    forms), case-folded, whitespace collapsed, trailing question marks and full stops dropped,
+    so "What is this tower?" and "what is  this tower" share one embedding.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!.。 ").strip()
+
+
+def prompt_hash(normalized_prompt: str) -> str:
+    """SHA-256 of a normalized prompt, the key of its stored embedding."""
+    return hashlib.sha256(normalized_prompt.encode("utf-8")).hexdigest()
+
+
+def get_text_embedding(text, db_session=None):
+    """
+    Returns the vectorizeText embedding of a prompt, calling the vectorizer only for a prompt
+    not seen before. The in-process cache is checked first, then the prompt_embedding table
+    (when a db_session is given), both keyed by the hash of the normalized prompt and
+    Config.AZURE_VISION_MODEL_VERSION; a new embedding is stored in both.
+
+    :param text: The prompt text.
+    :param db_session: Optional database session used for the prompt_embedding table.
+    :return: The vector embedding of the normalized prompt, or None for an empty prompt.
+    :raises VectorizerError: If the prompt is not cached and the vectorizer call fails.
+    """
+    normalized = normalize_prompt(text or "")
+    if not normalized:
+        return None
+    model_version = Config.AZURE_VISION_MODEL_VERSION
+    key = prompt_hash(normalized)
+
+    embedding = TEXT_EMBEDDING_CACHE.get((key, model_version))
+    if embedding is None and db_session is not None:
+        embedding = find_prompt_embedding(db_session, key, model_version)
+    if embedding is None:
+        embedding = get_embedding(normalized, mode="text")
+        if embedding is not None and db_session is not None:
+            prompt_embedding_to_db(db_session, key, model_version, embedding)
 
-    return None
+    if embedding is not None:
+        TEXT_EMBEDDING_CACHE.set((key, model_version), embedding)
+    return embedding
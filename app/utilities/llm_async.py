@@ -0,0 +1,197 @@
+import json
+import random
+import asyncio
+
+import httpx
+
+from app.config import Config
+from app.utilities.image import prepare_image_for_embedding
+from app.utilities.llm import CircuitBreaker, VectorizerError, CircuitOpenError, EMBEDDING_CACHE, \
+    TEXT_EMBEDDING_CACHE, normalize_prompt, prompt_hash
+from app.utilities.db_common import find_embedding_by_md5, find_embeddings_by_md5s, find_prompt_embedding, \
+    prompt_embedding_to_db
+
+
+class AsyncVectorizerClient:
+    """
+    asyncio counterpart of VectorizerClient for the ASGI entry point.
+
+    One httpx.AsyncClient keeps a pool of keep-alive connections; waiting for Azure suspends
+    the request's task instead of blocking a thread. Retries (429/5xx and connection errors,
+    bounded exponential backoff honouring Retry-After) and the circuit breaker behave as in
+    VectorizerClient.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, endpoint: str, key: str, version: str,
+                 connect_timeout: float = 3.05, read_timeout: float = 20,
+                 max_retries: int = 3, backoff_factor: float = 0.5, backoff_max: float = 10,
+                 pool_size: int = 10, breaker: CircuitBreaker = None):
+        self.base_url = f"{endpoint}computervision/"
+        self.version = version
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            headers={"Ocp-Apim-Subscription-Key": key},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    @classmethod
+    def from_config(cls, config=Config):
+        return cls(
+            endpoint=config.AZURE_VISION_ENDPOINT,
+            key=config.AZURE_VISION_KEY,
+            version=config.AZURE_VISION_VERSION,
+            connect_timeout=config.AZURE_VISION_CONNECT_TIMEOUT,
+            read_timeout=config.AZURE_VISION_READ_TIMEOUT,
+            max_retries=config.AZURE_VISION_MAX_RETRIES,
+            backoff_factor=config.AZURE_VISION_BACKOFF_FACTOR,
+            backoff_max=config.AZURE_VISION_BACKOFF_MAX,
+            pool_size=config.AZURE_VISION_ASYNC_POOL_SIZE,
+            breaker=CircuitBreaker(config.AZURE_VISION_BREAKER_THRESHOLD, config.AZURE_VISION_BREAKER_RESET),
+        )
+
+    async def vectorize_image(self, data: bytes) -> list:
+        return await self._vectorize("retrieval:vectorizeImage", content=data,
+                                     headers={"Content-type": "application/octet-stream"})
+
+    async def vectorize_text(self, text: str) -> list:
+        return await self._vectorize("retrieval:vectorizeText", content=json.dumps({"text": text}),
+                                     headers={"Content-type": "application/json"})
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return min(self.backoff_factor * (2 ** attempt), self.backoff_max) * random.uniform(0.5, 1)
+
+    async def _vectorize(self, operation: str, **kwargs) -> list:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Vectorizer circuit is open, {operation} not attempted.")
+
+        url = f"{self.base_url}{operation}{self.version}"
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                r = await self.client.post(url, **kwargs)
+            except httpx.HTTPError as e:
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise VectorizerError(f"{operation} request failed: {e}") from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if r.status_code in self.RETRY_STATUSES and not last_attempt:
+                await asyncio.sleep(self._backoff(attempt, r))
+                continue
+            break
+
+        if r.status_code == 200:
+            self.breaker.record_success()
+            return r.json()["vector"]
+
+        if r.status_code in self.RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            # Client errors (bad image, bad key) say nothing about the service's health
+            self.breaker.record_success()
+        raise VectorizerError(f"{operation} failed. Error code: {r.status_code}, Response: {r.text}")
+
+
+def _read_prepared_image(image_bytes) -> bytes:
+    body, _ = prepare_image_for_embedding(image_bytes)
+    return body.read()
+
+
+async def get_image_embedding_async(client: AsyncVectorizerClient, image_bytes, image_md5, db_session=None):
+    """
+    get_image_embedding for async callers: same cache and embedding table lookups, with the
+    image preparation on a worker thread and the vectorizer call awaited.
+
+    :param client: The AsyncVectorizerClient to use.
+    :param image_bytes: ImageBytes of the image.
+    :param image_md5: MD5 of the image bytes.
+    :param db_session: Optional AsyncSession used for the embedding table lookup. Must not be
+                       shared with other tasks running at the same time.
+    :return: The vector embedding of the image.
+    :raises VectorizerError: If the image is not cached and the vectorizer call fails.
+    """
+    model_version = Config.AZURE_VISION_MODEL_VERSION
+    cache_key = (image_md5, model_version)
+
+    embedding = EMBEDDING_CACHE.get(cache_key)
+    if embedding is None and db_session is not None:
+        embedding = await db_session.run_sync(find_embedding_by_md5, image_md5, model_version)
+    if embedding is None:
+        body = await asyncio.to_thread(_read_prepared_image, image_bytes)
+        embedding = await client.vectorize_image(body)
+
+    if embedding is not None:
+        EMBEDDING_CACHE.set(cache_key, embedding)
+    return embedding
+
+
+async def get_image_embeddings_async(client: AsyncVectorizerClient, images, db_session=None):
+    """
+    get_image_embeddings for async callers: one embedding table query for the images not cached,
+    then the vectorizer calls for the rest run concurrently, at most
+    Config.INGEST_EMBEDDING_CONCURRENCY at a time.
+
+    :param images: List of (ImageBytes, image_md5) tuples.
+    :return: The embeddings, in the order of 'images'.
+    :raises VectorizerError: If any vectorizer call fails.
+    """
+    model_version = Config.AZURE_VISION_MODEL_VERSION
+    embeddings = {image_md5: EMBEDDING_CACHE.get((image_md5, model_version)) for _, image_md5 in images}
+    missing = [image_md5 for image_md5, embedding in embeddings.items() if embedding is None]
+    if missing and db_session is not None:
+        embeddings.update(await db_session.run_sync(find_embeddings_by_md5s, missing, model_version))
+
+    semaphore = asyncio.Semaphore(Config.INGEST_EMBEDDING_CONCURRENCY)
+
+    async def embed(image_bytes):
+        async with semaphore:
+            body = await asyncio.to_thread(_read_prepared_image, image_bytes)
+            return await client.vectorize_image(body)
+
+    to_embed = {image_md5: image_bytes for image_bytes, image_md5 in images if embeddings[image_md5] is None}
+    results = await asyncio.gather(*(embed(image_bytes) for image_bytes in to_embed.values()))
+    embeddings.update(zip(to_embed, results))
+
+    for image_md5, embedding in embeddings.items():
+        if embedding is not None:
+            EMBEDDING_CACHE.set((image_md5, model_version), embedding)
+    return [embeddings[image_md5] for _, image_md5 in images]
+
+
+async def get_text_embedding_async(client: AsyncVectorizerClient, text, db_session=None):
+    """
+    get_text_embedding for async callers: same normalization, cache and prompt_embedding table,
+    with the vectorizer call awaited.
+
+    :param db_session: Optional AsyncSession used for the prompt_embedding table.
+    """
+    normalized = normalize_prompt(text or "")
+    if not normalized:
+        return None
+    model_version = Config.AZURE_VISION_MODEL_VERSION
+    key = prompt_hash(normalized)
+
+    embedding = TEXT_EMBEDDING_CACHE.get((key, model_version))
+    if embedding is None and db_session is not None:
+        embedding = await db_session.run_sync(find_prompt_embedding, key, model_version)
+    if embedding is None:
+        embedding = await client.vectorize_text(normalized)
+        if embedding is not None and db_session is not None:
+            await db_session.run_sync(prompt_embedding_to_db, key, model_version, embedding)
+
+    if embedding is not None:
+        TEXT_EMBEDDING_CACHE.set((key, model_version), embedding)
+    return embedding
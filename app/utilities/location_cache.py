@@ -0,0 +1,82 @@
+import threading
+from importlib import import_module
+
+from app.config import Config
+from app.utilities.cache import LRUCache
+
+
+class LocationStore:
+    """
+    Storage behind the session location cache. Implement get/set/delete over any shared
+    key-value store (e.g. Redis) and point Config.LOCATION_CACHE_BACKEND at a factory returning
+    it, so all worker processes see the same locations.
+    """
+
+    def get(self, key: str):
+        """:return: The WKT Point stored for key, or None if missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key: str, location_wkt: str, ttl: float):
+        """Stores location_wkt under key for ttl seconds."""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InMemoryLocationStore(LocationStore):
+    """Per-process store, the default."""
+
+    def __init__(self, maxsize: int = None):
+        self._cache = LRUCache(maxsize or Config.LOCATION_CACHE_SIZE)
+
+    def get(self, key: str):
+        return self._cache.get(key)
+
+    def set(self, key: str, location_wkt: str, ttl: float):
+        self._cache.set(key, location_wkt, ttl=ttl)
+
+    def delete(self, key: str):
+        self._cache.delete(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_location_store() -> LocationStore:
+    """Returns the process-wide store configured by Config.LOCATION_CACHE_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = Config.LOCATION_CACHE_BACKEND
+                if not backend or backend == "memory":
+                    _store = InMemoryLocationStore()
+                else:
+                    module_name, _, factory = backend.partition(":")
+                    _store = getattr(import_module(module_name), factory)()
+    return _store
+
+
+def _session_key(chat_session_id, account_id) -> str:
+    return f"location:{chat_session_id}:{account_id}"
+
+
+def get_session_location(chat_session_id, account_id):
+    """
+    :param chat_session_id: Primary key of the ChatSession.
+    :param account_id: Primary key of the Account.
+    :return: The session's cached WKT Point, or None.
+    """
+    return get_location_store().get(_session_key(chat_session_id, account_id))
+
+
+def set_session_location(chat_session_id, account_id, location_wkt, back_hours: float = None):
+    """
+    Writes a session's current location through to the cache. The entry expires after
+    'back_hours', the same window get_location_from_db looks back over.
+    """
+    back_hours = Config.LOCATION_BACK_HOURS if back_hours is None else back_hours
+    if location_wkt and back_hours > 0:
+        get_location_store().set(_session_key(chat_session_id, account_id), location_wkt, back_hours * 3600)
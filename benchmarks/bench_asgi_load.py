@@ -0,0 +1,199 @@
+"""
+Concurrent-connection throughput of /process_chat_json, Flask (threaded WSGI dev server, as
+main.py runs it) vs the ASGI entry point (uvicorn app.asgi:app).
+
+Azure is replaced by a local stand-in that answers every vectorize call after --azure-latency-ms
+with a random embedding, so the numbers reflect how each server handles waiting on it. Every
+request carries a distinct small image, so no request is served from the embedding cache. Each
+server runs in its own process against --database-uri; chat rows are written there, so point it
+at a scratch database.
+
+Usage:
+    python -m benchmarks.bench_asgi_load --concurrency 1 10 50 --requests 300
+"""
+import io
+import os
+import sys
+import json
+import time
+import base64
+import random
+import socket
+import asyncio
+import argparse
+import statistics
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config import Config
+from benchmarks.common import DEFAULT_DATABASE_URI, print_table
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_azure(latency_ms, dim):
+    """Serves vectorizeImage/vectorizeText on a background thread. :return: (server, base url)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like Azure
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency_ms / 1000)
+            body = json.dumps({"modelVersion": Config.AZURE_VISION_MODEL_VERSION,
+                               "vector": [random.random() - 0.5 for _ in range(dim)]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/"
+
+
+def serve(variant, port, azure_url, database_uri):
+    """Runs one server in this process with Config pointed at the stand-in and the database."""
+    Config.AZURE_VISION_ENDPOINT = azure_url
+    Config.SQLALCHEMY_DATABASE_URI = database_uri
+    Config.ASYNC_SQLALCHEMY_DATABASE_URI = database_uri.replace("postgresql://", "postgresql+asyncpg://", 1)
+    Config.INGEST_JOB_AUTOSTART = False
+
+    if variant == "flask":
+        from app.app import create_app
+        create_app().run(host="127.0.0.1", port=port, threaded=True)
+    else:
+        import uvicorn
+        uvicorn.run("app.asgi:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def make_payloads(count):
+    from PIL import Image
+
+    payloads = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (32, 32), os.urandom(32 * 32 * 3)).save(buffer, format="JPEG")
+        payloads.append({
+            "model": "gpt-4o-mini",
+            "user": f"bench-{i % 20}",
+            "session": f"bench-session-{i}",
+            "stream": False,
+            "messages": [
+                {"role": "user", "content": [
+                    {"type": "text", "text": "What is near here?"},
+                    {"type": "image_url", "image_url": {
+                        "url": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode(),
+                        "detail": "auto"}},
+                ]},
+                {"role": "user", "content": {"type": "location",
+                                             "location": {"longitude": -1.7063, "latitude": 52.1926}}},
+            ],
+        })
+    return payloads
+
+
+async def wait_until_up(base_url, timeout=60):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+async def load(base_url, payloads, concurrency):
+    import httpx
+
+    queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+    latencies, errors = [], 0
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            payload = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/process_chat_json", json=payload)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests_per_s": len(payloads) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=DEFAULT_DATABASE_URI)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=300, help="Requests per variant and concurrency level")
+    parser.add_argument("--azure-latency-ms", type=float, default=300)
+    parser.add_argument("--dim", type=int, default=Config.VECTOR_DIMENSION)
+    parser.add_argument("--variants", nargs="+", default=["flask", "asgi"])
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--azure-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.azure_url, args.database_uri)
+        return
+
+    azure, azure_url = start_fake_azure(args.azure_latency_ms, args.dim)
+    rows = []
+    try:
+        for variant in args.variants:
+            port = free_port()
+            server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_asgi_load", "--serve", variant,
+                                       "--port", str(port), "--azure-url", azure_url,
+                                       "--database-uri", args.database_uri])
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                asyncio.run(wait_until_up(base_url))
+                for concurrency in args.concurrency:
+                    stats = asyncio.run(load(base_url, make_payloads(args.requests), concurrency))
+                    rows.append([variant, concurrency, args.requests, stats["requests_per_s"],
+                                 stats["p50_ms"], stats["p95_ms"], stats["errors"]])
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        azure.shutdown()
+
+    print_table(["server", "concurrency", "requests", "requests_per_s", "p50_ms", "p95_ms", "errors"], rows)
+
+
+if __name__ == "__main__":
+    main()
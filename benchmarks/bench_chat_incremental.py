@@ -0,0 +1,60 @@
+"""
+Per-turn cost of load_chat_turn as a session grows: the client resends the whole conversation,
+whose first message carries an inline photo (a test image as a base64 data URL).
+
+"full rescan" is a turn without session progress: the history is searched from the start and
+the photo decoded, hashed and its EXIF read again. "incremental" passes the progress stored by
+the previous turn, so only the new message is looked at and the photo is carried over.
+The database and the vectorizer are not involved.
+
+Usage:
+    python -m benchmarks.bench_chat_incremental --messages 10 50 100 200
+"""
+import os
+import base64
+import argparse
+from types import SimpleNamespace
+
+from app.utilities.chat import load_chat_turn, message_hash
+from benchmarks.common import time_calls, print_table
+
+IMAGE = os.path.join(os.path.dirname(__file__), "..", "app", "test", "images", "IMG_0475.JPG")
+
+
+def conversation(message_count, image_url):
+    messages = [{"role": "user", "content": [{"type": "text", "text": "What is this?"},
+                                             {"type": "image_url", "image_url": {"url": image_url, "detail": "auto"}}]}]
+    for i in range(1, message_count):
+        messages.append({"role": "assistant" if i % 2 else "user", "content": f"Message {i} " + "lorem ipsum " * 20})
+    return {"model": "gpt-4o-mini", "user": "bench", "session": "bench-session", "stream": False,
+            "max_tokens": 1000, "messages": messages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default=IMAGE)
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as image_file:
+        image_url = "data:image/jpeg;base64," + base64.b64encode(image_file.read()).decode()
+
+    def load(data, progress):
+        load_chat_turn(data, progress).close_images()
+
+    rows = []
+    for message_count in args.messages:
+        data = conversation(message_count, image_url)
+        previous = data["messages"][-2]
+        progress = {"processed_message_count": message_count - 1, "last_message_hash": message_hash(previous),
+                    "last_image": SimpleNamespace(id=1, md5="0" * 32), "last_image_location": None}
+        for name, turn_progress in (("full rescan", None), ("incremental", progress)):
+            stats = time_calls(lambda: load(data, turn_progress), repeat=args.repeat)
+            rows.append([name, message_count, stats["median_ms"], stats["p95_ms"]])
+
+    print_table(["turn", "messages", "median_ms", "p95_ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
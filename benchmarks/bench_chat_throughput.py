@@ -0,0 +1,95 @@
+"""
+Write throughput of the /process_chat_json database work, one commit per helper vs one per request.
+
+Each simulated request runs the same helpers as the route: account_to_db, chat_session_to_db,
+image_to_db (new image + embedding), device_to_db and chat_history_to_db. "commit per helper"
+commits after every helper, as the helpers used to do themselves (the old image_to_db committed
+twice, so the real before-number was slightly worse); "unit of work" runs them inside
+unit_of_work() and commits once. The vectorizer is not called; a random embedding is used.
+
+The tables are created in their own Postgres schema (bench_chat) so application data is untouched.
+
+Usage:
+    python -m benchmarks.bench_chat_throughput --requests 500 --threads 1 4 8
+"""
+import time
+import uuid
+import random
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.models import db
+from app.utilities.common import TZ
+from app.utilities.db_common import account_to_db, chat_session_to_db, image_to_db, device_to_db, \
+    chat_history_to_db, unit_of_work
+from benchmarks.common import DEFAULT_DATABASE_URI, bench_engine, create_bench_schema, print_table
+
+SCHEMA = "bench_chat"
+METADATA = {"Make": "Apple", "Model": "iPhone 13 Pro", "WKT Point": "POINT(-1.7063 52.1926)"}
+
+
+def chat_request(db_session, embedding, commit_each):
+    def step(result):
+        if commit_each:
+            db_session.commit()
+        return result
+
+    account = step(account_to_db(db_session, f"user-{random.randrange(50)}", "bench"))
+    chat_session = step(chat_session_to_db(db_session, str(uuid.uuid4()), datetime.now(TZ)))
+    image = step(image_to_db(db_session, "bench.jpg", METADATA, uuid.uuid4().hex, embedding, account.id, None))
+    step(device_to_db(db_session, METADATA))
+    step(chat_history_to_db(db_session, chat_session, account, image, "hello", METADATA["WKT Point"]))
+
+
+def run(engine, requests, threads, dim, commit_each):
+    embedding = [random.random() - 0.5 for _ in range(dim)]
+
+    def worker(count):
+        with Session(engine) as db_session:
+            for _ in range(count):
+                if commit_each:
+                    chat_request(db_session, embedding, commit_each=True)
+                else:
+                    with unit_of_work(db_session):
+                        chat_request(db_session, embedding, commit_each=False)
+
+    shares = [requests // threads + (1 if i < requests % threads else 0) for i in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(worker, share) for share in shares]:
+            future.result()
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=DEFAULT_DATABASE_URI)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--dim", type=int, default=Config.VECTOR_DIMENSION)
+    parser.add_argument("--keep", action="store_true", help="Keep the bench_chat schema afterwards")
+    args = parser.parse_args()
+
+    engine = bench_engine(args.database_uri, SCHEMA, pool_size=max(args.threads), max_overflow=0)
+    create_bench_schema(engine, SCHEMA, db.metadata)
+
+    rows = []
+    for threads in args.threads:
+        for name, commit_each in (("commit per helper", True), ("unit of work", False)):
+            rows.append([threads, name, run(engine, args.requests, threads, args.dim, commit_each)])
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    engine.dispose()
+
+    print_table(["threads", "variant", "requests_per_s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Bytes saved and latency of downscaling images before vectorization, over app/test/images.
+
+Without --live only the local preprocessing is measured. With --live each image is also sent
+to the configured Azure vectorizer twice (original and downscaled) to compare round-trips.
+
+Usage:
+    python -m benchmarks.bench_downscale [--max-side 1024] [--quality 85] [--live]
+"""
+import os
+import time
+import argparse
+
+from app.utilities.image import ImageBytes, prepare_image_for_embedding
+from benchmarks.common import print_table
+
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "test", "images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-dir", default=IMAGE_DIR)
+    parser.add_argument("--max-side", type=int, default=None)
+    parser.add_argument("--quality", type=int, default=None)
+    parser.add_argument("--live", action="store_true", help="Also time vectorizer round-trips")
+    args = parser.parse_args()
+
+    client = None
+    if args.live:
+        from app.utilities.llm import get_vectorizer_client
+        client = get_vectorizer_client()
+
+    rows = []
+    totals = {"original": 0, "sent": 0, "prepare_ms": 0.0, "original_rtt": 0.0, "sent_rtt": 0.0}
+    for name in sorted(f for f in os.listdir(args.image_dir) if f.lower().endswith((".jpg", ".jpeg"))):
+        with ImageBytes.from_file(os.path.join(args.image_dir, name)) as image_bytes:
+            body, stats = prepare_image_for_embedding(image_bytes, args.max_side, args.quality)
+            row = [name, stats["original_bytes"] // 1024, stats["sent_bytes"] // 1024, stats["elapsed_ms"]]
+            totals["original"] += stats["original_bytes"]
+            totals["sent"] += stats["sent_bytes"]
+            totals["prepare_ms"] += stats["elapsed_ms"]
+
+            if client:
+                start = time.perf_counter()
+                client.vectorize_image(image_bytes.open())
+                original_rtt = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                client.vectorize_image(body)
+                sent_rtt = (time.perf_counter() - start) * 1000
+                row += [original_rtt, sent_rtt]
+                totals["original_rtt"] += original_rtt
+                totals["sent_rtt"] += sent_rtt
+            body.close()
+        rows.append(row)
+
+    headers = ["image", "original_kb", "sent_kb", "prepare_ms"]
+    if client:
+        headers += ["original_rtt_ms", "downscaled_rtt_ms"]
+    print_table(headers, rows)
+
+    saved = totals["original"] - totals["sent"]
+    print(f"\nbytes saved: {saved // 1024} KB of {totals['original'] // 1024} KB "
+          f"({100.0 * saved / max(1, totals['original']):.1f}%), preprocessing: {totals['prepare_ms']:.1f} ms")
+    if client:
+        print(f"vectorizer round-trips: {totals['original_rtt']:.1f} ms original, "
+              f"{totals['sent_rtt'] + totals['prepare_ms']:.1f} ms downscaled including preprocessing")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+EXIF extraction throughput over app/test/images: PIL (Image.open + _getexif) against the
+header-only reader. Only the EXIF read is timed; the timezone lookup in extract_image_metadata
+is the same for both and is left out.
+
+Usage:
+    python -m benchmarks.bench_exif --repeat 50
+"""
+import os
+import time
+import argparse
+
+from app.utilities.image import read_exif, ImageBytes
+from benchmarks.common import print_table
+
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "test", "images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-dir", default=IMAGE_DIR)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(args.image_dir, f) for f in os.listdir(args.image_dir) if f.lower().endswith((".jpg", ".jpeg", ".heic")))
+    in_memory = {}
+    for path in paths:
+        with open(path, "rb") as image_file:
+            in_memory[path] = image_file.read()
+
+    inputs = {
+        "file path": lambda path: path,
+        "in memory": lambda path: ImageBytes(in_memory[path]),
+    }
+    rows = []
+    for input_name, make_input in inputs.items():
+        for reader_name, fast in (("PIL", False), ("header-only", True)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for path in paths:
+                    read_exif(make_input(path), fast=fast)
+            elapsed = time.perf_counter() - start
+            count = args.repeat * len(paths)
+            rows.append([input_name, reader_name, count / elapsed, elapsed / count * 1e6])
+
+    print_table(["input", "reader", "images_per_s", "us_per_image"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Peak memory and latency of the image path for one large photo, before and after ImageBytes.
+
+"legacy" replays what the routes did before: base64-encode the file, decode it for the MD5,
+decode it again into a BytesIO for EXIF, then read the BytesIO into the request body.
+"image_bytes" maps the file (or decodes the data: URL once) and shares that buffer. The
+request body is drained in 16 KB chunks, as urllib3 sends it; no network call is made.
+
+Each variant runs in a fresh interpreter so ru_maxrss reflects that variant alone.
+
+Usage:
+    python -m benchmarks.bench_image_bytes --size-mb 20
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import resource
+import subprocess
+import tempfile
+
+from benchmarks.common import print_table
+
+CHUNK = 16 * 1024
+
+
+def make_jpeg(path, size_mb):
+    """Writes a noise JPEG of roughly size_mb megabytes with a GPS EXIF block."""
+    import piexif
+    from PIL import Image
+
+    exif = piexif.dump({"GPS": {
+        piexif.GPSIFD.GPSLatitudeRef: b"N", piexif.GPSIFD.GPSLatitude: ((52, 1), (11, 1), (3309, 100)),
+        piexif.GPSIFD.GPSLongitudeRef: b"W", piexif.GPSIFD.GPSLongitude: ((1, 1), (42, 1), (2806, 100)),
+    }})
+    side = 1024
+    while True:
+        image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+        image.save(path, format="JPEG", quality=100, exif=exif)
+        if os.path.getsize(path) >= size_mb * 1024 * 1024:
+            return
+        side = int(side * 1.25)
+
+
+def drain(body):
+    if isinstance(body, (bytes, bytearray)):
+        for start in range(0, len(body), CHUNK):
+            body[start:start + CHUNK]
+    else:
+        while body.read(CHUNK):
+            pass
+
+
+def run_variant(variant, source, path):
+    from app.utilities.image import (ImageBytes, extract_image_metadata, get_md5_of_image,
+                                     image_to_base64, base64_to_image)
+
+    data_url = None
+    if source == "data_url":
+        with open(path, "rb") as image_file:
+            data_url = "data:image/jpeg;base64," + base64.b64encode(image_file.read()).decode()
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+
+    if variant == "legacy":
+        base64_str = data_url.split(",", 1)[1] if data_url else image_to_base64(path)
+        get_md5_of_image(base64_str)
+        image_data = base64_to_image(base64_str)
+        extract_image_metadata(image_data)
+        image_data.seek(0)
+        drain(image_data.read())
+    else:
+        image_bytes = ImageBytes.load(data_url or path)
+        image_bytes.md5
+        extract_image_metadata(image_bytes)
+        drain(image_bytes.open())
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"elapsed_ms": elapsed_ms, "peak_mb": peak_kb / 1024, "delta_mb": (peak_kb - baseline_kb) / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--image", help="Use this file instead of generating one")
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--source", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.source, args.image)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.image
+        if not path:
+            path = os.path.join(tmp, "large.jpg")
+            make_jpeg(path, args.size_mb)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+
+        rows = []
+        for source in ("file", "data_url"):
+            for variant in ("legacy", "image_bytes"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_image_bytes", "--variant", variant,
+                     "--source", source, "--image", path],
+                    check=True, capture_output=True, text=True,
+                ).stdout.strip().splitlines()[-1]
+                result = json.loads(output)
+                rows.append([f"{size_mb:.1f}", source, variant, result["elapsed_ms"], result["delta_mb"], result["peak_mb"]])
+
+    print_table(["image_mb", "source", "variant", "elapsed_ms", "rss_growth_mb", "peak_rss_mb"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+JSON handling of /process_chat_json bodies carrying --image-mb MB inline images (random bytes as
+a base64 data:image/jpeg URL), Flask's stdlib provider vs OrjsonProvider:
+
+- "get_json": request.get_json() on the body, in a test request context,
+- "jsonify": a response echoing the messages back,
+- "oversized reject": the same body with MAX_CONTENT_LENGTH below its size; answered with a
+  413 by the before_request check, without reading the body.
+
+Usage:
+    python -m benchmarks.bench_json_body --image-mb 5 --images 1 2 --repeat 20
+"""
+import os
+import base64
+import argparse
+
+from flask import jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+from app.app import create_app
+from app.json_provider import OrjsonProvider
+from benchmarks.common import time_calls, print_table
+
+
+def chat_body(app, image_mb, images):
+    data_url = "data:image/jpeg;base64," + base64.b64encode(os.urandom(int(image_mb * 1024 * 1024))).decode()
+    content = [{"type": "text", "text": "What is this?"}] + \
+              [{"type": "image_url", "image_url": {"url": data_url, "detail": "auto"}} for _ in range(images)]
+    payload = {"model": "gpt-4o-mini", "user": "bench", "session": "bench-session", "stream": False,
+               "max_tokens": 1000, "messages": [{"role": "user", "content": content}]}
+    return DefaultJSONProvider(app).dumps(payload).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-mb", type=float, default=5)
+    parser.add_argument("--images", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    providers = {"stdlib json": DefaultJSONProvider(app), "orjson": OrjsonProvider(app)}
+
+    rows = []
+    for images in args.images:
+        body = chat_body(app, args.image_mb, images)
+        body_mb = len(body) / 1024 / 1024
+
+        for name, provider in providers.items():
+            app.json = provider
+
+            def get_json():
+                with app.test_request_context("/process_chat_json", method="POST", data=body,
+                                              content_type="application/json"):
+                    return request.get_json()
+
+            data = get_json()
+
+            def respond():
+                with app.test_request_context():
+                    return jsonify(data["messages"]).get_data()
+
+            for operation, fn in (("get_json", get_json), ("jsonify", respond)):
+                stats = time_calls(fn, repeat=args.repeat)
+                rows.append([name, operation, images, f"{body_mb:.1f}", stats["median_ms"], stats["p95_ms"]])
+
+        limit = app.config["MAX_CONTENT_LENGTH"]
+        app.config["MAX_CONTENT_LENGTH"] = len(body) - 1
+        client = app.test_client()
+        stats = time_calls(lambda: client.post("/process_chat_json", data=body, content_type="application/json"),
+                           repeat=args.repeat)
+        rows.append(["-", "oversized reject", images, f"{body_mb:.1f}", stats["median_ms"], stats["p95_ms"]])
+        app.config["MAX_CONTENT_LENGTH"] = limit
+
+    print_table(["provider", "operation", "images", "body_mb", "median_ms", "p95_ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
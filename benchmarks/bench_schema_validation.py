@@ -0,0 +1,59 @@
+"""
+Validation latency of a /process_chat_json body with --messages messages (text, image_url and
+location content mixed), per strategy:
+
+- "jsonschema.validate": what the routes used to call; checks the schema against its metaschema
+  and builds a validator on every call,
+- "compiled jsonschema": SchemaValidator without the fast path,
+- "compiled + fastjsonschema": SchemaValidator with the fastjsonschema fast path (skipped when
+  fastjsonschema is not installed).
+
+Usage:
+    python -m benchmarks.bench_schema_validation --messages 50 --repeat 500
+"""
+import argparse
+
+from jsonschema import validate
+
+from app.models_base import ChatJsonSchema, SchemaValidator, fastjsonschema
+from benchmarks.common import time_calls, print_table
+
+
+def chat_payload(message_count):
+    contents = [
+        "What is this building?",
+        [{"type": "text", "text": "And this one?"},
+         {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,/9j/4AAQSkZJRg==", "detail": "auto"}}],
+        {"type": "location", "location": {"longitude": -1.7063, "latitude": 52.1926}},
+    ]
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": contents[i % len(contents)]}
+                for i in range(message_count)]
+    return {"model": "gpt-4o-mini", "user": "bench", "session": "bench-session", "stream": False,
+            "max_tokens": 1000, "messages": messages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    payload = chat_payload(args.messages)
+    compiled = SchemaValidator(ChatJsonSchema, fast_path=False)
+    strategies = {
+        "jsonschema.validate": lambda: validate(instance=payload, schema=ChatJsonSchema),
+        "compiled jsonschema": lambda: compiled.validate(payload),
+    }
+    if fastjsonschema is not None:
+        fast = SchemaValidator(ChatJsonSchema, fast_path=True)
+        strategies["compiled + fastjsonschema"] = lambda: fast.validate(payload)
+
+    rows = []
+    for name, fn in strategies.items():
+        stats = time_calls(fn, repeat=args.repeat, warmup=10)
+        rows.append([name, args.messages, stats["median_ms"], stats["p95_ms"], stats["mean_ms"]])
+    print_table(["strategy", "messages", "median_ms", "p95_ms", "mean_ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
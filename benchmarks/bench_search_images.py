@@ -0,0 +1,154 @@
+"""
+Latency benchmark for search_images over synthetic image/embedding tables.
+
+Each table size is generated into its own Postgres schema (bench_search_<rows>) so the
+application tables are never touched. The legacy two-step search (load every image in the
+radius, then rank the whole embedding table) and the current single-statement search, in both
+approximate (ANN index) and exact mode, run against the same data. For a chat turn with
+--queries images, one search_images call per image is compared with one search_images_multi.
+
+Usage:
+    python -m benchmarks.bench_search_images --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+from geoalchemy2.functions import ST_DWithin, ST_GeogFromText
+
+from app.config import Config
+from app.models import db, Account, Image, Embedding
+from app.utilities.db_common import search_images, search_images_multi
+from benchmarks.common import DEFAULT_DATABASE_URI, bench_engine, create_bench_schema, time_calls, print_table
+
+# Synthetic images are scattered over a square of SPAN degrees around this point
+CENTER_LNG, CENTER_LAT = -1.7063, 52.1926
+SPAN = 0.5
+CHUNK = 100_000
+
+
+def legacy_search(db_session, location_wkt, embedding, radius, threshold, limit):
+    """The search_images implementation before the radius and ranking were merged."""
+    images = (
+        db_session.query(Image)
+        .filter(ST_DWithin(func.Geography(Image.location), func.Geography(ST_GeogFromText(location_wkt)), radius))
+        .all()
+    )
+    if not images:
+        return []
+    distance = Embedding.image_embedding.cosine_distance(embedding)
+    query = (
+        select(Embedding.id, distance.label("cosine_distance"), Image.id, Image.path)
+        .select_from(Embedding)
+        .join(Image, Embedding.image_id == Image.id)
+        .filter(distance < threshold)
+        .order_by(distance.asc())
+        .limit(limit)
+    )
+    return db_session.execute(query).fetchall()
+
+
+def search_each(db_session, location_wkt, embeddings, radius, threshold, limit):
+    """One search_images round trip per query embedding, merged in Python."""
+    best = {}
+    for embedding in embeddings:
+        for result in search_images(db_session, location_wkt, embedding, radius, threshold, limit, exact=False):
+            if result["image_id"] not in best or result["cosine_distance"] < best[result["image_id"]]["cosine_distance"]:
+                best[result["image_id"]] = result
+    return sorted(best.values(), key=lambda result: result["cosine_distance"])[:limit]
+
+
+def populate(engine, schema, rows, dim):
+    create_bench_schema(engine, schema, db.metadata)
+
+    # Build the ANN indexes after loading, which is much faster than maintaining them per row
+    vector_indexes = [index for index in Embedding.__table__.indexes if index.kwargs.get("postgresql_using")]
+    with engine.begin() as conn:
+        for index in vector_indexes:
+            conn.execute(text(f"DROP INDEX {schema}.{index.name}"))
+
+    with engine.begin() as conn:
+        conn.execute(
+            Account.__table__.insert().values(id=1, name="bench", source="bench", create_time=func.now())
+        )
+        for first in range(1, rows + 1, CHUNK):
+            last = min(rows, first + CHUNK - 1)
+            params = {"first": first, "last": last, "lng": CENTER_LNG, "lat": CENTER_LAT, "span": SPAN, "dim": dim}
+            conn.execute(text(
+                f"INSERT INTO {schema}.image (id, path, md5, creator_id, location, taken_time) "
+                "SELECT g, 'bench/' || g, md5(g::text), 1, "
+                "ST_SetSRID(ST_MakePoint(:lng + (random() - 0.5) * :span, :lat + (random() - 0.5) * :span), 4326)::geography, now() "
+                "FROM generate_series(:first, :last) g"
+            ), params)
+            conn.execute(text(
+                f"INSERT INTO {schema}.embedding (id, image_id, image_embedding) "
+                "SELECT g, g, (SELECT array_agg(random()::real - 0.5) FROM generate_series(1, :dim) WHERE g > 0)::vector "
+                "FROM generate_series(:first, :last) g"
+            ), params)
+        for index in vector_indexes:
+            conn.execute(CreateIndex(index))
+        conn.execute(text(f"ANALYZE {schema}.image"))
+        conn.execute(text(f"ANALYZE {schema}.embedding"))
+
+
+def random_query(dim):
+    lng = CENTER_LNG + (random.random() - 0.5) * SPAN
+    lat = CENTER_LAT + (random.random() - 0.5) * SPAN
+    embedding = [random.random() - 0.5 for _ in range(dim)]
+    return f"POINT({lng} {lat})", embedding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=DEFAULT_DATABASE_URI)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=Config.VECTOR_DIMENSION)
+    parser.add_argument("--radii", type=float, nargs="+", default=[500, 5000])
+    parser.add_argument("--threshold", type=float, default=1.0)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=3, help="Query images for the multi-image variants")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--reuse", action="store_true", help="Reuse previously generated schemas")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated schemas afterwards")
+    args = parser.parse_args()
+
+    rows_out = []
+    for size in args.sizes:
+        schema = f"bench_search_{size}"
+        engine = bench_engine(args.database_uri, schema)
+        if not args.reuse:
+            print(f"Generating {size} rows into {schema} ...")
+            populate(engine, schema, size, args.dim)
+
+        with Session(engine) as db_session:
+            for radius in args.radii:
+                single = lambda fn, **kwargs: lambda session, location_wkt, embeddings, *params: \
+                    fn(session, location_wkt, embeddings[0], *params, **kwargs)
+                variants = (
+                    ("legacy two-step", single(legacy_search)),
+                    ("single query, ann", single(search_images, exact=False)),
+                    ("single query, exact", single(search_images, exact=True)),
+                    (f"{args.queries} images, query each", search_each),
+                    (f"{args.queries} images, multi-query", lambda *params: search_images_multi(*params, exact=False)),
+                )
+                for name, fn in variants:
+                    def run():
+                        location_wkt, embedding = random_query(args.dim)
+                        embeddings = [embedding] + [random_query(args.dim)[1] for _ in range(args.queries - 1)]
+                        fn(db_session, location_wkt, embeddings, radius, args.threshold, args.limit)
+                        db_session.rollback()
+                    stats = time_calls(run, repeat=args.repeat)
+                    rows_out.append([size, radius, name, stats["median_ms"], stats["p95_ms"]])
+
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        engine.dispose()
+
+    print_table(["rows", "radius_m", "variant", "median_ms", "p95_ms"], rows_out)
+
+
+if __name__ == "__main__":
+    main()
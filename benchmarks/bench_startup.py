@@ -0,0 +1,85 @@
+"""
+Startup cost of the app: what a gunicorn worker spawn or the test_routes.py `client` fixture pays
+before serving its first request.
+
+Each run is a fresh interpreter that times importing app.app, create_app() and creating a test
+client, and reports the process wall time. The "with create_all" variant also runs db.create_all()
+in the app context, as create_app() used to on every startup; it needs --database-uri to be
+reachable. The "development" variant builds the profile main.py and the flask CLI use, which must
+cost the same as "create_app" (it used to start the ingest workers, importing every handler module). The "preloaded" variant imports the request handlers' modules too, as wsgi.py does
+before gunicorn forks its workers.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 10
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from benchmarks.common import DEFAULT_DATABASE_URI, print_table
+
+RUN = """
+import json, os, time
+start = time.perf_counter()
+from app.app import create_app
+imported = time.perf_counter()
+app = create_app({profile!r})
+created = time.perf_counter()
+if {create_all!r}:
+    from app.models import db
+    app.config["SQLALCHEMY_DATABASE_URI"] = {database_uri!r}
+    with app.app_context():
+        db.create_all()
+if {preload!r}:
+    import importlib
+    for module in ("app.utilities.chat", "app.utilities.ingest", "app.utilities.jobs", "app.models_base"):
+        importlib.import_module(module)
+ready = time.perf_counter()
+client = app.test_client()
+done = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "extra_ms": (ready - created) * 1000, "test_client_ms": (done - ready) * 1000}}))
+"""
+
+VARIANTS = {
+    "create_app": {"create_all": False, "preload": False, "profile": "testing"},
+    "development": {"create_all": False, "preload": False, "profile": "development"},
+    "with create_all": {"create_all": True, "preload": False, "profile": "testing"},
+    "preloaded": {"create_all": False, "preload": True, "profile": "testing"},
+}
+
+
+def run_once(variant, database_uri):
+    code = RUN.format(database_uri=database_uri, **VARIANTS[variant])
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    stats = json.loads(out.strip().splitlines()[-1])
+    stats["process_ms"] = (time.perf_counter() - start) * 1000
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=DEFAULT_DATABASE_URI)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    args = parser.parse_args()
+
+    columns = ["import_ms", "create_app_ms", "extra_ms", "test_client_ms", "process_ms"]
+    rows = []
+    for variant in args.variants:
+        try:
+            runs = [run_once(variant, args.database_uri) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as e:
+            print(f"{variant}: failed\n{e.stderr.strip().splitlines()[-1]}")
+            continue
+        rows.append([variant, args.runs] + [statistics.median(r[c] for r in runs) for c in columns])
+
+    print_table(["variant", "runs"] + [f"median_{c}" for c in columns], rows)
+
+
+if __name__ == "__main__":
+    main()
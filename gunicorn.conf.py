@@ -0,0 +1,56 @@
+"""
+gunicorn settings, overridable through the environment:
+
+    WEB_CONCURRENCY     worker processes (default: 2 per CPU + 1)
+    GUNICORN_THREADS    request threads per worker (default 4)
+    GUNICORN_WORKER     worker class: "gthread" for wsgi:app, or
+                        "uvicorn.workers.UvicornWorker" for app.asgi:app
+    BIND                address to listen on (default 0.0.0.0:5001)
+
+The app is imported once in the master (preload_app) and forked into the workers. The
+SQLAlchemy pool of each worker is sized from WEB_CONCURRENCY and GUNICORN_THREADS by
+ProductionConfig, so both are set in the environment before the app is loaded.
+"""
+import os
+import multiprocessing
+
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.environ.setdefault("GUNICORN_THREADS", "4"))
+worker_class = os.environ.get("GUNICORN_WORKER", "gthread")
+bind = os.environ.get("BIND", "0.0.0.0:5001")
+
+os.environ.setdefault("APP_ENV", "production")
+
+preload_app = True
+timeout = 60  # Covers the vectorizer's retries with backoff
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000  # Recycle workers to bound memory growth
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """
+    Connections opened in the master while preloading must not be shared across processes:
+    the worker drops its inherited database pool and vectorizer session, then starts its own
+    ingest job workers (threads do not survive fork). A UvicornWorker starts them in the ASGI
+    lifespan instead, see app.asgi.AsyncResources.
+    """
+    from flask import Flask
+    from app.models import db
+    from app.utilities.llm import reset_vectorizer_client
+    from app.utilities.jobs import autostart_ingest_workers
+
+    app = worker.app.wsgi()
+    serves_wsgi = isinstance(app, Flask)
+    if not serves_wsgi:
+        from app.asgi import flask_app as app  # UvicornWorker loaded app.asgi:app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    reset_vectorizer_client()
+    if serves_wsgi:
+        autostart_ingest_workers(app)
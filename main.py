@@ -1,5 +1,11 @@
+import os
+
 from app.app import create_app
 
 if __name__ == "__main__":
-    app = create_app(debug=True)
+    from app.utilities.jobs import autostart_ingest_workers
+
+    app = create_app("development")
+    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":  # Not in the reloader's watcher process
+        autostart_ingest_workers(app)
     app.run(host="0.0.0.0", port=5001)
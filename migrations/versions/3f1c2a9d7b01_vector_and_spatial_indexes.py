@@ -0,0 +1,58 @@
+"""vector and spatial indexes
+
+Fixes the embedding columns to Config.VECTOR_DIMENSION and adds the cosine ANN indexes
+(HNSW or IVFFlat, per Config.VECTOR_INDEX_TYPE) plus the GiST location indexes. Databases
+created through db.create_all() may already have the GiST indexes, hence IF NOT EXISTS.
+
+Revision ID: 3f1c2a9d7b01
+Revises:
+Create Date: 2026-10-17 09:12:44.118402
+
+"""
+from alembic import op
+
+from app.config import Config
+from app.models import vector_index
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+VECTOR_INDEXES = (
+    ('ix_embedding_image_embedding', 'image_embedding'),
+    ('ix_embedding_transcript_embedding', 'transcript_embedding'),
+)
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+
+    for column_name in ('image_embedding', 'transcript_embedding'):
+        op.execute(
+            f"ALTER TABLE embedding ALTER COLUMN {column_name} "
+            f"TYPE vector({int(Config.VECTOR_DIMENSION)})"
+        )
+
+    for name, column_name in VECTOR_INDEXES:
+        index = vector_index(name, column_name)
+        op.create_index(name, 'embedding', [column_name], if_not_exists=True, **index.kwargs)
+
+    op.create_index('ix_embedding_image_id', 'embedding', ['image_id'], if_not_exists=True)
+    op.create_index('idx_image_location', 'image', ['location'], postgresql_using='gist', if_not_exists=True)
+    op.create_index('idx_chat_history_location', 'chat_history', ['location'], postgresql_using='gist', if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_chat_history_location', table_name='chat_history', if_exists=True)
+    op.drop_index('idx_image_location', table_name='image', if_exists=True)
+    op.drop_index('ix_embedding_image_id', table_name='embedding', if_exists=True)
+    for name, _ in VECTOR_INDEXES:
+        op.drop_index(name, table_name='embedding', if_exists=True)
+
+    for column_name in ('image_embedding', 'transcript_embedding'):
+        op.execute(f"ALTER TABLE embedding ALTER COLUMN {column_name} TYPE vector")
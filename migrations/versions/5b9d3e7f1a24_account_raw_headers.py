@@ -0,0 +1,30 @@
+"""account raw headers
+
+Adds account.raw_headers. account.source now holds a normalized client (Referer host or
+User-Agent product) instead of the full header string; the header strings already stored in
+source are copied to raw_headers here. Merging the accounts this splits apart, and rewriting
+their source, is done by `flask compact-accounts`, which can be run and re-run separately.
+
+Revision ID: 5b9d3e7f1a24
+Revises: e4b7a1d9c362
+Create Date: 2026-10-17 13:26:51.417730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9d3e7f1a24'
+down_revision = 'e4b7a1d9c362'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('account', sa.Column('raw_headers', sa.Text(), nullable=True))
+    op.execute("UPDATE account SET raw_headers = source WHERE source LIKE 'User-Agent: %'")
+
+
+def downgrade():
+    op.drop_column('account', 'raw_headers')
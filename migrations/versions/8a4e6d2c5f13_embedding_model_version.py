@@ -0,0 +1,36 @@
+"""embedding model version
+
+Adds embedding.model_version so cached embeddings can be matched to the vectorizer model
+that produced them, and indexes image.md5 for the embedding cache lookup. Existing rows were
+all produced by the model configured at the time and are backfilled with it.
+
+Revision ID: 8a4e6d2c5f13
+Revises: 3f1c2a9d7b01
+Create Date: 2026-10-17 10:03:27.540119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import Config
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d2c5f13'
+down_revision = '3f1c2a9d7b01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('embedding', sa.Column('model_version', sa.String(), nullable=True))
+    op.execute(
+        sa.text("UPDATE embedding SET model_version = :model_version WHERE model_version IS NULL")
+        .bindparams(model_version=Config.AZURE_VISION_MODEL_VERSION)
+    )
+    op.create_index('ix_image_md5', 'image', ['md5'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_image_md5', table_name='image', if_exists=True)
+    op.drop_column('embedding', 'model_version')
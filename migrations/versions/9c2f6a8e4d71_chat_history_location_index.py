@@ -0,0 +1,28 @@
+"""chat history location index
+
+Adds ix_chat_history_session_account_time so the latest location of a chat session is read
+from the newest end of one index range instead of sorting the session's whole history.
+
+Revision ID: 9c2f6a8e4d71
+Revises: 5b9d3e7f1a24
+Create Date: 2026-10-17 14:02:37.664205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2f6a8e4d71'
+down_revision = '5b9d3e7f1a24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_chat_history_session_account_time', 'chat_history',
+                    ['session_id', 'account_id', sa.text('time DESC')], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_chat_history_session_account_time', table_name='chat_history', if_exists=True)
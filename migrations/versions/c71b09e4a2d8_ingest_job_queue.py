@@ -0,0 +1,43 @@
+"""ingest job queue
+
+Adds the ingest_job table backing the asynchronous /upload_images mode.
+
+Revision ID: c71b09e4a2d8
+Revises: 8a4e6d2c5f13
+Create Date: 2026-10-17 11:20:05.772931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71b09e4a2d8'
+down_revision = '8a4e6d2c5f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ingest_job',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('results', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('create_time', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('update_time', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['account.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_ingest_job_status_update_time', 'ingest_job', ['status', 'update_time'])
+
+
+def downgrade():
+    op.drop_index('ix_ingest_job_status_update_time', table_name='ingest_job')
+    op.drop_table('ingest_job')
@@ -0,0 +1,35 @@
+"""chat session progress
+
+Adds processed_message_count, last_message_hash and last_image_id to chat_session, so a turn
+only processes the messages the client added since the previous one and reuses the latest
+image found before them.
+
+Revision ID: d2a8f5c1b937
+Revises: 9c2f6a8e4d71
+Create Date: 2026-10-17 16:25:48.317902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8f5c1b937'
+down_revision = '9c2f6a8e4d71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('chat_session', sa.Column('processed_message_count', sa.Integer(), nullable=False,
+                                            server_default='0'))
+    op.add_column('chat_session', sa.Column('last_message_hash', sa.String(), nullable=True))
+    op.add_column('chat_session', sa.Column('last_image_id', sa.BigInteger(), nullable=True))
+    op.create_foreign_key('chat_session_last_image_id_fkey', 'chat_session', 'image', ['last_image_id'], ['id'])
+
+
+def downgrade():
+    op.drop_constraint('chat_session_last_image_id_fkey', 'chat_session', type_='foreignkey')
+    op.drop_column('chat_session', 'last_image_id')
+    op.drop_column('chat_session', 'last_message_hash')
+    op.drop_column('chat_session', 'processed_message_count')
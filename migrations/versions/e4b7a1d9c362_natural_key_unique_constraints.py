@@ -0,0 +1,77 @@
+"""natural key unique constraints
+
+Adds the unique constraints the get-or-create upserts rely on: account (name, source),
+device (device_maker, device_model), chat_session.session_id, image.md5 and embedding.image_id.
+Rows duplicated by the old SELECT-then-INSERT race are merged first: the lowest id of each group
+is kept and every foreign key pointing at a duplicate is moved to it. The embeddings of duplicate
+images are deleted rather than moved, so every image keeps exactly one embedding and searches do
+not return it several times. uq_image_md5 and uq_embedding_image_id replace ix_image_md5 and
+ix_embedding_image_id.
+
+Revision ID: e4b7a1d9c362
+Revises: c71b09e4a2d8
+Create Date: 2026-10-17 12:41:18.093564
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a1d9c362'
+down_revision = 'c71b09e4a2d8'
+branch_labels = None
+depends_on = None
+
+# table -> (natural key columns, [(referencing table, referencing column)],
+#           [(owned table, owning column)] whose rows are deleted with the duplicate)
+DEDUP = {
+    'account': (['name', 'source'], [('image', 'creator_id'), ('chat_history', 'account_id'),
+                                     ('ingest_job', 'account_id')], []),
+    'device': (['device_maker', 'device_model'], [('image', 'device_id')], []),
+    'chat_session': (['session_id'], [('chat_history', 'session_id')], []),
+    'image': (['md5'], [('chat_history', 'image_id')], [('embedding', 'image_id')]),
+    'embedding': (['image_id'], [], []),
+}
+
+
+def merge_duplicates(table, key_columns, references, owned):
+    keys = ', '.join(key_columns)
+    op.execute(sa.text(
+        f"CREATE TEMP TABLE merge_{table} ON COMMIT DROP AS "
+        f"SELECT id, keep_id FROM (SELECT id, min(id) OVER (PARTITION BY {keys}) AS keep_id FROM {table}) t "
+        f"WHERE id <> keep_id"
+    ))
+    for ref_table, ref_column in references:
+        op.execute(sa.text(
+            f"UPDATE {ref_table} SET {ref_column} = m.keep_id FROM merge_{table} m "
+            f"WHERE {ref_table}.{ref_column} = m.id"
+        ))
+    for owned_table, owner_column in owned:
+        op.execute(sa.text(
+            f"DELETE FROM {owned_table} USING merge_{table} m WHERE {owned_table}.{owner_column} = m.id"
+        ))
+    op.execute(sa.text(f"DELETE FROM {table} USING merge_{table} m WHERE {table}.id = m.id"))
+
+
+def upgrade():
+    for table, (key_columns, references, owned) in DEDUP.items():
+        merge_duplicates(table, key_columns, references, owned)
+
+    op.create_unique_constraint('uq_account_name_source', 'account', ['name', 'source'])
+    op.create_unique_constraint('uq_device_maker_model', 'device', ['device_maker', 'device_model'])
+    op.create_unique_constraint('uq_chat_session_session_id', 'chat_session', ['session_id'])
+    op.create_unique_constraint('uq_image_md5', 'image', ['md5'])
+    op.drop_index('ix_image_md5', table_name='image', if_exists=True)
+    op.create_unique_constraint('uq_embedding_image_id', 'embedding', ['image_id'])
+    op.drop_index('ix_embedding_image_id', table_name='embedding', if_exists=True)
+
+
+def downgrade():
+    op.create_index('ix_embedding_image_id', 'embedding', ['image_id'], if_not_exists=True)
+    op.drop_constraint('uq_embedding_image_id', 'embedding', type_='unique')
+    op.create_index('ix_image_md5', 'image', ['md5'], if_not_exists=True)
+    op.drop_constraint('uq_image_md5', 'image', type_='unique')
+    op.drop_constraint('uq_chat_session_session_id', 'chat_session', type_='unique')
+    op.drop_constraint('uq_device_maker_model', 'device', type_='unique')
+    op.drop_constraint('uq_account_name_source', 'account', type_='unique')
@@ -0,0 +1,39 @@
+"""prompt embedding
+
+Adds prompt_embedding, the text embeddings of chat prompts keyed by the hash of the normalized
+prompt and the vectorizer model version, so a question asked again is not embedded again.
+
+Revision ID: f6c3b8e2a415
+Revises: d2a8f5c1b937
+Create Date: 2026-10-17 18:52:07.614239
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+from app.config import Config
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c3b8e2a415'
+down_revision = 'd2a8f5c1b937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'prompt_embedding',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('prompt_hash', sa.String(), nullable=False),
+        sa.Column('model_version', sa.String(), nullable=False),
+        sa.Column('embedding', Vector(Config.VECTOR_DIMENSION), nullable=False),
+        sa.Column('create_time', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('prompt_hash', 'model_version', name='uq_prompt_embedding_hash_model'),
+    )
+
+
+def downgrade():
+    op.drop_table('prompt_embedding')
@@ -0,0 +1,19 @@
+"""
+Production WSGI entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+import importlib
+
+os.environ.setdefault("APP_ENV", "production")
+
+from app.app import create_app
+
+# The routes import their handlers' modules on first use; with preload_app they are imported once
+# here, before gunicorn forks, instead of on each worker's first request
+PRELOAD_MODULES = ("app.models", "app.models_base", "app.utilities.chat", "app.utilities.ingest", "app.utilities.jobs")
+
+app = create_app()
+for module in PRELOAD_MODULES:
+    importlib.import_module(module)